@@ -39,10 +39,14 @@ celery_app.conf.update(
     task_soft_time_limit=3000,  # 50min soft limit
     
     # Worker
+    # prefetch=1 + acks_late (+ -Ofair au lancement du worker) : un process ne
+    # réserve pas les étapes suivantes d'autres projets derrière une étape longue
+    # (transcription, B-roll, miniature)
     worker_prefetch_multiplier=1,  # Une tâche à la fois (vidéo = lourd)
     worker_concurrency=2,  # 2 workers max
     
     # Retry
+    # acks_late: une tâche interrompue est relivrée -> les étapes doivent être idempotentes
     task_acks_late=True,
     task_reject_on_worker_lost=True,
     
@@ -50,7 +54,13 @@ celery_app.conf.update(
     beat_schedule={},
 )
 
-# Toutes les tâches dans la queue par défaut 'celery'
+# Pipeline vidéo dans la queue par défaut 'celery' (CPU, prefork)
+# Uploads YouTube dans une queue dédiée 'youtube_uploads' : tâches qui attendent
+# le réseau, consommées par un worker à pool de threads (-P threads -c 32)
 celery_app.conf.task_default_queue = 'celery'
-celery_app.conf.task_routes = {}
+celery_app.conf.task_routes = {
+    'tasks.youtube_upload': {'queue': 'youtube_uploads'},
+    'tasks.upload_with_thumbnail': {'queue': 'youtube_uploads'},
+    'tasks.step11_upload': {'queue': 'youtube_uploads'},
+}
 
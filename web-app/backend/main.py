@@ -12,6 +12,7 @@ import uuid
 import shutil
 import json
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
 from dotenv import load_dotenv
@@ -28,10 +29,30 @@ from services.transcription import TranscriptionService
 from services.openrouter import OpenRouterService
 from services.openrouter import OpenRouterService
 
+# ObjectId laissés tels quels par les requêtes de liste (jsonable_encoder)
+try:
+    from bson import ObjectId
+    from fastapi.encoders import ENCODERS_BY_TYPE
+    ENCODERS_BY_TYPE[ObjectId] = str
+except ImportError:
+    pass
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Fermer les connexions OpenRouter gardées ouvertes (pool partagé)
+    from services.openrouter import close_shared_clients
+    await close_shared_clients()
+    # Fermer la session HTTP Pexels (keep-alive)
+    from services.pexels import close_shared_session
+    await close_shared_session()
+
+
 app = FastAPI(
     title="YouTube Pipeline API",
     description="API pour le traitement vidéo et transcription",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS pour le frontend
@@ -3333,30 +3354,52 @@ async def auto_process_full_pipeline(
         except:
             nosilence_duration = segments[-1]["end"] if segments else video_duration
         
-        illustration_moments = await openrouter.analyze_for_illustrations(segments, nosilence_duration, max_illustrations=2)
+        # SEO + shorts (étape 6) ne dépendent que de la transcription : lancés dès maintenant,
+        # en parallèle de l'analyse des illustrations et des téléchargements Pexels
+        generate_all_task = None
+        if is_full_workflow:
+            generate_all_task = asyncio.create_task(
+                openrouter.generate_all(transcript_text, segments, nosilence_duration)
+            )
         
-        downloaded_clips = []
-        if illustration_moments and pexels.is_configured():
-            illustrations_dir = folder_path / "illustrations"
-            illustrations_dir.mkdir(exist_ok=True)
-            
-            downloaded_clips = await pexels.download_illustrations(illustration_moments, str(illustrations_dir))
-            
-            # Sauvegarder les infos
-            clips_info_path = folder_path / "illustration_clips.json"
-            with open(clips_info_path, "w", encoding="utf-8") as f:
-                json.dump(downloaded_clips, f, ensure_ascii=False, indent=2)
+        # Tâche SEO + shorts orpheline si l'étape 5 échoue avant son await : l'annuler
+        try:
+            downloaded_clips = []
+            if pexels.is_configured():
+                illustrations_dir = folder_path / "illustrations"
+                illustrations_dir.mkdir(exist_ok=True)
+            
+                # Chaque clip est téléchargé dès que le LLM a produit son moment
+                downloaded_clips = await pexels.download_illustrations_stream(
+                    openrouter.stream_illustrations(segments, nosilence_duration, max_illustrations=2),
+                    str(illustrations_dir)
+                )
+        
+            if downloaded_clips:
+                # Sauvegarder les infos
+                clips_info_path = folder_path / "illustration_clips.json"
+                with open(clips_info_path, "w", encoding="utf-8") as f:
+                    json.dump(downloaded_clips, f, ensure_ascii=False, indent=2)
             
-            downloaded_count = sum(1 for c in downloaded_clips if c.get("downloaded"))
-            update_progress(5, "Analyse pour clips Pexels", "completed", f"{downloaded_count} clip(s) téléchargé(s)")
-        else:
-            update_progress(5, "Analyse pour clips Pexels", "completed", "Aucun clip Pexels (API non configurée ou pas de moments)")
+                downloaded_count = sum(1 for c in downloaded_clips if c.get("downloaded"))
+                update_progress(5, "Analyse pour clips Pexels", "completed", f"{downloaded_count} clip(s) téléchargé(s)")
+            else:
+                update_progress(5, "Analyse pour clips Pexels", "completed", "Aucun clip Pexels (API non configurée ou pas de moments)")
+        except BaseException:
+            if generate_all_task is not None:
+                generate_all_task.cancel()
+            raise
         
         # ========== ÉTAPE 6: Détection moments clés pour shorts ==========
+        seo_data = None
+        bundle = None
         if is_full_workflow:
             update_progress(6, "Détection moments clés", "running", "Analyse IA des meilleurs moments...")
             
-            shorts_suggestions = await openrouter.generate_shorts_suggestions(segments, nosilence_duration)
+            # Le SEO (étape 10) ne dépend que de la transcription : généré en même temps que les shorts
+            generated = await generate_all_task
+            shorts_suggestions = generated["shorts"]
+            seo_data = generated["seo"]
             
             if shorts_suggestions:
                 shorts_path = folder_path / "shorts_suggestions.json"
@@ -3374,6 +3417,28 @@ async def auto_process_full_pipeline(
             shorts_dir = folder_path / "shorts"
             shorts_dir.mkdir(exist_ok=True)
             
+            # Métadonnées des shorts retenus (5-60 s) + prompt miniature (étape 11) en un seul appel LLM.
+            # Les illustrations n'en font pas partie : elles sont analysées en flux à l'étape 5
+            # (avant les shorts) pour lancer chaque téléchargement Pexels dès son moment produit.
+            kept_shorts = []
+            short_texts = []
+            for i, short in enumerate(shorts_suggestions[:max_shorts]):
+                start_time = short.get("start", 0)
+                end_time = short.get("end", start_time + 30)
+                if not 5 <= end_time - start_time <= 60:
+                    continue
+                short_segments = [s for s in segments if s["start"] >= start_time and s["end"] <= end_time]
+                kept_shorts.append(i)
+                short_texts.append(" ".join([s["text"] for s in short_segments]))
+            bundle = await openrouter.analyze_video_bundle(
+                None,
+                transcript_text,
+                seo_data.get("title", "Vidéo YouTube") if seo_data else "Vidéo YouTube",
+                nosilence_duration,
+                short_texts=short_texts
+            )
+            metadata_by_short = dict(zip(kept_shorts, bundle["shorts"]))
+            
             created_shorts = 0
             for i, short in enumerate(shorts_suggestions[:max_shorts]):
                 start_time = short.get("start", 0)
@@ -3383,11 +3448,8 @@ async def auto_process_full_pipeline(
                 if duration < 5 or duration > 60:
                     continue
                 
-                # Générer métadonnées avec branding
-                short_segments = [s for s in segments if s["start"] >= start_time and s["end"] <= end_time]
-                short_text = " ".join([s["text"] for s in short_segments])
-                
-                short_metadata = await openrouter.generate_short_metadata(short_text, i + 1)
+                # Métadonnées avec branding (générées par l'appel groupé)
+                short_metadata = metadata_by_short[i]
                 
                 # Nom du fichier
                 safe_title = "".join(c for c in short.get("title", f"short_{i+1}")[:20] if c.isalnum() or c in " -_")
@@ -3586,7 +3648,8 @@ async def auto_process_full_pipeline(
         step_num = 10 if is_full_workflow else 6
         update_progress(step_num, "Génération SEO YouTube", "running", "Génération titre, description, hashtags...")
         
-        seo_data = await openrouter.generate_youtube_seo(transcript_text, segments=segments)
+        if not is_full_workflow:
+            seo_data = await openrouter.generate_youtube_seo(transcript_text, segments=segments)
         
         if seo_data:
             # Mettre à jour la transcription avec les données SEO
@@ -3631,7 +3694,9 @@ async def auto_process_full_pipeline(
         
         # Générer le prompt pour la miniature
         title = seo_data.get("title", "Vidéo YouTube") if seo_data else "Vidéo YouTube"
-        thumbnail_prompt = await openrouter.generate_thumbnail_prompt(transcript_text[:2000], title)
+        thumbnail_prompt = bundle["thumbnail_prompt"] if bundle else None
+        if not thumbnail_prompt:
+            thumbnail_prompt = await openrouter.generate_thumbnail_prompt(transcript_text[:2000], title)
         
         if thumbnail_prompt:
             # Générer la miniature avec Gemini
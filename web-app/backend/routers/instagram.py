@@ -4,6 +4,7 @@ Router Instagram - Préparation des shorts pour upload manuel sur Instagram Reel
 from fastapi import APIRouter, HTTPException
 from pathlib import Path
 import json
+import orjson
 from datetime import datetime
 from typing import List
 from pydantic import BaseModel
@@ -71,7 +72,12 @@ async def get_all_shorts():
     instagram_status = load_instagram_status()
     
     try:
-        projects = db.get_all_projects(limit=100)
+        # Seulement les champs utiles, triés par date de création côté MongoDB
+        projects = db.get_all_projects(
+            limit=100,
+            projection={"folder_name": 1, "name": 1, "created_at": 1, "outputs.shorts": 1},
+            sort=[("created_at", -1)]
+        )
         
         for project in projects:
             folder_name = project.get("folder_name", "")
@@ -87,8 +93,7 @@ async def get_all_shorts():
             seo_path = OUTPUT_DIR / folder_name / "seo.json"
             if seo_path.exists():
                 try:
-                    with open(seo_path, 'r', encoding='utf-8') as f:
-                        seo_data = json.load(f)
+                    seo_data = orjson.loads(seo_path.read_bytes())
                 except:
                     pass
             
@@ -125,8 +130,6 @@ async def get_all_shorts():
                     "instagram_published_at": instagram_published.get("published_at")
                 })
         
-        shorts.sort(key=lambda x: x["created_at"], reverse=True)
-        
         return {
             "shorts": shorts,
             "total": len(shorts),
@@ -1,7 +1,11 @@
 """
 Routes API pour la gestion des projets
 """
+import asyncio
+import orjson
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -11,6 +15,19 @@ from services.database import db, ProjectStatus
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
 
+def _orjson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """Listes de projets : les ObjectId sont convertis pendant la sérialisation orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default)
+
+
 class ProjectCreate(BaseModel):
     name: str
     folder_name: str
@@ -38,7 +55,7 @@ class ProjectResponse(BaseModel):
     completed_at: Optional[datetime]
 
 
-@router.get("")
+@router.get("", response_class=MongoJSONResponse, response_model=None)
 async def get_projects(
     status: Optional[str] = Query(None, description="Filtrer par statut"),
     limit: int = Query(50, ge=1, le=100),
@@ -48,8 +65,10 @@ async def get_projects(
     if not db.is_connected():
         raise HTTPException(status_code=503, detail="Base de données non disponible")
 
-    projects = db.get_all_projects(status=status, limit=limit, skip=skip)
-    total = db.count_projects(status=status)
+    projects, total = await asyncio.gather(
+        db.get_all_projects_async(status=status, limit=limit, skip=skip),
+        db.count_projects_async(status=status)
+    )
 
     return {
         "projects": projects,
@@ -65,22 +84,31 @@ async def get_projects_stats():
     if not db.is_connected():
         raise HTTPException(status_code=503, detail="Base de données non disponible")
 
+    total, created, processing, completed, failed = await asyncio.gather(
+        db.count_projects_async(),
+        db.count_projects_async(status=ProjectStatus.CREATED.value),
+        db.count_projects_async(status=ProjectStatus.PROCESSING.value),
+        db.count_projects_async(status=ProjectStatus.COMPLETED.value),
+        db.count_projects_async(status=ProjectStatus.FAILED.value),
+    )
+
     return {
-        "total": db.count_projects(),
-        "created": db.count_projects(status=ProjectStatus.CREATED.value),
-        "processing": db.count_projects(status=ProjectStatus.PROCESSING.value),
-        "completed": db.count_projects(status=ProjectStatus.COMPLETED.value),
-        "failed": db.count_projects(status=ProjectStatus.FAILED.value),
+        "total": total,
+        "created": created,
+        "processing": processing,
+        "completed": completed,
+        "failed": failed,
     }
 
 
-@router.get("/in-progress")
+@router.get("/in-progress", response_class=MongoJSONResponse, response_model=None)
 async def get_projects_in_progress():
     """Récupérer les projets en cours de traitement"""
     if not db.is_connected():
         raise HTTPException(status_code=503, detail="Base de données non disponible")
 
-    return db.get_projects_in_progress()
+    # Seuls quelques projets tournent en même temps : 50 suffit largement
+    return await db.get_all_projects_async(status=ProjectStatus.PROCESSING.value, limit=50)
 
 
 @router.get("/{project_id}")
@@ -89,7 +117,7 @@ async def get_project(project_id: str):
     if not db.is_connected():
         raise HTTPException(status_code=503, detail="Base de données non disponible")
 
-    project = db.get_project(project_id)
+    project = await db.get_project_async(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
 
@@ -125,19 +153,16 @@ async def update_project(project_id: str, updates: ProjectUpdate):
     if not db.is_connected():
         raise HTTPException(status_code=503, detail="Base de données non disponible")
 
-    project = db.get_project(project_id)
-    if not project:
-        raise HTTPException(status_code=404, detail="Projet non trouvé")
-
     update_data = {k: v for k, v in updates.dict().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="Aucune mise à jour fournie")
 
-    success = db.update_project(project_id, update_data)
-    if not success:
-        raise HTTPException(status_code=500, detail="Erreur lors de la mise à jour")
+    # Mise à jour + relecture en une commande (None : projet inexistant)
+    project = db.update_and_get(project_id, update_data)
+    if not project:
+        raise HTTPException(status_code=404, detail="Projet non trouvé")
 
-    return {"message": "Projet mis à jour avec succès"}
+    return {"message": "Projet mis à jour avec succès", "project": project}
 
 
 @router.delete("/{project_id}")
@@ -896,6 +921,8 @@ async def cut_video(project_id: str, request: CutRequest):
         })
         
         # Lancer le pipeline depuis l'étape 1
+        # Avec task_acks_late, une étape interrompue (worker tué, reboot) est relivrée
+        # et rejouée : chaque étape doit rester idempotente (réécrit ses fichiers de sortie)
         video_folder_path = f"output/{folder_name}"
         pipeline = chain(
             task_step1_merge.s(video_folder_path),
@@ -1,13 +1,18 @@
 """
 Router TikTok - Préparation des shorts pour upload manuel sur TikTok
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pathlib import Path
-import json
+import asyncio
+import os
+import aiofiles
+import orjson
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from services.database import db
+from services.step8_seo import optimize_tags_for_tiktok
 
 router = APIRouter(prefix="/api/tiktok", tags=["tiktok"])
 
@@ -35,102 +40,254 @@ class MarkPublishedRequest(BaseModel):
     published: bool = True
 
 
+# Cache du statut TikTok, rechargé seulement si le fichier a changé (mtime)
+_tiktok_status_cache = {"mtime": 0, "data": {}}
+
+
 def load_tiktok_status() -> dict:
     """Charger le statut des publications TikTok"""
-    if TIKTOK_STATUS_FILE.exists():
+    try:
+        mtime = TIKTOK_STATUS_FILE.stat().st_mtime_ns
+    except OSError:
+        return {}
+    
+    if mtime != _tiktok_status_cache["mtime"]:
         try:
-            with open(TIKTOK_STATUS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(TIKTOK_STATUS_FILE, 'rb') as f:
+                _tiktok_status_cache["data"] = orjson.loads(f.read())
+            _tiktok_status_cache["mtime"] = mtime
         except:
-            pass
-    return {}
+            return {}
+    return _tiktok_status_cache["data"]
+
+
+# Cache des seo.json : chemin -> (mtime_ns, données), une modification du fichier invalide l'entrée
+# (dict explicite plutôt que lru_cache, qui ne sait pas mettre en cache une coroutine)
+_seo_cache: Dict[str, tuple] = {}
+_SEO_CACHE_SIZE = 512
+
+
+def _seo_path_mtime(folder_name: str) -> Optional[tuple]:
+    """Chemin du seo.json et son mtime (None si le fichier n'existe pas)"""
+    seo_path = OUTPUT_DIR / folder_name / "seo.json"
+    try:
+        return str(seo_path), seo_path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _remember_seo(seo_path: str, mtime_ns: int, data: Optional[dict]):
+    """Mémoriser un seo.json lu (éviction du plus ancien au-delà de la taille max)"""
+    if seo_path not in _seo_cache and len(_seo_cache) >= _SEO_CACHE_SIZE:
+        _seo_cache.pop(next(iter(_seo_cache)))
+    _seo_cache[seo_path] = (mtime_ns, data)
+
+
+def _load_seo(folder_name: str) -> Optional[dict]:
+    """Charger le seo.json d'un projet via le cache"""
+    path_mtime = _seo_path_mtime(folder_name)
+    if path_mtime is None:
+        return None
+    seo_path, mtime = path_mtime
+    
+    cached = _seo_cache.get(seo_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    try:
+        data = orjson.loads(Path(seo_path).read_bytes())
+    except:
+        data = None
+    _remember_seo(seo_path, mtime, data)
+    return data
+
+
+async def _load_seo_async(folder_name: str) -> Optional[dict]:
+    """Version asynchrone de _load_seo (lecture aiofiles, même cache)"""
+    path_mtime = _seo_path_mtime(folder_name)
+    if path_mtime is None:
+        return None
+    seo_path, mtime = path_mtime
+    
+    cached = _seo_cache.get(seo_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    
+    try:
+        async with aiofiles.open(seo_path, 'rb') as f:
+            data = orjson.loads(await f.read())
+    except:
+        data = None
+    _remember_seo(seo_path, mtime, data)
+    return data
+
+
+def _short_tiktok_tags(short_seo: Optional[dict]) -> List[str]:
+    """Tags TikTok d'un short : précalculés à l'étape SEO, sinon calculés (anciens seo.json)"""
+    if short_seo and "tiktok_tags" in short_seo:
+        return short_seo["tiktok_tags"]
+    return optimize_tags_for_tiktok((short_seo or {}).get("tags", []))
+
+
+def _legacy_short_records(short_files: List[str], seo_data: Optional[dict]) -> List[dict]:
+    """
+    Reconstituer les entrées outputs.shorts d'un ancien projet (fichiers sur disque + seo.json)
+    """
+    seo_shorts = (seo_data or {}).get("shorts") or []
+    records = []
+    for idx, short_file in enumerate(short_files):
+        short_seo = seo_shorts[idx] if idx < len(seo_shorts) else None
+        records.append({
+            "path": f"shorts/{short_file}",
+            "index": idx,
+            "title": (short_seo or {}).get("title", f"Short {idx + 1}"),
+            "description": (short_seo or {}).get("description", ""),
+            "tiktok_tags": _short_tiktok_tags(short_seo)
+        })
+    return records
+
+
+def _seo_backfilled(records: List[dict]) -> bool:
+    """Le SEO des shorts (étape 8) a-t-il été reporté dans outputs.shorts ?"""
+    return all("tiktok_tags" in record for record in records)
+
+
+def _fill_from_seo(records: List[dict], seo_data: Optional[dict]) -> List[dict]:
+    """
+    Compléter avec seo.json les entrées outputs.shorts pas encore reportées par l'étape 8
+    (étape 8 en cours ou en échec) : sans seo.json, description vide et tags génériques
+    """
+    seo_shorts = (seo_data or {}).get("shorts") or []
+    seo_by_file = {short.get("file"): short for short in seo_shorts if short.get("file")}
+    filled = []
+    for idx, record in enumerate(records):
+        if "tiktok_tags" in record:
+            filled.append(record)
+            continue
+        idx = record.get("index", idx)
+        short_seo = seo_by_file.get(Path(record.get("path", "")).name)
+        if short_seo is None and idx < len(seo_shorts):
+            short_seo = seo_shorts[idx]
+        filled.append({
+            **record,
+            "title": (short_seo or {}).get("title") or record.get("title"),
+            "description": (short_seo or {}).get("description", ""),
+            "tiktok_tags": _short_tiktok_tags(short_seo)
+        })
+    return filled
+
+
+def _short_entry(project: dict, short_rec: dict, idx: int) -> dict:
+    """Construire l'entrée de réponse d'un short à partir de son enregistrement outputs.shorts"""
+    idx = short_rec.get("index", idx)
+    folder_name = project.get("folder_name", "")
+    return {
+        "project_id": str(project.get("_id", "")),
+        "project_name": project.get("name", folder_name),
+        "folder_name": folder_name,
+        "short_file": Path(short_rec.get("path", "")).name,
+        "short_index": idx,
+        "title": short_rec.get("title") or f"Short {idx + 1}",
+        "description": short_rec.get("description", ""),
+        "tags": short_rec.get("tiktok_tags") or optimize_tags_for_tiktok(short_rec.get("tags", [])),
+        "created_at": str(project.get("created_at", ""))
+    }
+
+
+def _list_short_files(folder_name: str) -> Optional[List[str]]:
+    """Lister les .mp4 du dossier shorts (None si le dossier n'existe pas)"""
+    try:
+        return sorted(f for f in os.listdir(OUTPUT_DIR / folder_name / "shorts") if f.endswith(".mp4"))
+    except OSError:
+        return None
 
 
 def save_tiktok_status(status: dict):
     """Sauvegarder le statut des publications TikTok"""
     TIKTOK_STATUS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(TIKTOK_STATUS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(status, f, ensure_ascii=False, indent=2)
+    with open(TIKTOK_STATUS_FILE, 'wb') as f:
+        f.write(orjson.dumps(status, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    
+    # Mettre à jour le cache pour éviter une relecture au prochain GET
+    _tiktok_status_cache["data"] = status
+    _tiktok_status_cache["mtime"] = TIKTOK_STATUS_FILE.stat().st_mtime_ns
 
 
-@router.get("/shorts")
-async def get_all_shorts():
+@router.get("/shorts", response_class=ORJSONResponse, response_model=None)
+async def get_all_shorts(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = Query(None, description="Curseur: created_at ISO du dernier projet reçu")
+):
     """
-    Récupère tous les shorts disponibles de tous les projets.
+    Récupère les shorts disponibles des projets, paginés par projet.
     Retourne les métadonnées optimisées pour TikTok.
     """
     shorts = []
     tiktok_status = load_tiktok_status()
     
+    before_date = None
+    if before:
+        try:
+            before_date = datetime.fromisoformat(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur 'before' invalide")
+    
     try:
-        # Récupérer tous les projets (pas seulement completed)
-        projects = db.get_all_projects(limit=100)
+        # Projets avec shorts, triés par date de création (plus récent en premier) côté MongoDB
+        projects = db.get_projects_with_shorts(limit=limit, before=before_date)
         
+        # Shorts enregistrés en base par l'étape 5 (complétés par l'étape 8) ;
+        # seo.json pour les shorts pas encore complétés, disque + seo.json pour les anciens projets
+        legacy = []
+        pending = []
         for project in projects:
-            folder_name = project.get("folder_name", "")
-            project_id = str(project.get("_id", ""))
-            project_name = project.get("name", folder_name)
-            created_at = str(project.get("created_at", ""))
-            
-            # Vérifier le dossier shorts
-            shorts_dir = OUTPUT_DIR / folder_name / "shorts"
-            if not shorts_dir.exists():
+            stored = (project.get("outputs") or {}).get("shorts")
+            if stored:
+                if not _seo_backfilled(stored):
+                    pending.append(project)
+                continue
+            short_files = _list_short_files(project.get("folder_name", ""))
+            if short_files is not None:
+                legacy.append((project, short_files))
+        
+        # Charger les seo.json en parallèle (cache par mtime)
+        seo_list = await asyncio.gather(*[
+            _load_seo_async(project.get("folder_name", ""))
+            for project in [p for p, _ in legacy] + pending
+        ])
+        computed_records = {
+            id(project): _legacy_short_records(short_files, seo_data)
+            for (project, short_files), seo_data in zip(legacy, seo_list)
+        }
+        for project, seo_data in zip(pending, seo_list[len(legacy):]):
+            computed_records[id(project)] = _fill_from_seo(project["outputs"]["shorts"], seo_data)
+        
+        for project in projects:
+            records = computed_records.get(id(project)) or (project.get("outputs") or {}).get("shorts")
+            if not records:
                 continue
             
-            # Charger les données SEO si disponibles
-            seo_data = None
-            seo_path = OUTPUT_DIR / folder_name / "seo.json"
-            if seo_path.exists():
-                try:
-                    with open(seo_path, 'r', encoding='utf-8') as f:
-                        seo_data = json.load(f)
-                except:
-                    pass
-            
-            # Lister les fichiers shorts
-            short_files = sorted([f.name for f in shorts_dir.glob("*.mp4")])
-            
-            for idx, short_file in enumerate(short_files):
-                # Récupérer les métadonnées SEO pour ce short
-                title = f"Short {idx + 1}"
-                description = ""
-                tags = []
-                
-                if seo_data and "shorts" in seo_data:
-                    if idx < len(seo_data["shorts"]):
-                        short_seo = seo_data["shorts"][idx]
-                        title = short_seo.get("title", title)
-                        description = short_seo.get("description", "")
-                        tags = short_seo.get("tags", [])
-                
-                # Optimiser pour TikTok (hashtags populaires)
-                tiktok_tags = optimize_tags_for_tiktok(tags)
+            folder_name = project.get("folder_name", "")
+            for idx, record in enumerate(records):
+                entry = _short_entry(project, record, idx)
                 
                 # Vérifier si publié sur TikTok
-                status_key = f"{folder_name}_{idx}"
+                status_key = f"{folder_name}_{entry['short_index']}"
                 tiktok_published = tiktok_status.get(status_key, {})
-                
-                shorts.append({
-                    "project_id": project_id,
-                    "project_name": project_name,
-                    "folder_name": folder_name,
-                    "short_file": short_file,
-                    "short_index": idx,
-                    "title": title,
-                    "description": description,
-                    "tags": tiktok_tags,
-                    "created_at": created_at,
-                    "tiktok_published": tiktok_published.get("published", False),
-                    "tiktok_published_at": tiktok_published.get("published_at")
-                })
+                entry["tiktok_published"] = tiktok_published.get("published", False)
+                entry["tiktok_published_at"] = tiktok_published.get("published_at")
+                shorts.append(entry)
         
-        # Trier par date de création (plus récent en premier)
-        shorts.sort(key=lambda x: x["created_at"], reverse=True)
+        # Page pleine -> il peut rester des projets plus anciens
+        next_cursor = None
+        if len(projects) == limit and projects[-1].get("created_at"):
+            next_cursor = projects[-1]["created_at"].isoformat()
         
         return {
             "shorts": shorts,
             "total": len(shorts),
-            "published_count": len([s for s in shorts if s.get("tiktok_published")])
+            "published_count": len([s for s in shorts if s.get("tiktok_published")]),
+            "next_cursor": next_cursor
         }
     
     except Exception as e:
@@ -166,31 +323,6 @@ async def mark_short_published(request: MarkPublishedRequest):
     }
 
 
-def optimize_tags_for_tiktok(tags: List[str]) -> List[str]:
-    """
-    Optimise les tags pour TikTok :
-    - Supprime les espaces dans les hashtags
-    - Ajoute des hashtags populaires pertinents
-    - Limite à 5-8 hashtags (TikTok recommande moins que YouTube)
-    """
-    # Tags populaires TikTok à ajouter si pertinents
-    popular_tiktok_tags = ["fyp", "foryou", "viral", "pourtoi"]
-    
-    # Nettoyer les tags existants
-    cleaned_tags = []
-    for tag in tags[:5]:  # Limiter à 5 tags du contenu
-        cleaned = tag.replace(" ", "").replace("-", "").lower()
-        if cleaned and cleaned not in cleaned_tags:
-            cleaned_tags.append(cleaned)
-    
-    # Ajouter quelques tags populaires TikTok
-    for pop_tag in popular_tiktok_tags[:2]:  # Ajouter 2 tags populaires
-        if pop_tag not in cleaned_tags:
-            cleaned_tags.append(pop_tag)
-    
-    return cleaned_tags[:8]  # Max 8 hashtags
-
-
 @router.get("/shorts/{project_id}")
 async def get_project_shorts(project_id: str):
     """
@@ -200,53 +332,20 @@ async def get_project_shorts(project_id: str):
     if not project:
         raise HTTPException(status_code=404, detail="Projet non trouvé")
     
+    # Shorts enregistrés en base ; disque + seo.json seulement pour les anciens projets
     folder_name = project.get("folder_name", "")
-    shorts_dir = OUTPUT_DIR / folder_name / "shorts"
-    
-    if not shorts_dir.exists():
-        return {"shorts": [], "total": 0}
-    
-    # Charger SEO
-    seo_data = None
-    seo_path = OUTPUT_DIR / folder_name / "seo.json"
-    if seo_path.exists():
-        try:
-            with open(seo_path, 'r', encoding='utf-8') as f:
-                seo_data = json.load(f)
-        except:
-            pass
+    records = (project.get("outputs") or {}).get("shorts")
+    if not records:
+        short_files = _list_short_files(folder_name)
+        if short_files is None:
+            return {"shorts": [], "total": 0}
+        records = _legacy_short_records(short_files, _load_seo(folder_name))
+    elif not _seo_backfilled(records):
+        records = _fill_from_seo(records, _load_seo(folder_name))
     
-    shorts = []
-    short_files = sorted([f.name for f in shorts_dir.glob("*.mp4")])
-    
-    for idx, short_file in enumerate(short_files):
-        title = f"Short {idx + 1}"
-        description = ""
-        tags = []
-        
-        if seo_data and "shorts" in seo_data:
-            if idx < len(seo_data["shorts"]):
-                short_seo = seo_data["shorts"][idx]
-                title = short_seo.get("title", title)
-                description = short_seo.get("description", "")
-                tags = short_seo.get("tags", [])
-        
-        tiktok_tags = optimize_tags_for_tiktok(tags)
-        
-        shorts.append({
-            "project_id": project_id,
-            "project_name": project.get("name", folder_name),
-            "folder_name": folder_name,
-            "short_file": short_file,
-            "short_index": idx,
-            "title": title,
-            "description": description,
-            "tags": tiktok_tags,
-            "created_at": str(project.get("created_at", ""))
-        })
+    shorts = [_short_entry(project, record, idx) for idx, record in enumerate(records)]
     
     return {
         "shorts": shorts,
         "total": len(shorts)
     }
-
@@ -1,9 +1,10 @@
 """
 Routes API pour YouTube
 """
-from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from pydantic import BaseModel
+from contextvars import ContextVar
 from typing import Optional, List
 import os
 
@@ -15,6 +16,25 @@ router = APIRouter(prefix="/api/youtube", tags=["youtube"])
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3010')
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:8010')
 
+# Résultat de is_authenticated() mémorisé pour la requête en cours
+# (chaque requête s'exécute dans sa propre tâche asyncio, donc son propre contexte)
+_yt_authenticated: ContextVar[Optional[bool]] = ContextVar("yt_authenticated", default=None)
+
+
+def is_yt_authenticated() -> bool:
+    """is_authenticated() au plus une fois par requête"""
+    authenticated = _yt_authenticated.get()
+    if authenticated is None:
+        authenticated = youtube_service.is_authenticated()
+        _yt_authenticated.set(authenticated)
+    return authenticated
+
+
+async def require_yt() -> None:
+    """Dépendance des routes qui nécessitent un compte YouTube connecté"""
+    if not is_yt_authenticated():
+        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
+
 
 class UploadRequest(BaseModel):
     file_path: str
@@ -52,7 +72,7 @@ class UploadNowRequest(BaseModel):
 @router.get("/status")
 async def get_youtube_status():
     """Vérifier le statut de connexion YouTube"""
-    is_connected = youtube_service.is_authenticated()
+    is_connected = is_yt_authenticated()
     channel = None
     
     if is_connected:
@@ -100,12 +120,9 @@ async def disconnect_youtube():
     return {"message": "Déconnecté de YouTube"}
 
 
-@router.get("/channel")
+@router.get("/channel", dependencies=[Depends(require_yt)])
 async def get_channel_info():
     """Récupérer les informations de la chaîne"""
-    if not youtube_service.is_authenticated():
-        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
-    
     channel = youtube_service.get_channel_info()
     if not channel:
         raise HTTPException(status_code=404, detail="Chaîne non trouvée")
@@ -113,17 +130,15 @@ async def get_channel_info():
     return channel
 
 
-@router.get("/videos")
+@router.get("/videos", response_class=ORJSONResponse, response_model=None, dependencies=[Depends(require_yt)])
 async def get_videos(max_results: int = Query(10, ge=1, le=50)):
     """Récupérer les vidéos récentes"""
-    if not youtube_service.is_authenticated():
-        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
-    
     videos = youtube_service.get_recent_videos(max_results)
     
-    # Séparer vidéos et shorts
-    regular_videos = [v for v in videos if not v.get('is_short')]
-    shorts = [v for v in videos if v.get('is_short')]
+    # Séparer vidéos et shorts (un seul passage)
+    regular_videos, shorts = [], []
+    for v in videos:
+        (shorts if v.get('is_short') else regular_videos).append(v)
     
     return {
         "videos": regular_videos,
@@ -132,12 +147,9 @@ async def get_videos(max_results: int = Query(10, ge=1, le=50)):
     }
 
 
-@router.get("/analytics")
+@router.get("/analytics", dependencies=[Depends(require_yt)])
 async def get_analytics(days: int = Query(28, ge=1, le=365)):
     """Récupérer les analytics de la chaîne"""
-    if not youtube_service.is_authenticated():
-        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
-    
     analytics = youtube_service.get_analytics(days)
     if not analytics:
         raise HTTPException(status_code=500, detail="Erreur récupération analytics")
@@ -145,35 +157,38 @@ async def get_analytics(days: int = Query(28, ge=1, le=365)):
     return analytics
 
 
-@router.get("/dashboard-stats")
+@router.get("/dashboard-stats", response_class=ORJSONResponse, response_model=None)
 async def get_dashboard_stats():
     """Récupérer les stats pour le dashboard"""
-    if not youtube_service.is_authenticated():
+    if not is_yt_authenticated():
         return {
             "connected": False,
             "channel": None,
             "stats": None
         }
     
-    channel = youtube_service.get_channel_info()
-    analytics = youtube_service.get_analytics(28)
-    recent_videos = youtube_service.get_recent_videos(5)
+    import asyncio
+    
+    # Appels en parallèle dans des threads (un client API par thread)
+    channel, analytics, recent_videos, recent_shorts = await asyncio.gather(
+        asyncio.to_thread(youtube_service.get_channel_info),
+        asyncio.to_thread(youtube_service.get_analytics, 28),
+        asyncio.to_thread(youtube_service.get_recent_videos, 3, 'regular'),
+        asyncio.to_thread(youtube_service.get_recent_videos, 3, 'short')
+    )
     
     return {
         "connected": True,
         "channel": channel,
         "analytics": analytics,
-        "recent_videos": recent_videos[:3] if recent_videos else [],
-        "recent_shorts": [v for v in recent_videos if v.get('is_short')][:3] if recent_videos else []
+        "recent_videos": recent_videos or [],
+        "recent_shorts": recent_shorts or []
     }
 
 
-@router.post("/upload")
+@router.post("/upload", dependencies=[Depends(require_yt)])
 async def upload_video(request: UploadRequest):
     """Uploader une vidéo sur YouTube"""
-    if not youtube_service.is_authenticated():
-        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
-    
     result = youtube_service.upload_video(
         file_path=request.file_path,
         title=request.title,
@@ -189,12 +204,9 @@ async def upload_video(request: UploadRequest):
     return result
 
 
-@router.post("/upload-now")
+@router.post("/upload-now", dependencies=[Depends(require_yt)])
 async def upload_now(request: UploadNowRequest):
     """Mettre en ligne immédiatement une vidéo"""
-    if not youtube_service.is_authenticated():
-        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
-    
     from pathlib import Path
     from services.database import db
     
@@ -262,124 +274,129 @@ async def upload_now(request: UploadNowRequest):
         is_short = False
         privacy = request.privacy
     
-    # Upload
-    result = youtube_service.upload_video(
-        file_path=str(file_path),
-        title=title,
-        description=description,
-        tags=tags,
-        privacy=privacy,
-        is_short=is_short
-    )
-    
-    if not result:
-        raise HTTPException(status_code=500, detail="Erreur lors de l'upload")
+    # Upload + miniature dans une tâche Celery (queue 'youtube_uploads'), réponse immédiate
+    from tasks import task_upload_with_thumbnail
     
-    # Upload de la miniature pour les vidéos principales
+    thumb_path = None
     if request.type in ['illustrated', 'classroom']:
-        thumbnail_path = output_dir / "thumbnail.png"
-        if thumbnail_path.exists():
-            youtube_service.set_thumbnail(result['id'], str(thumbnail_path))
+        thumb_path = str(output_dir / "thumbnail.png")
+    
+    meta = {
+        "type": request.type,
+        "title": title,
+        "description": description,
+        "tags": tags,
+        "privacy": privacy,
+        "is_short": is_short
+    }
+    task = task_upload_with_thumbnail.delay(str(file_path), meta, thumb_path, request.project_id)
     
     return {
         "success": True,
-        "video_id": result['id'],
-        "url": result['url'],
-        "title": result['title'],
-        "status": result['status']
+        "task_id": task.id,
+        "title": title,
+        "status": "queued"
     }
 
 
-@router.post("/schedule")
-async def schedule_uploads(request: ScheduleRequest):
-    """Programmer des uploads sur YouTube"""
-    if not youtube_service.is_authenticated():
-        raise HTTPException(status_code=401, detail="Non connecté à YouTube")
+@router.get("/upload-now/{task_id}")
+async def get_upload_now_status(task_id: str):
+    """Suivre une mise en ligne immédiate"""
+    from celery.result import AsyncResult
+    from celery_app import celery_app
     
-    from pathlib import Path
-    from datetime import datetime
-    
-    output_dir = Path("/app/output") / request.folder_name
-    results = []
-    errors = []
-    
-    for upload in request.uploads:
-        try:
-            # Construire le chemin du fichier
-            file_path = output_dir / upload.file
-            
-            if not file_path.exists():
-                errors.append(f"Fichier non trouvé: {upload.file}")
-                continue
-            
-            # Créer la date de publication programmée
-            scheduled_datetime = f"{upload.scheduledDate}T{upload.scheduledTime}:00"
-            
-            # Déterminer si c'est un short
-            is_short = upload.type == 'short'
-            
-            # Pour les shorts, s'assurer que #Shorts est dans le titre
-            title = upload.title
-            if is_short and '#Shorts' not in title and '#shorts' not in title.lower():
-                title = f"{title} #Shorts"
-            
-            # Pour les shorts, ajouter les hashtags shorts dans la description
-            description = upload.description
-            if is_short:
-                description = f"{description}\n\n#Shorts #Short #YouTubeShorts"
-            
-            # Classroom est toujours en unlisted et sans programmation
-            if upload.type == 'classroom':
-                privacy = 'unlisted'
-                publish_at = None
-                title = f"{title} (Version classroom)" if "(Version classroom)" not in title else title
-            else:
-                privacy = upload.privacy
-                publish_at = scheduled_datetime if upload.privacy == 'public' else None
-            
-            # Upload avec programmation
-            result = youtube_service.upload_video(
-                file_path=str(file_path),
-                title=title,
-                description=description,
-                tags=upload.tags + ['Shorts', 'Short', 'YouTubeShorts'] if is_short else upload.tags,
-                privacy=privacy,
-                is_short=is_short,
-                publish_at=publish_at
-            )
-            
-            if result:
-                video_id = result.get("id")
-                
-                # Upload de la miniature pour les vidéos principales (pas les shorts)
-                if upload.type in ['illustrated', 'classroom']:
-                    thumbnail_path = output_dir / "thumbnail.png"
-                    if thumbnail_path.exists():
-                        thumbnail_success = youtube_service.set_thumbnail(video_id, str(thumbnail_path))
-                        if thumbnail_success:
-                            print(f"[Schedule] Miniature uploadée pour {video_id}")
-                        else:
-                            print(f"[Schedule] Échec miniature pour {video_id}")
-                
-                results.append({
-                    "type": upload.type,
-                    "title": title,
-                    "video_id": video_id,
-                    "url": result.get("url"),
-                    "scheduled_for": scheduled_datetime,
-                    "status": "scheduled" if upload.privacy == 'public' else "uploaded",
-                    "thumbnail": upload.type in ['illustrated', 'classroom']
-                })
-            else:
-                errors.append(f"Échec upload: {title}")
-                
-        except Exception as e:
-            errors.append(f"Erreur {upload.title}: {str(e)}")
+    task_result = AsyncResult(task_id, app=celery_app)
+    response = {"task_id": task_id, "state": task_result.state}
+    
+    if task_result.state == 'PROGRESS' and isinstance(task_result.info, dict):
+        response.update(task_result.info)
+    elif task_result.successful():
+        response.update(task_result.result or {})
+    elif task_result.failed():
+        response.update({"success": False, "error": str(task_result.result)})
+    
+    return response
+
+
+@router.post("/schedule", dependencies=[Depends(require_yt)])
+async def schedule_uploads(request: ScheduleRequest):
+    """Programmer des uploads sur YouTube (tâches Celery, réponse immédiate)"""
+    from celery import group
+    from tasks import task_youtube_upload
+    
+    # Un upload = une tâche sur la queue 'youtube_uploads' (exécutées en parallèle)
+    # group.apply_async envoie toutes les tâches en un seul aller-retour broker
+    signatures = [
+        task_youtube_upload.s(upload.dict(), request.folder_name)
+        for upload in request.uploads
+    ]
+    group_result = group(signatures).apply_async()
+    group_result.save()  # Nécessaire pour GroupResult.restore
     
     return {
-        "success": len(results),
-        "failed": len(errors),
-        "results": results,
-        "errors": errors
+        "group_id": group_result.id,
+        "count": len(signatures)
     }
 
+
+@router.get("/schedule/{group_id}")
+async def get_schedule_status(group_id: str):
+    """Suivre l'avancement d'un lot d'uploads programmés"""
+    from celery.result import GroupResult
+    from celery_app import celery_app
+    
+    group_result = GroupResult.restore(group_id, app=celery_app)
+    if group_result is None:
+        raise HTTPException(status_code=404, detail="Lot d'uploads non trouvé")
+    
+    # Avancement par upload (compteurs d'octets publiés par la tâche pendant l'envoi),
+    # dans l'ordre de la requête, puis résultat ou erreur de chaque upload terminé
+    uploads = []
+    for task_result in group_result.results:
+        info = task_result.info if task_result.state == 'PROGRESS' else None
+        entry = {
+            "task_id": task_result.id,
+            "state": task_result.state,
+            "title": info.get("title") if info else None,
+            "bytes_uploaded": info.get("bytes_uploaded", 0) if info else 0,
+            "total_bytes": info.get("total_bytes", 0) if info else 0
+        }
+        if task_result.successful():
+            outcome = task_result.result if isinstance(task_result.result, dict) else {}
+            entry.update({
+                "success": bool(outcome.get("success")),
+                "title": outcome.get("title"),
+                "status": outcome.get("status"),
+                "url": outcome.get("url"),
+                "error": outcome.get("error")
+            })
+        elif task_result.failed():
+            entry.update({"success": False, "error": f"Erreur: {task_result.result}"})
+        uploads.append(entry)
+    
+    response = {
+        "group_id": group_id,
+        "count": len(group_result.results),
+        "completed": group_result.completed_count(),
+        "ready": group_result.ready(),
+        "uploads": uploads
+    }
+    
+    if response["ready"]:
+        results = []
+        errors = []
+        for outcome in group_result.join(propagate=False):
+            if isinstance(outcome, dict) and outcome.get("success"):
+                results.append({k: v for k, v in outcome.items() if k != "success"})
+            elif isinstance(outcome, dict):
+                errors.append(outcome.get("error", "Erreur inconnue"))
+            else:
+                errors.append(f"Erreur: {outcome}")
+        response.update({
+            "success": len(results),
+            "failed": len(errors),
+            "results": results,
+            "errors": errors
+        })
+    
+    return response
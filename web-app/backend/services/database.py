@@ -2,28 +2,78 @@
 Service MongoDB pour la gestion des projets
 """
 import os
-from datetime import datetime
+import queue
+import atexit
+import asyncio
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional, List, Dict, Any
 from enum import Enum
 
 try:
-    from pymongo import MongoClient
+    from pymongo import MongoClient, UpdateOne, ReturnDocument
     from pymongo.collection import Collection
+    from pymongo.write_concern import WriteConcern
     from bson import ObjectId
     MONGODB_AVAILABLE = True
 except ImportError:
     MONGODB_AVAILABLE = False
     MongoClient = None
+    UpdateOne = None
+    ReturnDocument = None
     Collection = None
+    WriteConcern = None
     ObjectId = None
 
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    MOTOR_AVAILABLE = True
+except ImportError:
+    MOTOR_AVAILABLE = False
+    AsyncIOMotorClient = None
+
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Journalisation différée : les requêtes ne font qu'empiler dans une file,
+# un thread dédié écrit sur stdout
+logger = logging.getLogger("db")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_handler = QueueHandler(queue.SimpleQueue())
+logger.addHandler(_log_handler)
+_log_listener = None
+
+
+def _start_log_listener():
+    global _log_listener
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("[DB] %(message)s"))
+    _log_handler.queue = queue.SimpleQueue()
+    _log_listener = QueueListener(_log_handler.queue, stream_handler)
+    _log_listener.start()
+
+
+_start_log_listener()
+atexit.register(lambda: _log_listener.stop())
+
 MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://localhost:27017')
 MONGODB_DB = os.getenv('MONGODB_DB', 'youtube_pipeline')
 
+# Cache des clés API (lues à chaque appel d'un service externe, modifiées rarement)
+# Par processus : un worker Celery voit une modification au plus tard après le TTL
+_api_key_cache = TTLCache(maxsize=128, ttl=60)
+_api_key_cache_lock = threading.Lock()
+_ALL_API_KEYS = "__all__"
+
+# Champs de progression réécrits à chaque tick : écrits sans accusé de réception (w=0)
+_FAST_UPDATE_FIELDS = {"progress", "step_name"}
+
 
 class ProjectStatus(str, Enum):
     CREATED = "created"
@@ -45,32 +95,133 @@ class PipelineStep(str, Enum):
     THUMBNAIL = "thumbnail"
 
 
+# Pool persistant : évite de rouvrir TCP/TLS à chaque rafale de requêtes.
+# connect=False diffère la découverte de la topologie jusqu'au premier usage.
+MONGODB_CLIENT_OPTIONS = {
+    "maxPoolSize": 200,
+    "minPoolSize": 10,
+    "maxIdleTimeMS": 60000,
+    "socketTimeoutMS": 5000,
+    "serverSelectionTimeoutMS": 3000,
+    "retryWrites": True,
+    "connect": False,
+}
+
+
+@lru_cache(maxsize=1024)
+def _oid(project_id: str) -> "ObjectId":
+    """ObjectId d'un projet, parsé une fois par id (immuable : partageable entre threads)"""
+    return ObjectId(project_id)
+
+
+# Gabarits de create_project (valeurs immuables : une copie superficielle suffit)
+_STEP_TEMPLATE = {"status": "pending", "started_at": None, "completed_at": None, "error": None}
+_STEPS_TEMPLATE_KEYS = (
+    "convert", "merge", "silence", "cut_sources", "transcribe",
+    "shorts", "broll", "integrate_broll", "seo", "thumbnail",
+)
+_OUTPUTS_TEMPLATE = {
+    "original": None,
+    "nosilence": None,
+    "illustrated": None,
+    "thumbnail": None,
+    "seo": None,
+}  # + "shorts": liste neuve à chaque projet
+
+# Champs renvoyés par les listes de projets (pas de config, SEO, uploads manuels...)
+# Le document complet reste disponible via get_project
+PROJECT_SUMMARY_FIELDS = {
+    "name": 1,
+    "folder_name": 1,
+    "status": 1,
+    "progress": 1,
+    "current_step": 1,
+    "step_name": 1,
+    "steps": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "completed_at": 1,
+    "celery_task_id": 1,
+    "outputs.illustrated": 1,
+    "outputs.nosilence": 1,
+    "outputs.shorts.path": 1,
+}
+
+
+def _mask_api_key(value: str) -> str:
+    """Valeur masquée pour l'affichage (4 premiers / 4 derniers caractères)"""
+    return f"{value[:4]}...{value[-4:]}" if len(value) > 8 else "****"
+
+
 class DatabaseService:
     _instance = None
     _client = None
     _db = None
+    _async_client = None
+    _async_db = None
+    _reconnect_after_fork = False
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
         return cls._instance
 
     def __init__(self):
         if not MONGODB_AVAILABLE:
-            print("[DB] PyMongo non disponible. Installez: pip install pymongo")
+            logger.warning("PyMongo non disponible. Installez: pip install pymongo")
             return
         
         if self._client is None:
+            with self._lock:
+                if self._client is None and self._connect():
+                    self._ensure_indexes()
+
+    def _connect(self) -> bool:
+        """Ouvrir le client MongoDB et vérifier la connexion"""
+        try:
+            self._client = MongoClient(MONGODB_URL, **MONGODB_CLIENT_OPTIONS)
+            self._db = self._client[MONGODB_DB]
+            # Test connexion
+            self._client.admin.command('ping')
+            logger.info("Connecté à MongoDB: %s", MONGODB_URL)
+            return True
+        except Exception as e:
+            logger.error("Erreur connexion MongoDB: %s", e)
+            self._client = None
+            self._db = None
+            return False
+
+    def _reset_after_fork(self):
+        """Processus enfant (worker Celery prefork) : abandonner le pool hérité du parent"""
+        # Le verrou a pu être copié à l'état verrouillé par le fork
+        DatabaseService._lock = threading.Lock()
+        # Le thread de journalisation n'existe pas dans l'enfant
+        _start_log_listener()
+        self._client = None
+        self._db = None
+        self._async_client = None
+        self._async_db = None
+        self._reconnect_after_fork = True
+
+    def _ensure_indexes(self):
+        """Créer les index des requêtes fréquentes (create_index est idempotent)"""
+        indexes = [
+            (self._db.projects, "folder_name", {"unique": True}),
+            # Filtre par status + tri par date dans get_all_projects
+            (self._db.projects, [("status", 1), ("created_at", -1)], {}),
+            # Tri par date sans filtre de status (liste complète, shorts)
+            (self._db.projects, [("created_at", -1)], {}),
+            (self._db.api_keys, "name", {"unique": True}),
+        ]
+        for collection, keys, options in indexes:
             try:
-                self._client = MongoClient(MONGODB_URL)
-                self._db = self._client[MONGODB_DB]
-                # Test connexion
-                self._client.admin.command('ping')
-                print(f"[DB] Connecté à MongoDB: {MONGODB_URL}")
+                collection.create_index(keys, **options)
             except Exception as e:
-                print(f"[DB] Erreur connexion MongoDB: {e}")
-                self._client = None
-                self._db = None
+                # Ex: doublons existants empêchant un index unique
+                logger.warning("Index %s %s non créé: %s", collection.name, keys, e)
 
     @property
     def projects(self) -> Optional[Collection]:
@@ -78,7 +229,36 @@ class DatabaseService:
             return None
         return self._db.projects
 
+    @property
+    def _projects_fast(self) -> Optional[Collection]:
+        """Collection projects en w=0 : pas d'aller-retour d'acquittement"""
+        if self._db is None:
+            return None
+        return self._db.get_collection("projects", write_concern=WriteConcern(w=0))
+
+    @staticmethod
+    def _is_fast_update(updates: Dict[str, Any]) -> bool:
+        """Mise à jour de progression pure (ni statut, ni sorties, ni erreur)"""
+        return all(key in _FAST_UPDATE_FIELDS for key in updates)
+
+    @staticmethod
+    def _stamped(updates: Dict[str, Any], *date_fields: str) -> Dict[str, Any]:
+        """
+        Document de mise à jour $set + $currentDate : updated_at (et date_fields)
+        sont horodatés par le serveur, pas par le client
+        """
+        update = {"$currentDate": {field: True for field in ("updated_at",) + date_fields}}
+        if updates:
+            update["$set"] = updates
+        return update
+
     def is_connected(self) -> bool:
+        if self._client is None and self._reconnect_after_fork:
+            with self._lock:
+                if self._client is None and self._reconnect_after_fork:
+                    # Réouverture paresseuse du pool propre à ce processus
+                    self._reconnect_after_fork = False
+                    self._connect()
         return self._client is not None and self._db is not None
 
     # ==================== PROJETS ====================
@@ -94,6 +274,8 @@ class DatabaseService:
         if not self.is_connected():
             return None
 
+        now = datetime.now(timezone.utc)
+
         # Status par défaut ou personnalisé
         initial_status = status if status else ProjectStatus.CREATED.value
 
@@ -105,29 +287,11 @@ class DatabaseService:
             "step_name": None,  # Nom de l'étape en cours pour affichage
             "progress": 0,
             "config": config or {},
-            "steps": {
-                "convert": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "merge": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "silence": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "cut_sources": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "transcribe": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "shorts": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "broll": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "integrate_broll": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "seo": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-                "thumbnail": {"status": "pending", "started_at": None, "completed_at": None, "error": None},
-            },
-            "outputs": {
-                "original": None,
-                "nosilence": None,
-                "illustrated": None,
-                "thumbnail": None,
-                "shorts": [],
-                "seo": None,
-            },
+            "steps": {key: _STEP_TEMPLATE.copy() for key in _STEPS_TEMPLATE_KEYS},
+            "outputs": {**_OUTPUTS_TEMPLATE, "shorts": []},
             "celery_task_id": None,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
+            "created_at": now,
+            "updated_at": now,
             "completed_at": None,
         }
 
@@ -140,12 +304,12 @@ class DatabaseService:
             return None
 
         try:
-            project = self.projects.find_one({"_id": ObjectId(project_id)})
+            project = self.projects.find_one({"_id": _oid(project_id)})
             if project:
                 project["_id"] = str(project["_id"])
             return project
         except Exception as e:
-            print(f"[DB] Erreur get_project: {e}")
+            logger.error("Erreur get_project: %s", e)
             return None
 
     def get_project_by_folder(self, folder_name: str) -> Optional[Dict]:
@@ -162,9 +326,15 @@ class DatabaseService:
         self,
         status: Optional[str] = None,
         limit: int = 50,
-        skip: int = 0
+        skip: int = 0,
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[tuple]] = None
     ) -> List[Dict]:
-        """Récupérer tous les projets"""
+        """
+        Récupérer tous les projets (_id en ObjectId)
+        projection: champs à retourner (PROJECT_SUMMARY_FIELDS par défaut)
+        sort: tri MongoDB, par défaut [("created_at", -1)]
+        """
         if not self.is_connected():
             return []
 
@@ -172,49 +342,101 @@ class DatabaseService:
         if status:
             query["status"] = status
 
-        projects = list(
-            self.projects.find(query)
-            .sort("created_at", -1)
+        # _id reste un ObjectId : converti en texte seulement à la sérialisation JSON
+        return list(
+            self.projects.find(query, projection or PROJECT_SUMMARY_FIELDS)
+            .sort(sort or [("created_at", -1)])
             .skip(skip)
             .limit(limit)
         )
 
-        for project in projects:
-            project["_id"] = str(project["_id"])
+    def get_projects_with_shorts(
+        self,
+        limit: int = 100,
+        before: Optional[datetime] = None
+    ) -> List[Dict]:
+        """
+        Récupérer les projets qui ont des shorts (plus récents en premier).
+        has_shorts est posé par l'étape shorts du pipeline ; les projets sans ce champ
+        (anciens projets, shorts créés hors pipeline) sont inclus et vérifiés sur disque.
+        before: curseur de pagination (created_at du dernier projet de la page précédente)
+        """
+        if not self.is_connected():
+            return []
 
-        return projects
+        query = {"has_shorts": {"$ne": False}}
+        if before is not None:
+            query["created_at"] = {"$lt": before}
 
-    def get_projects_in_progress(self) -> List[Dict]:
-        """Récupérer les projets en cours de traitement"""
-        return self.get_all_projects(status=ProjectStatus.PROCESSING.value)
+        return list(
+            self.projects.find(
+                query,
+                {"folder_name": 1, "name": 1, "created_at": 1, "outputs.shorts": 1}
+            )
+            .sort("created_at", -1)
+            .limit(limit)
+        )
 
     def count_projects(self, status: Optional[str] = None) -> int:
         """Compter les projets"""
         if not self.is_connected():
             return 0
 
-        query = {}
-        if status:
-            query["status"] = status
+        if not status:
+            # Lu dans les métadonnées de la collection, sans parcours
+            return self.projects.estimated_document_count()
 
-        return self.projects.count_documents(query)
+        return self.projects.count_documents({"status": status})
 
-    def update_project(self, project_id: str, updates: Dict[str, Any]) -> bool:
-        """Mettre à jour un projet"""
+    def update_project(
+        self,
+        project_id: str,
+        updates: Dict[str, Any],
+        date_fields: tuple = ()
+    ) -> bool:
+        """
+        Mettre à jour un projet
+        date_fields: champs à horodater par le serveur en plus de updated_at
+        """
         if not self.is_connected():
             return False
 
+        # updated_at est horodaté par le serveur ; copie : le dict de l'appelant reste intact
+        updates = {key: value for key, value in updates.items() if key != "updated_at"}
+        if not updates and not date_fields:
+            return True
+
         try:
-            updates["updated_at"] = datetime.utcnow()
-            result = self.projects.update_one(
-                {"_id": ObjectId(project_id)},
-                {"$set": updates}
-            )
+            update = self._stamped(updates, *date_fields)
+            if not date_fields and self._is_fast_update(updates):
+                self._projects_fast.update_one({"_id": _oid(project_id)}, update)
+                return True
+
+            result = self.projects.update_one({"_id": _oid(project_id)}, update)
             return result.modified_count > 0
         except Exception as e:
-            print(f"[DB] Erreur update_project: {e}")
+            logger.error("Erreur update_project: %s", e)
             return False
 
+    def update_and_get(self, project_id: str, updates: Dict[str, Any]) -> Optional[Dict]:
+        """Mettre à jour un projet et renvoyer le document modifié (une seule commande)"""
+        if not self.is_connected():
+            return None
+
+        try:
+            updates = {key: value for key, value in updates.items() if key != "updated_at"}
+            project = self.projects.find_one_and_update(
+                {"_id": _oid(project_id)},
+                self._stamped(updates),
+                return_document=ReturnDocument.AFTER
+            )
+            if project:
+                project["_id"] = str(project["_id"])
+            return project
+        except Exception as e:
+            logger.error("Erreur update_and_get: %s", e)
+            return None
+
     def update_project_status(
         self,
         project_id: str,
@@ -228,10 +450,9 @@ class DatabaseService:
             updates["current_step"] = current_step
         if progress is not None:
             updates["progress"] = progress
-        if status == ProjectStatus.COMPLETED:
-            updates["completed_at"] = datetime.utcnow()
+        date_fields = ("completed_at",) if status == ProjectStatus.COMPLETED else ()
 
-        return self.update_project(project_id, updates)
+        return self.update_project(project_id, updates, date_fields)
 
     def update_step_status(
         self,
@@ -240,31 +461,91 @@ class DatabaseService:
         status: str,
         error: Optional[str] = None
     ) -> bool:
-        """Mettre à jour le statut d'une étape"""
+        """
+        Mettre à jour le statut d'une étape
+        Écriture immédiate, sans tampon : le statut est lu par les routes (autre processus)
+        et doit survivre à l'arrêt brutal d'un worker Celery
+        """
         if not self.is_connected():
             return False
 
         try:
-            update_data = {
-                f"steps.{step}.status": status,
-                "updated_at": datetime.utcnow()
-            }
+            update_data = {f"steps.{step}.status": status}
+            date_fields = ()
 
             if status == "processing":
-                update_data[f"steps.{step}.started_at"] = datetime.utcnow()
+                date_fields = (f"steps.{step}.started_at",)
             elif status in ["completed", "failed"]:
-                update_data[f"steps.{step}.completed_at"] = datetime.utcnow()
+                date_fields = (f"steps.{step}.completed_at",)
 
             if error:
                 update_data[f"steps.{step}.error"] = error
 
+            update = self._stamped(update_data, *date_fields)
+
+            # Démarrage d'étape : écriture w=0. Le filtre empêche une écriture
+            # arrivée en retard d'écraser une fin d'étape déjà enregistrée.
+            if status == "processing" and not error:
+                self._projects_fast.update_one(
+                    {
+                        "_id": _oid(project_id),
+                        f"steps.{step}.status": {"$nin": ["completed", "failed"]}
+                    },
+                    update
+                )
+                return True
+
+            result = self.projects.update_one({"_id": _oid(project_id)}, update)
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error("Erreur update_step_status: %s", e)
+            return False
+
+    def update_step_and_project(
+        self,
+        project_id: str,
+        step: Optional[str],
+        step_status: str,
+        project_status: str,
+        progress: Optional[int] = None,
+        current_step: Optional[int] = None,
+        step_name: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """Mettre à jour l'étape et le projet en une seule commande (une transition du pipeline)"""
+        if not self.is_connected():
+            return False
+
+        try:
+            update_data = {"status": project_status}
+            date_fields = []
+            if progress is not None:
+                update_data["progress"] = progress
+            if current_step is not None:
+                update_data["current_step"] = current_step
+            if step_name is not None:
+                update_data["step_name"] = step_name
+            if error:
+                update_data["error"] = error
+            if project_status == ProjectStatus.COMPLETED.value:
+                date_fields.append("completed_at")
+
+            if step:
+                update_data[f"steps.{step}.status"] = step_status
+                if step_status == "processing":
+                    date_fields.append(f"steps.{step}.started_at")
+                elif step_status in ["completed", "failed"]:
+                    date_fields.append(f"steps.{step}.completed_at")
+                if error:
+                    update_data[f"steps.{step}.error"] = error
+
             result = self.projects.update_one(
-                {"_id": ObjectId(project_id)},
-                {"$set": update_data}
+                {"_id": _oid(project_id)},
+                self._stamped(update_data, *date_fields)
             )
             return result.modified_count > 0
         except Exception as e:
-            print(f"[DB] Erreur update_step_status: {e}")
+            logger.error("Erreur update_step_and_project: %s", e)
             return False
 
     def set_celery_task_id(self, project_id: str, task_id: str) -> bool:
@@ -277,13 +558,79 @@ class DatabaseService:
             return False
 
         try:
-            result = self.projects.delete_one({"_id": ObjectId(project_id)})
+            result = self.projects.delete_one({"_id": _oid(project_id)})
             return result.deleted_count > 0
         except Exception as e:
-            print(f"[DB] Erreur delete_project: {e}")
+            logger.error("Erreur delete_project: %s", e)
             return False
 
 
+    # ==================== ACCÈS ASYNCHRONE (routes FastAPI) ====================
+    # Les tâches Celery et les services d'étapes sont synchrones et gardent PyMongo ;
+    # les lectures des routes FastAPI passent par Motor pour ne pas bloquer la boucle.
+    # Sans Motor, repli sur les méthodes PyMongo dans un thread.
+
+    async def connect(self) -> bool:
+        """Ouvrir le client Motor (paresseux : il se lie à la boucle d'événements courante)"""
+        if self._async_db is not None:
+            return True
+        if not MOTOR_AVAILABLE or not self.is_connected():
+            return False
+
+        self._async_client = AsyncIOMotorClient(MONGODB_URL, maxPoolSize=100)
+        self._async_db = self._async_client[MONGODB_DB]
+        return True
+
+    async def get_project_async(self, project_id: str) -> Optional[Dict]:
+        """Version asynchrone de get_project"""
+        if not await self.connect():
+            return await asyncio.to_thread(self.get_project, project_id)
+
+        try:
+            project = await self._async_db.projects.find_one({"_id": _oid(project_id)})
+            if project:
+                project["_id"] = str(project["_id"])
+            return project
+        except Exception as e:
+            logger.error("Erreur get_project_async: %s", e)
+            return None
+
+    async def get_all_projects_async(
+        self,
+        status: Optional[str] = None,
+        limit: int = 50,
+        skip: int = 0,
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[tuple]] = None
+    ) -> List[Dict]:
+        """Version asynchrone de get_all_projects"""
+        if not await self.connect():
+            return await asyncio.to_thread(
+                self.get_all_projects, status, limit, skip, projection, sort
+            )
+
+        query = {}
+        if status:
+            query["status"] = status
+
+        cursor = (
+            self._async_db.projects.find(query, projection or PROJECT_SUMMARY_FIELDS)
+            .sort(sort or [("created_at", -1)])
+            .skip(skip)
+            .limit(limit)
+        )
+        return await cursor.to_list(length=limit)
+
+    async def count_projects_async(self, status: Optional[str] = None) -> int:
+        """Version asynchrone de count_projects"""
+        if not await self.connect():
+            return await asyncio.to_thread(self.count_projects, status)
+
+        if not status:
+            return await self._async_db.projects.estimated_document_count()
+
+        return await self._async_db.projects.count_documents({"status": status})
+
     # ==================== CLÉS API ====================
 
     @property
@@ -297,10 +644,21 @@ class DatabaseService:
         if not self.is_connected():
             return None
 
+        with _api_key_cache_lock:
+            if key_name in _api_key_cache:
+                return _api_key_cache[key_name]
+
         doc = self.api_keys.find_one({"name": key_name})
-        if doc:
-            return doc.get("value")
-        return None
+        value = doc.get("value") if doc else None
+        with _api_key_cache_lock:
+            _api_key_cache[key_name] = value
+        return value
+
+    def _invalidate_api_key(self, key_name: str):
+        """Retirer une clé (et le dictionnaire complet) du cache"""
+        with _api_key_cache_lock:
+            _api_key_cache.pop(key_name, None)
+            _api_key_cache.pop(_ALL_API_KEYS, None)
 
     def set_api_key(self, key_name: str, value: str, description: str = "") -> bool:
         """Définir ou mettre à jour une clé API"""
@@ -314,18 +672,21 @@ class DatabaseService:
                     "$set": {
                         "name": key_name,
                         "value": value,
-                        "description": description,
-                        "updated_at": datetime.utcnow()
+                        "description": description
+                    },
+                    "$currentDate": {
+                        "updated_at": True
                     },
                     "$setOnInsert": {
-                        "created_at": datetime.utcnow()
+                        "created_at": datetime.now(timezone.utc)
                     }
                 },
                 upsert=True
             )
+            self._invalidate_api_key(key_name)
             return result.acknowledged
         except Exception as e:
-            print(f"[DB] Erreur set_api_key: {e}")
+            logger.error("Erreur set_api_key: %s", e)
             return False
 
     def delete_api_key(self, key_name: str) -> bool:
@@ -335,9 +696,10 @@ class DatabaseService:
 
         try:
             result = self.api_keys.delete_one({"name": key_name})
+            self._invalidate_api_key(key_name)
             return result.deleted_count > 0
         except Exception as e:
-            print(f"[DB] Erreur delete_api_key: {e}")
+            logger.error("Erreur delete_api_key: %s", e)
             return False
 
     def get_all_api_keys(self) -> List[Dict]:
@@ -345,27 +707,37 @@ class DatabaseService:
         if not self.is_connected():
             return []
 
-        keys = list(self.api_keys.find())
-        result = []
-        for key in keys:
-            value = key.get("value", "")
-            masked_value = value[:4] + "..." + value[-4:] if len(value) > 8 else "****"
-            result.append({
+        keys = self.api_keys.find(
+            {}, {"_id": 0, "name": 1, "value": 1, "description": 1, "updated_at": 1},
+            batch_size=32
+        )
+        return [
+            {
                 "name": key.get("name"),
-                "masked_value": masked_value,
+                "masked_value": _mask_api_key(key.get("value", "")),
                 "description": key.get("description", ""),
-                "has_value": bool(value),
+                "has_value": bool(key.get("value")),
                 "updated_at": key.get("updated_at")
-            })
-        return result
+            }
+            for key in keys
+        ]
 
     def get_api_keys_dict(self) -> Dict[str, str]:
         """Récupérer toutes les clés API comme dictionnaire"""
         if not self.is_connected():
             return {}
 
-        keys = list(self.api_keys.find())
-        return {key.get("name"): key.get("value", "") for key in keys}
+        with _api_key_cache_lock:
+            if _ALL_API_KEYS in _api_key_cache:
+                return dict(_api_key_cache[_ALL_API_KEYS])
+
+        keys_dict = {
+            key.get("name"): key.get("value", "")
+            for key in self.api_keys.find({}, {"_id": 0, "name": 1, "value": 1}, batch_size=32)
+        }
+        with _api_key_cache_lock:
+            _api_key_cache[_ALL_API_KEYS] = keys_dict
+        return dict(keys_dict)
 
     def init_default_api_keys(self):
         """Initialiser les clés API par défaut si elles n'existent pas"""
@@ -377,19 +749,31 @@ class DatabaseService:
             {"name": "GOOGLE_CLIENT_SECRET", "description": "Google OAuth Client Secret (YouTube)"},
         ]
 
-        for key_info in default_keys:
-            existing = self.api_keys.find_one({"name": key_info["name"]})
-            if not existing:
-                self.api_keys.insert_one({
+        # Un seul aller-retour : upsert sans écraser les valeurs déjà saisies
+        now = datetime.now(timezone.utc)
+        ops = [
+            UpdateOne(
+                {"name": key_info["name"]},
+                {"$setOnInsert": {
                     "name": key_info["name"],
                     "value": "",
                     "description": key_info["description"],
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                })
-                print(f"[DB] Clé API initialisée: {key_info['name']}")
-
+                    "created_at": now,
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            for key_info in default_keys
+        ]
+        result = self.api_keys.bulk_write(ops, ordered=False)
+        if result.upserted_count:
+            with _api_key_cache_lock:
+                _api_key_cache.clear()
+            logger.info("Clés API initialisées: %s", result.upserted_count)
 
 # Instance singleton
 db = DatabaseService()
 
+if MONGODB_AVAILABLE and hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=db._reset_after_fork)
+
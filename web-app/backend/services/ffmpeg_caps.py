@@ -0,0 +1,67 @@
+"""
+Capacites de FFmpeg : encodeurs H.264 materiels disponibles
+Detection une seule fois par binaire FFmpeg (resultat mis en cache)
+"""
+import os
+import subprocess
+from functools import lru_cache
+
+# Encodeurs materiels par ordre de preference, avec des reglages proches de libx264 CRF 18
+HW_H264_ENCODERS = [
+    ('h264_nvenc', ['-c:v', 'h264_nvenc', '-preset', 'p5', '-rc', 'vbr', '-cq', '20', '-b:v', '0']),
+    ('h264_qsv', ['-c:v', 'h264_qsv', '-preset', 'medium', '-global_quality', '20']),
+    ('h264_videotoolbox', ['-c:v', 'h264_videotoolbox', '-q:v', '65']),
+    ('h264_amf', ['-c:v', 'h264_amf', '-quality', 'quality', '-rc', 'cqp', '-qp_i', '20', '-qp_p', '20']),
+]
+SOFTWARE_H264_ARGS = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '18']
+
+
+def _encoder_works(ffmpeg_path: str, encoder: str) -> bool:
+    """Un encodeur liste par -encoders peut etre compile sans GPU present : essai sur 2 images"""
+    try:
+        proc = subprocess.run([
+            ffmpeg_path, '-hide_banner', '-v', 'error',
+            '-f', 'lavfi', '-i', 'color=black:s=256x256:r=25',
+            '-frames:v', '2',
+            '-c:v', encoder,
+            '-f', 'null', '-'
+        ], capture_output=True, timeout=15)
+        return proc.returncode == 0
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=8)
+def available_hw_encoders(ffmpeg_path: str) -> tuple:
+    """Encodeurs H.264 materiels compiles dans FFmpeg ET utilisables sur cette machine"""
+    try:
+        listing = subprocess.run(
+            [ffmpeg_path, '-hide_banner', '-encoders'],
+            capture_output=True, text=True, timeout=15
+        ).stdout
+    except Exception as e:
+        print(f"[FFmpeg] Liste des encodeurs indisponible: {e}")
+        return ()
+
+    found = tuple(
+        name for name, _ in HW_H264_ENCODERS
+        if name in listing and _encoder_works(ffmpeg_path, name)
+    )
+    print(f"[FFmpeg] Encodeurs materiels: {', '.join(found) if found else 'aucun (libx264)'}")
+    return found
+
+
+def preferred_h264_args(ffmpeg_path: str) -> list:
+    """
+    Arguments d'encodage video H.264 : encodeur materiel si disponible, sinon libx264
+    FFMPEG_HW_ENCODER=off force libx264 (ou le nom d'un encodeur pour l'imposer)
+    """
+    choice = os.environ.get('FFMPEG_HW_ENCODER', '').strip().lower()
+    if choice in ('off', '0', 'false', 'libx264'):
+        return list(SOFTWARE_H264_ARGS)
+
+    available = available_hw_encoders(ffmpeg_path)
+    for name, args in HW_H264_ENCODERS:
+        if name in available and (not choice or choice == name):
+            return list(args)
+    return list(SOFTWARE_H264_ARGS)
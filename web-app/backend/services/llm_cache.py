@@ -0,0 +1,65 @@
+"""
+Cache des réponses LLM (relances du pipeline, rafraîchissements UI)
+Mémoire (LRU) + disque si diskcache est installé. Valeurs stockées en JSON (copies).
+"""
+import os
+import json
+import hashlib
+import importlib.util
+import orjson
+from cachetools import LRUCache
+
+DISKCACHE_AVAILABLE = importlib.util.find_spec("diskcache") is not None
+
+LLM_CACHE_TTL = 7 * 24 * 3600  # secondes (disque)
+_memory_cache = LRUCache(maxsize=256)
+_disk_cache = None
+
+
+def make_key(*parts) -> str:
+    """Clé SHA-256 (correspondance exacte) des paramètres d'une requête"""
+    raw = "|".join(
+        part if isinstance(part, str) else json.dumps(part, sort_keys=True, ensure_ascii=False)
+        for part in parts
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get_disk_cache():
+    global _disk_cache
+    if _disk_cache is None and DISKCACHE_AVAILABLE:
+        try:
+            import diskcache
+            _disk_cache = diskcache.Cache(os.getenv("OPENROUTER_CACHE_DIR", ".openrouter_cache"))
+        except Exception as e:
+            print(f"[LLMCache] Cache disque indisponible: {e}")
+    return _disk_cache
+
+
+def get(key: str):
+    """Réponse en cache (copie) ou None"""
+    value = _memory_cache.get(key)
+    if value is None:
+        disk = _get_disk_cache()
+        try:
+            value = disk.get(key) if disk is not None else None
+        except Exception as e:
+            print(f"[LLMCache] Lecture disque impossible: {e}")
+            value = None
+        if value is None:
+            return None
+        _memory_cache[key] = value
+    return orjson.loads(value)
+
+
+def put(key: str, value, ttl: int = LLM_CACHE_TTL) -> None:
+    """Mémoriser une réponse (sérialisée en JSON)"""
+    data = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    _memory_cache[key] = data
+    disk = _get_disk_cache()
+    if disk is not None:
+        # Une erreur disque ne doit pas faire perdre la réponse obtenue
+        try:
+            disk.set(key, data, expire=ttl)
+        except Exception as e:
+            print(f"[LLMCache] Écriture disque impossible: {e}")
@@ -2,36 +2,627 @@
 Service OpenRouter pour génération SEO YouTube et suggestions de shorts
 """
 import os
+import re
 import json
-from typing import Optional, Dict, List
+import bisect
+import asyncio
+import logging
+import importlib.util
+import orjson
+from typing import Optional, Dict, List, Tuple, Iterator, AsyncGenerator
 from pathlib import Path
-from dotenv import load_dotenv
+from functools import lru_cache
+from services import llm_cache
+
+# Dépendances importées au premier usage (openai tire httpx, pydantic... au démarrage) :
+# seule leur présence est vérifiée ici
+OPENAI_AVAILABLE = (
+    importlib.util.find_spec("openai") is not None
+    and importlib.util.find_spec("httpx") is not None
+)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None  # HTTP/2 pour httpx
+TIKTOKEN_AVAILABLE = importlib.util.find_spec("tiktoken") is not None
+MSGSPEC_AVAILABLE = importlib.util.find_spec("msgspec") is not None
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+# Journal du service (même préfixe que les messages print du module)
+logger = logging.getLogger("openrouter")
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("[OpenRouter] %(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_env_loaded = False
+
+
+def _load_env():
+    """Charger le .env depuis la racine du projet (une fois par processus)"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+    env_path = Path(__file__).parent.parent.parent.parent / ".env"
+    if env_path.exists():
+        load_dotenv(env_path)
+    else:
+        load_dotenv()  # Essayer le .env local
+    _env_loaded = True
+
+
+# Sortie structurée de generate_youtube_seo (mode strict : pas de minItems/maxLength,
+# les bornes sont données dans les descriptions)
+SEO_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "seo",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["title", "description", "keywords", "hashtags"],
+            "properties": {
+                "title": {
+                    "type": "string",
+                    "description": "Titre accrocheur, max 70 caractères"
+                },
+                "description": {
+                    "type": "string",
+                    "description": "200-300 mots : résumé, points clés avec emojis, call-to-action"
+                },
+                "keywords": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "10 à 15 mots-clés YouTube, sans #"
+                },
+                "hashtags": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "10 à 15 hashtags commençant par #"
+                }
+            }
+        }
+    }
+}
+
+# Budget d'entrée en tokens (tiktoken), repli en caractères sans tiktoken
+MAX_INPUT_TOKENS = 6000
+MAX_INPUT_CHARS = 8000
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and TIKTOKEN_AVAILABLE:
+        import tiktoken
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def _input_size(text: str) -> int:
+    """Taille d'un texte dans l'unité du budget (tokens, ou caractères sans tiktoken)"""
+    encoding = _get_encoding()
+    return len(encoding.encode(text)) if encoding else len(text)
+
+
+def _input_budget() -> int:
+    return MAX_INPUT_TOKENS if _get_encoding() else MAX_INPUT_CHARS
+
+
+def _truncate_transcript(transcript: str, segments: Optional[list]) -> str:
+    """
+    Tronquer la transcription au budget d'entrée sur une frontière naturelle :
+    segments entiers si disponibles, sinon fin de phrase (ou ligne)
+    """
+    budget = _input_budget()
+    encoding = _get_encoding()
+    tokens = encoding.encode(transcript) if encoding else None
+    if (len(tokens) if encoding else len(transcript)) <= budget:
+        return transcript
+    
+    if segments:
+        parts = []
+        total = 0
+        for seg in segments:
+            text = seg['text'].strip()
+            size = _input_size(text) + 1
+            if total + size > budget:
+                break
+            parts.append(text)
+            total += size
+        if parts:
+            return "\n".join(parts) + "..."
+    
+    # Texte du budget, puis coupe à la dernière fin de phrase
+    head = encoding.decode(tokens[:budget]) if encoding else transcript[:budget]
+    cut = max(head.rfind('.'), head.rfind('\n'))
+    end = cut + 1 if cut > 0 else len(head)
+    return head[:end].rstrip() + "..."
+
+
+# Guillemets retirés des titres générés (str.translate : une seule passe)
+_QUOTE_STRIP = str.maketrans("", "", "\"'")
+
+
+# Écart max (s) entre un timestamp proposé par le LLM et la frontière de segment la plus proche
+SHORT_SNAP_TOLERANCE = 1.0
+
+
+def _snap_to_boundary(boundaries: List[float], value: float) -> float:
+    """Frontière la plus proche de value dans une liste triée (voisins de bisect)"""
+    i = bisect.bisect_left(boundaries, value)
+    neighbors = boundaries[max(0, i - 1):i + 1]
+    return min(neighbors, key=lambda boundary: abs(boundary - value)) if neighbors else value
+
+
+# Clients OpenRouter du processus : clé API -> (boucle d'événements, client)
+_shared_clients: Dict[str, tuple] = {}
+
+# Délai max de la génération d'image Gemini (plus longue qu'une complétion texte)
+GEMINI_TIMEOUT = 120.0
+
+
+def _close_superseded(client_loop, client) -> None:
+    """
+    Fermer un client remplacé, sur la boucle à laquelle il est lié si elle tourne encore
+    (autre thread). Boucle déjà arrêtée : voir close_shared_clients, appelé avant sa fermeture.
+    """
+    if client_loop.is_running() and not client_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.close(), client_loop)
+
+
+async def close_shared_clients() -> None:
+    """Fermer les clients OpenRouter liés à la boucle courante (arrêt de l'application)"""
+    loop = asyncio.get_running_loop()
+    for api_key, (client_loop, client) in list(_shared_clients.items()):
+        if client_loop is loop:
+            await client.close()
+            del _shared_clients[api_key]
+
+# Plafonds de sortie par appel. Sortie JSON stricte : une réponse tronquée ne se parse
+# pas, d'où une marge large tant que completion_tokens n'a pas été mesuré en production
+# (à resserrer ensuite vers p99 x 1.3). Les troncatures apparaissent dans les logs (finish_reason=length).
+SEO_MAX_TOKENS = 1500
+SHORTS_MAX_TOKENS = 1000
+CHAPTER_TITLE_MAX_TOKENS = 40
+CHAPTER_TITLES_TOKENS_PER_ITEM = 25
+
+# Appels simultanés max pour les titres de chapitres (limites de débit OpenRouter)
+CHAPTER_TITLE_CONCURRENCY = 8
+
+# Consignes partagées entre les prompts dédiés et analyze_video_bundle
+ILLUSTRATION_GUIDELINES = """CRITÈRES:
+- Privilégier les moments visuellement représentables (actions, objets, lieux)
+- Éviter les concepts trop abstraits
+- Espacer les B-rolls (pas 2 B-rolls consécutifs)
+
+MOTS-CLÉS POUR CLIPS VIDÉO:
+- Utiliser des termes GÉNÉRIQUES et CONCRETS (ex: "coding", "typing", "city", "nature")
+- Éviter les termes trop spécifiques qui ne trouveront pas de résultats
+- Penser "vidéo en mouvement" pas "image fixe\""""
+
+THUMBNAIL_VISUAL_GUIDELINES = """Le prompt visuel doit inclure:
+- LE PERSONNAGE PHOTORÉALISTE: Le personnage de la webcam doit être GRAND (45-55% de l'image), apparaissant NATURELLEMENT au premier plan avec un effet de profondeur réaliste. Le personnage doit être PHOTORÉALISTE (comme une vraie photo, pas cartoon, pas illustration). Éclairage portrait réaliste (lumière clé naturelle, rim lighting subtil, ombre portée naturelle), expression naturelle mais expressive (surprise, enthousiasme), personnage naturellement positionné
+- Le texte principal (le titre créé) en TRÈS GRAND (60-70% de la hauteur), BOLD, UPPERCASE, avec contour épais noir (10px) et couleur jaune vif ou blanc, positionné DERRIÈRE le personnage (créant des couches de profondeur réalistes)
+- Flèches rouges géantes pointant vers le texte ET le personnage
+- Cercles rouges, badges "NEW" ou "HOT" autour du personnage
+- Explosions, éclairs, effets de vitesse DERRIÈRE le personnage (fond très flou avec bokeh réaliste) pour le faire ressortir naturellement
+- Couleurs vives (rouge #FF0000, jaune #FFFF00, bleu #00FFFF)
+- Composition photoréaliste avec profondeur: Personnage au premier plan (gauche ou droite, naturellement positionné), texte au centre/haut DERRIÈRE le personnage, effets dynamiques en arrière-plan très flou avec bokeh réaliste
+- Éclairage portrait réaliste: Lumière clé naturelle sur le visage créant des ombres réalistes, rim lighting subtil autour du personnage (séparation naturelle), fond naturellement plus sombre pour contraste réaliste
+- Style PHOTORÉALISTE professionnel avec profondeur de champ EXTREME (personnage net comme une photo portrait f/1.4, fond très flou avec bokeh crémeux réaliste), ombre portée naturelle derrière le personnage créant la profondeur réaliste"""
+
+SHORT_METADATA_RULES = """RÈGLES:
+1. Titre: Maximum 60 caractères, accrocheur, avec emoji
+2. Description: 2-3 lignes engageantes
+3. Inclure un appel à l'action pour rejoindre la communauté
+4. Mentionner: skool.com/vibeacademy ou vibeacademy.eu
+5. Ajouter 5-10 hashtags pertinents"""
+
+# Consignes fixes de generate_short_metadata (préfixe mis en cache, voir _cacheable_text) :
+# seule la transcription du short, en fin de message utilisateur, change d'un appel à l'autre
+SHORT_METADATA_SYSTEM_PROMPT = f"""Tu génères du contenu viral pour les réseaux sociaux. Réponds uniquement en JSON valide.
+
+Tu es un expert en création de contenu viral. Génère un titre et une description pour le short YouTube/TikTok dont la transcription est fournie.
+
+{SHORT_METADATA_RULES}
+
+Réponds au format JSON:
+{{
+  "title": "🔥 Titre accrocheur ici",
+  "description": "Description engageante...\\n\\n🚀 Rejoins la communauté: skool.com/vibeacademy",
+  "hashtags": ["#short", "#tutorial", "#tech"]
+}}"""
+
+# Consignes fixes de l'analyse des illustrations (préfixe mis en cache, voir _cacheable_text)
+ILLUSTRATION_SYSTEM_PROMPT = f"""Tu es un expert en montage vidéo. Tu identifies les moments où des B-rolls (clips d'illustration) amélioreraient une vidéo. Réponds uniquement en JSON valide.
+
+Analyse la transcription vidéo fournie et identifie les meilleurs moments pour insérer un B-ROLL (clip vidéo uniquement, PAS d'image fixe).
+
+INSTRUCTIONS:
+1. Respecte le nombre maximum de moments demandé (pas plus !)
+2. Choisis des moments espacés dans la vidéo
+3. Pour chaque moment, fournis:
+   - timestamp: le moment exact en secondes
+   - duration: durée du B-roll (2-3 secondes)
+   - keyword: mot-clé EN ANGLAIS pour rechercher un CLIP VIDÉO sur Pexels (1-2 mots simples)
+   - reason: pourquoi ce moment mérite un B-roll
+
+{ILLUSTRATION_GUIDELINES}
+
+Exemple de moment: {{"timestamp": 15.5, "duration": 4, "keyword": "coding laptop", "reason": "Moment de programmation"}}"""
+
+# Sortie structurée de l'analyse des illustrations (le mode strict impose un objet à la racine)
+ILLUSTRATIONS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "illustrations",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "additionalProperties": False,
+            "required": ["illustrations"],
+            "properties": {
+                "illustrations": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "required": ["timestamp", "duration", "keyword", "reason"],
+                        "properties": {
+                            "timestamp": {"type": "number", "description": "Moment exact en secondes"},
+                            "duration": {"type": "number", "description": "Durée du B-roll (2-3 secondes)"},
+                            "keyword": {"type": "string", "description": "Mot-clé EN ANGLAIS pour Pexels (1-2 mots)"},
+                            "reason": {"type": "string"}
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+
+# Consignes fixes de generate_thumbnail_with_gemini (préfixe mis en cache, voir _cacheable_text)
+THUMBNAIL_REQUIREMENTS = """CRITICAL VIRAL THUMBNAIL REQUIREMENTS (MUST FOLLOW ALL):
+1. TEXT IS MANDATORY AND DOMINANT:
+   - Include the main title text EXTREMELY LARGE (70-80% of image height)
+   - Text must be BOLD, UPPERCASE, with THICK black outline (10-12px) for maximum readability
+   - Text color: Bright yellow (#FFFF00) or white (#FFFFFF) with black outline
+   - Position: Centered or slightly diagonal for dynamism
+   - Add strong drop shadow and glow effect
+   - Background: Dark semi-transparent overlay (black with 50% opacity) behind text
+
+2. ULTRA-VIBRANT COLORS:
+   - Primary: Bright red (#FF0000), electric yellow (#FFFF00), neon blue (#00FFFF)
+   - Extreme contrasts: Dark backgrounds with bright foregrounds
+   - Saturation: MAXIMUM (100%)
+
+3. SHOCK ELEMENTS (MUST INCLUDE):
+   - Large red arrows (2-3) pointing directly at the text
+   - Red circles or badges with "NEW", "HOT", "FREE", or "10X"
+   - Explosion effects around key elements
+   - Lightning bolts or electric effects
+   - Speed lines or motion blur
+   - Particle effects
+
+4. NATURAL BUT EXPRESSIVE EMOTIONS FROM THE PERSON:
+   - THE PERSON'S FACE must show NATURAL emotion (surprised, excited, but REALISTIC, not exaggerated cartoon)
+   - Person's expression should be NATURAL and PHOTOREALISTIC (like a real person, not cartoon)
+   - Person's hands NATURALLY positioned or gesturing (realistic gesture, not dramatic cartoon)
+   - The person's expression should NATURALLY convey the emotion of the video topic
+   - Person should look NATURALLY at camera or at the text (natural eye contact, photorealistic)
+
+5. PHOTOREALISTIC COMPOSITION WITH REALISTIC 3D DEPTH:
+   - THE PERSON IS THE DOMINANT ELEMENT (45-55% of image, large, naturally in foreground, PHOTOREALISTIC)
+   - Person positioned naturally on left or right side (rule of thirds, realistic portrait composition)
+   - Text positioned BEHIND person (creating realistic depth layers: Person in front, text behind)
+   - EXTREME DEPTH LAYERS: Foreground (PERSON - crystal sharp, photorealistic), Midground (text - slightly blurred), Background (effects - heavily blurred with realistic bokeh)
+   - Person naturally in front of other elements (realistic depth, not breaking frame unnaturally)
+   - Natural composition: Professional portrait composition, person naturally positioned
+   - Person's shadow naturally cast (realistic lighting, natural shadow)
+   - Natural pose: Person naturally positioned, photorealistic
+
+6. HOOK ELEMENTS:
+   - Large numbers or percentages (if relevant)
+   - Badges or stickers
+   - Call-to-action elements
+
+7. PHOTOREALISTIC QUALITY WITH REALISTIC 3D DEPTH:
+   - REALISTIC PORTRAIT LIGHTING ON PERSON: 
+     * REALISTIC KEY LIGHT from front-left/right creating natural shadows on face (like professional portrait)
+     * NATURAL RIM LIGHT from behind creating realistic separation (not glowing, just natural highlight)
+     * NATURAL BACK LIGHT creating realistic separation and volume
+     * Natural light sources creating REALISTIC 3D FORM (face looks naturally rounded, photorealistic)
+   - PERFECT PHOTOREALISTIC SHARPNESS: PERSON crystal sharp (like f/1.4 portrait, photorealistic), text slightly soft, background EXTREMELY blurred with realistic bokeh
+   - EXTREME DEPTH OF FIELD: PERSON in perfect focus (appears close, photorealistic), background EXTREMELY blurred with CREAMY BOKEH (appears far, realistic)
+   - REALISTIC COLOR GRADING: Person warm/vibrant colors (appears close), background cool/desaturated (appears far, realistic)
+   - NATURAL SEPARATION: Person naturally separated from background through realistic depth of field and natural lighting (NO glowing halos on person, keep person photorealistic)
+   - NATURAL CONTRAST: Person naturally contrasted (realistic highlights and shadows), background naturally softer
+   - REALISTIC SHADOWS: Natural cast shadow (realistic lighting, natural shadow falloff)
+   - The person should look PHOTOREALISTIC, like a REAL PROFESSIONAL PHOTOGRAPH with realistic depth of field
+
+8. TECHNICAL SPECS:
+   - Resolution: 1280x720 pixels (16:9 aspect ratio)
+   - Format: High quality, sharp, no compression artifacts
+   - Every pixel must be optimized for maximum clickability
+
+MAXIMUM CLICKABILITY RULE: Every single element must scream "CLICK ME NOW!" The thumbnail should be impossible to ignore."""
+
+THUMBNAIL_PERSON_PROMPT = """CRITICAL: THE PERSON FROM THE PROVIDED IMAGE MUST BE PHOTOREALISTIC (REAL-LIFE PHOTO) BUT WITH EXTREME 3D DEPTH:
+
+1. PHOTOREALISTIC PERSON WITH 3D DEPTH:
+   - The person must look like a REAL PHOTOGRAPH (photorealistic, not cartoon, not illustration)
+   - Use REALISTIC forced perspective: Person appears MUCH CLOSER than background (like real portrait photography)
+   - Create REALISTIC illusion of depth: Person's face/body should appear naturally in foreground
+   - The person should look like they're NATURALLY IN FRONT OF THE CAMERA (realistic close-up portrait)
+
+2. REALISTIC BUT DRAMATIC 3D LIGHTING:
+   - REALISTIC KEY LIGHT: Bright but natural spotlight from front-left or front-right (like professional portrait studio)
+   - REALISTIC RIM LIGHTING: Natural edge light around the person creating realistic separation (not glowing, just natural highlight)
+   - REALISTIC FILL LIGHT: Soft natural fill light on shadow side to maintain detail
+   - REALISTIC BACK LIGHT: Natural light from behind creating realistic separation from background
+   - The lighting should create REALISTIC 3D VOLUME (face looks naturally rounded, photorealistic)
 
-# Charger le .env depuis la racine du projet
-env_path = Path(__file__).parent.parent.parent.parent / ".env"
-if env_path.exists():
-    load_dotenv(env_path)
-else:
-    load_dotenv()  # Essayer le .env local
+3. REALISTIC SIZE AND SCALE WITH 3D PERSPECTIVE:
+   - The person must occupy 45-55% of the thumbnail (large, realistic portrait size)
+   - Face should be LARGE (like a professional portrait close-up, realistic)
+   - Use REALISTIC foreshortening: Natural perspective (hands/arms closer appear naturally larger)
+   - The person should appear to be NATURALLY IN FRONT OF THE CAMERA (realistic close-up, not extreme)
+
+4. REALISTIC 3D SHADOWS AND DEPTH:
+   - REALISTIC CAST SHADOW: Natural shadow BEHIND the person (realistic lighting, natural shadow)
+   - Shadow should be NATURAL and REALISTIC (like person standing in real studio light)
+   - Natural shadow falloff: Shadow gets softer as it extends away (realistic)
+   - Shadow should look REALISTIC (not exaggerated, just natural depth)
 
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+5. PHOTOREALISTIC VOLUME AND FORM:
+   - Face must have NATURAL 3D VOLUME (realistic cheekbones, nose, chin with natural depth)
+   - Use REALISTIC chiaroscuro (natural light/dark contrast) to show 3D form
+   - Clothing should show NATURAL folds and wrinkles (realistic texture, photorealistic)
+   - Hair should have NATURAL volume and depth (realistic hair, photorealistic)
+   - The person should look PHOTOREALISTIC, like a REAL PHOTOGRAPH, not a cartoon or illustration
+
+6. NATURAL BUT EXPRESSIVE EXPRESSION AND POSE:
+   - NATURAL facial expression (surprised, excited, but REALISTIC, not exaggerated cartoon)
+   - Person NATURALLY positioned (not leaning unnaturally, just naturally forward)
+   - Hands/arms NATURALLY positioned or gesturing (realistic gesture, not dramatic cartoon)
+   - Natural eye contact and expression (realistic)
+   - REALISTIC pose: Natural body position, photorealistic
+
+7. VISUAL EFFECTS FOR 3D POP-OUT (BUT PERSON STAYS REALISTIC):
+   - NATURAL DEPTH BLUR: Background heavily blurred with REALISTIC bokeh (like f/1.4 portrait), person crystal sharp
+   - NATURAL COLOR SEPARATION: Person naturally vibrant, background naturally desaturated (realistic color grading)
+   - PARTICLE EFFECTS: Sparks, energy, light rays AROUND the person (visual effects, but person stays photorealistic)
+   - NO ARTIFICIAL GLOWING HALO on person (keep person realistic, effects are separate)
+   - REFLECTIONS: Natural reflections on person's skin/clothing (realistic surface properties)
+
+8. REALISTIC COMPOSITION WITH 3D DEPTH:
+   - Person positioned naturally on left/right (rule of thirds, realistic portrait composition)
+   - Text positioned behind person (creating realistic depth layers)
+   - Person naturally in front of other elements (realistic depth)
+   - Natural composition: Professional portrait composition
+   - Person should look NATURALLY IN FRONT (realistic depth, not breaking frame unnaturally)
+
+9. PHOTOREALISTIC TECHNICAL QUALITY WITH 3D DEPTH:
+   - EXTREME DEPTH OF FIELD: Person EXTREMELY sharp (like f/1.4 portrait, photorealistic), background EXTREMELY blurred (realistic bokeh)
+   - REALISTIC COLOR GRADING: Person warm tones, background cool tones (realistic color separation)
+   - NATURAL CONTRAST: Person naturally contrasted (realistic highlights and shadows), background naturally softer
+   - NATURAL SATURATION: Person naturally saturated, background naturally desaturated
+   - The person should look like a REAL PHOTOGRAPH with realistic depth of field
+
+STYLE: PHOTOREALISTIC, REALISTIC, LIKE A REAL PHOTOGRAPH. The person must look REAL, not cartoon, not illustration, not 3D model.
+BUT with extreme depth of field and visual effects around them for 3D pop-out effect.
+
+USE THE PERSON'S EXACT LIKENESS FROM THE PROVIDED IMAGE, and render them PHOTOREALISTICALLY (like a real photograph) with REALISTIC 3D DEPTH through natural depth of field and realistic lighting. The person should look like a REAL PERSON IN A REAL PHOTOGRAPH, not a cartoon, not an illustration, not a 3D model."""
+
+# Consignes complètes quand la frame webcam est fournie (personnage + miniature)
+THUMBNAIL_PERSON_REQUIREMENTS = f"{THUMBNAIL_PERSON_PROMPT}\n\n{THUMBNAIL_REQUIREMENTS}"
+
+# Partie dynamique de generate_thumbnail_with_gemini : HEADER + description + FOOTER
+THUMBNAIL_PROMPT_HEADER = "Create a VIRAL YouTube thumbnail image that will get MILLIONS of clicks. Follow these specifications EXACTLY:\n\n"
+THUMBNAIL_PROMPT_FOOTER = "\n\nGenerate the COMPLETE thumbnail image WITH ALL TEXT AND ELEMENTS NOW. Make it ULTRA-VIRAL, CLICKABLE, and PROFESSIONAL!"
+
+# analyze_video_bundle : plafond de sortie (illustrations + miniature + métadonnées par short)
+BUNDLE_BASE_MAX_TOKENS = 1900
+BUNDLE_TOKENS_PER_SHORT = 300
+
+
+def _cacheable_text(text: str) -> Dict:
+    """
+    Bloc de texte marqué pour le cache de prompt (cache_control, relayé par OpenRouter
+    aux fournisseurs qui le gèrent : Anthropic, Gemini ; OpenAI met en cache
+    automatiquement les préfixes identiques). À placer avant la partie dynamique.
+    """
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def _log_prompt_cache(usage) -> None:
+    """Tracer les tokens d'entrée servis par le cache de prompt du fournisseur"""
+    if not usage:
+        return
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        cached_tokens = details.get("cached_tokens") or 0
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    if cached_tokens:
+        print(f"[OpenRouter] Cache de prompt: {cached_tokens}/{prompt_tokens} tokens d'entrée")
+
+
+# Extraction des réponses texte en une passe : bloc ```json ... ``` et format TITLE / VISUAL PROMPT
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_TITLE_RE = re.compile(r"TITLE:\s*(.+?)\s*(?:VISUAL PROMPT:\s*(.*))?$", re.DOTALL | re.IGNORECASE)
+_VISUAL_RE = re.compile(r"VISUAL PROMPT:\s*(.*)$", re.DOTALL | re.IGNORECASE)
+# Titre complet dans une réponse JSON encore partielle (flux en cours)
+_PARTIAL_TITLE_RE = re.compile(r'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+_illustrations_type = None
+
+
+def _get_illustrations_type():
+    """Type msgspec de ILLUSTRATIONS_RESPONSE_FORMAT (construit au premier usage, msgspec importé à ce moment)"""
+    global _illustrations_type
+    if _illustrations_type is None:
+        import msgspec
+        
+        class Illustration(msgspec.Struct):
+            timestamp: float = 0.0
+            duration: float = 3.0
+            keyword: str = ""
+            reason: str = ""
+        
+        class IllustrationsResponse(msgspec.Struct):
+            illustrations: List[Illustration] = []
+        
+        _illustrations_type = IllustrationsResponse
+    return _illustrations_type
+
+
+@lru_cache(maxsize=4096)
+def _format_hms(total_seconds: int) -> str:
+    """HH:MM:SS d'un nombre entier de secondes (mémoïsé : les mêmes secondes reviennent)"""
+    hours, rest = divmod(total_seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def _strip_code_fence(content: str) -> str:
+    """Contenu du premier bloc de code markdown, ou le texte tel quel s'il n'y en a pas"""
+    m = _FENCE_RE.search(content)
+    return m.group(1).strip() if m else content
+
+
+# Taille max de la transcription horodatée envoyée pour les illustrations (caractères)
+ILLUSTRATION_TRANSCRIPT_CHARS = 6000
+
+# Taille des tranches base64 décodées vers le disque (multiple de 4 : tranches décodables seules)
+BASE64_CHUNK_CHARS = 64 * 1024
+_BASE64_WHITESPACE_RE = re.compile(r"\s")
+
+
+def _save_base64_image(data: str, output_path: str, start: int = 0, end: Optional[int] = None) -> None:
+    """
+    Décoder data[start:end] (base64) directement dans output_path, par tranches :
+    la charge utile (~2 Mo pour une miniature) n'est jamais recopiée en entier.
+    """
+    import binascii
+    
+    end = len(data) if end is None else end
+    with open(output_path, "wb") as f:
+        # Retours à la ligne / espaces : les tranches ne seraient plus alignées sur 4 caractères
+        if _BASE64_WHITESPACE_RE.search(data, start, end):
+            f.write(binascii.a2b_base64(data[start:end]))
+            return
+        for offset in range(start, end, BASE64_CHUNK_CHARS):
+            f.write(binascii.a2b_base64(data[offset:min(offset + BASE64_CHUNK_CHARS, end)]))
+
+
+# Frame webcam envoyée à Gemini : assez de pixels pour la ressemblance, ~10x moins de données
+WEBCAM_FRAME_MAX_SIZE = (512, 512)
+WEBCAM_FRAME_JPEG_QUALITY = 85
+
+
+def _downscale_frame_base64(frame_base64: str) -> str:
+    """Réduire une image base64 à WEBCAM_FRAME_MAX_SIZE (JPEG) ; inchangée si Pillow est absent"""
+    if not PIL_AVAILABLE:
+        return frame_base64
+    import io
+    import base64
+    from PIL import Image
+    
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(frame_base64)))
+        if img.width <= WEBCAM_FRAME_MAX_SIZE[0] and img.height <= WEBCAM_FRAME_MAX_SIZE[1]:
+            return frame_base64
+        img.thumbnail(WEBCAM_FRAME_MAX_SIZE, Image.LANCZOS)
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, "JPEG", quality=WEBCAM_FRAME_JPEG_QUALITY, optimize=True)
+        return base64.b64encode(buf.getvalue()).decode("ascii")
+    except Exception as e:
+        print(f"[OpenRouter] Réduction de la frame webcam impossible: {e}")
+        return frame_base64
+
+
+def _write_debug_json(path: Path, data: Dict) -> None:
+    """Écrire une réponse brute pour le débogage (orjson : sérialisation en C)"""
+    path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+
+def _iter_image_payloads(message: Dict) -> Iterator[Tuple[str, str, int, Optional[int]]]:
+    """
+    Images base64 d'un message de réponse, dans l'ordre de priorité :
+    images[] (format Gemini), contenu multimodal, puis contenu texte brut.
+    Produit (origine, chaîne source, début, fin) : le base64 est source[début:fin].
+    """
+    def data_url(label: str, url: str):
+        start = _base64_payload_start(url) if url.startswith("data:image") else -1
+        return (label, url, start, None) if start >= 0 else None
+    
+    candidates = []
+    for img in message.get("images") or []:
+        img_type = img.get("type", "")
+        if img_type == "image_url":
+            candidates.append(data_url("images[].image_url", img.get("image_url", {}).get("url", "")))
+        elif img_type == "image" and img.get("b64_json"):
+            candidates.append(("images[].b64_json", img["b64_json"], 0, None))
+    
+    content = message.get("content")
+    if isinstance(content, list):
+        for item in content:
+            item_type = item.get("type", "")
+            if item_type == "image_url":
+                candidates.append(data_url("image_url", item.get("image_url", {}).get("url", "")))
+            elif item_type == "image" and item.get("image", {}).get("b64_json"):
+                candidates.append(("b64_json", item["image"]["b64_json"], 0, None))
+            elif item_type == "image" and "url" in item:
+                candidates.append(data_url("image.url", item.get("url", "")))
+    elif isinstance(content, str) and (
+        "data:image" in content or content.startswith("/9j/") or content.startswith("iVBOR")
+    ):
+        # Base64 dans le texte : borné par le guillemet qui suit "base64," s'il y en a un
+        start = _base64_payload_start(content)
+        end = None
+        if start >= 0:
+            quote = content.find('"', start)
+            end = quote if quote >= 0 else None
+        else:
+            start = 0
+        candidates.append(("contenu texte", content, start, end))
+    
+    return (candidate for candidate in candidates if candidate)
+
+
+def _base64_payload_start(url: str) -> int:
+    """Position du contenu base64 dans une data URL (après "base64,"), -1 si absent"""
+    idx = url.find("base64,")
+    return idx + len("base64,") if idx >= 0 else -1
 
 
 class OpenRouterService:
     """Service IA via OpenRouter pour génération SEO YouTube"""
     
     def __init__(self):
+        _load_env()
         self.api_key = os.getenv("OPENROUTER_API_KEY", "")
         self.base_url = "https://openrouter.ai/api/v1"
         self.model = "openai/gpt-4o-mini"
-        self._client: Optional[OpenAI] = None
+        # Micro-tâches (titres de chapitres) : modèle plus petit et moins cher
+        self.cheap_model = os.getenv("OPENROUTER_CHEAP_MODEL", "google/gemini-flash-1.5-8b")
+        # Blocs de prompt dérivés des segments, calculés une fois par liste :
+        # id(segments) -> (segments, empreinte, bloc shorts, bloc illustrations)
+        self._segments_cache: Dict[int, Tuple[list, str, str, str]] = {}
     
-    def _get_client(self) -> Optional[OpenAI]:
-        """Obtenir le client OpenAI configuré pour OpenRouter"""
+    def _get_client(self) -> Optional["AsyncOpenAI"]:
+        """
+        Obtenir le client OpenAI asynchrone configuré pour OpenRouter.
+        Partagé par toutes les instances du processus (main.py en crée par requête) ;
+        le pool httpx est lié à la boucle d'événements : un client par boucle.
+        """
         if not OPENAI_AVAILABLE:
             print("[OpenRouter] OpenAI SDK non disponible")
             return None
@@ -40,16 +631,84 @@ class OpenRouterService:
             print("[OpenRouter] Clé API non configurée")
             return None
         
-        if not self._client:
-            self._client = OpenAI(
-                base_url=self.base_url,
-                api_key=self.api_key,
-                default_headers={
-                    "HTTP-Referer": "http://localhost:8000",
-                    "X-Title": "YouTube Pipeline"
-                }
+        loop = asyncio.get_running_loop()
+        shared = _shared_clients.get(self.api_key)
+        if shared and shared[0] is loop:
+            return shared[1]
+        if shared:
+            _close_superseded(*shared)
+        
+        import httpx
+        from openai import AsyncOpenAI
+        
+        client = AsyncOpenAI(
+            base_url=self.base_url,
+            api_key=self.api_key,
+            default_headers={
+                "HTTP-Referer": "http://localhost:8000",
+                "X-Title": "YouTube Pipeline"
+            },
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=64,
+                    max_keepalive_connections=32,
+                    keepalive_expiry=60
+                ),
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                http2=HTTP2_AVAILABLE
             )
-        return self._client
+        )
+        _shared_clients[self.api_key] = (loop, client)
+        return client
+    
+    async def stream_completion(self, **kwargs) -> AsyncGenerator[str, None]:
+        """
+        Complétion en mode stream : produit les fragments de texte au fil de la génération
+        (utilisable tel quel pour relayer une réponse SSE)
+        """
+        client = self._get_client()
+        if not client:
+            return
+        
+        # Le dernier événement porte l'usage (tokens servis par le cache de prompt)
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        stream = await client.chat.completions.create(stream=True, **kwargs)
+        async for event in stream:
+            if getattr(event, "usage", None):
+                _log_prompt_cache(event.usage)
+            if not event.choices:
+                continue
+            if event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+            if event.choices[0].finish_reason == "length":
+                print(f"[OpenRouter] Réponse tronquée (max_tokens={kwargs.get('max_tokens')})")
+    
+    async def generate_all(
+        self,
+        transcript: str,
+        segments: List[Dict],
+        video_duration: float,
+        language: str = "fr"
+    ) -> Dict:
+        """
+        Générer le SEO et les suggestions de shorts en parallèle (appels indépendants
+        sur les mêmes segments) : la latence totale est celle du plus lent des deux.
+        
+        Returns:
+            Dict avec "seo" et "shorts" (None pour celui qui a échoué)
+        """
+        seo, shorts = await asyncio.gather(
+            self.generate_youtube_seo(transcript, language, segments),
+            self.generate_shorts_suggestions(segments, video_duration, language),
+            return_exceptions=True
+        )
+        for name, result in (("SEO", seo), ("shorts", shorts)):
+            if isinstance(result, Exception):
+                print(f"[OpenRouter] Erreur génération {name}: {result}")
+        return {
+            "seo": seo if not isinstance(seo, Exception) else None,
+            "shorts": shorts if not isinstance(shorts, Exception) else None
+        }
     
     async def generate_youtube_seo(
         self,
@@ -77,345 +736,291 @@ class OpenRouterService:
             return None
         
         # Tronquer la transcription si trop longue (limite de tokens)
-        max_chars = 8000
-        if len(transcript) > max_chars:
-            transcript = transcript[:max_chars] + "..."
+        transcript = _truncate_transcript(transcript, segments)
         
-        # Préparer les segments pour le chapitrage si disponibles
-        chapters_info = ""
-        if segments and len(segments) > 0:
-            # Formater les segments pour le prompt
-            segments_text = "\n".join([
-                f"{self._format_timestamp(seg['start'])} - {self._format_timestamp(seg['end'])}: {seg['text'][:100]}"
-                for seg in segments[:20]  # Limiter à 20 segments pour ne pas surcharger
-            ])
-            chapters_info = f"""
-
-Segments avec timestamps réels (pour chapitrage):
-{segments_text}
-
-IMPORTANT: Utilise EXACTEMENT ces timestamps pour générer les chapitres. Ne modifie pas les timestamps."""
+        segments_digest = self._segments_blocks(segments)[0] if segments else ""
+        cache_key = llm_cache.make_key("seo", self.model, language, transcript, segments_digest)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[OpenRouter] Métadonnées SEO servies depuis le cache")
+            return cached
         
-        prompt = f"""Tu es un expert SEO YouTube. Analyse cette transcription et génère des métadonnées optimisées pour YouTube en {language}.
-
-Transcription:
-{transcript}
-{chapters_info}
-
-Génère:
-1. Un TITRE accrocheur (max 70 caractères) optimisé SEO avec:
-   - Des mots-clés pertinents basés sur le contenu réel
-   - Des chiffres ou questions si pertinent
-   - Un format accrocheur pour maximiser les clics
-
-2. Une DESCRIPTION optimisée SEO (200-300 mots) avec:
-   - Un résumé engageant dans les premières lignes basé sur le contenu réel
-   - Les points clés avec emojis appropriés
-   - Un call-to-action pour s'abonner
-   {"- Si des segments sont fournis, ajoute une section CHAPITRES avec les timestamps EXACTS au format:" if segments else ""}
-   {"  CHAPITRES:" if segments else ""}
-   {"  00:00:00 - Titre du chapitre 1" if segments else ""}
-   {"  00:01:00 - Titre du chapitre 2" if segments else ""}
-   {"  (utilise EXACTEMENT les timestamps fournis dans les segments)" if segments else ""}
-   - À la fin, ajoute une ligne "Mots-clés:" suivie de 10-15 mots-clés séparés par des virgules (format YouTube, sans #)
-
-3. 10-15 HASHTAGS pertinents séparés par des virgules, optimisés pour la découverte YouTube (format avec #). IMPORTANT: Les hashtags sont OBLIGATOIRES, génère-en toujours entre 10 et 15.
-
-Réponds UNIQUEMENT dans ce format exact (sans texte supplémentaire):
-TITRE:
-[ton titre accrocheur]
-
-DESCRIPTION:
-[ta description complète avec résumé, points clés, call-to-action]
-{"CHAPITRES:" if segments else ""}
-{"00:00:00 - Titre du chapitre 1" if segments else ""}
-{"[autres chapitres avec timestamps EXACTS]" if segments else ""}
-Mots-clés:
-mot1, mot2, mot3, mot4, mot5, mot6, mot7, mot8, mot9, mot10, mot11, mot12, mot13, mot14, mot15
-
-HASHTAGS:
-#tag1, #tag2, #tag3, #tag4, #tag5, #tag6, #tag7, #tag8, #tag9, #tag10, #tag11, #tag12, #tag13, #tag14, #tag15
-
-ATTENTION: La section HASHTAGS est OBLIGATOIRE. Génère toujours entre 10 et 15 hashtags pertinents basés sur le contenu."""
-
         try:
             print("[OpenRouter] Génération métadonnées SEO...")
             
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Tu es un expert SEO YouTube qui génère des métadonnées optimisées basées uniquement sur le contenu réel fourni. Ne génère jamais de timestamps ou d'informations non présentes dans la transcription."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0,
-                max_tokens=2000
-            )
-            
-            content = response.choices[0].message.content.strip()
+            # Réponse en flux : les octets arrivent pendant la génération
+            chunks = []
+            async for delta in self.stream_completion(**self._seo_request_body(transcript, language)):
+                chunks.append(delta)
             
-            # Parser la réponse
-            result = {
-                "title": "",
-                "description": "",
-                "keywords": [],
-                "hashtags": [],
-                "chapters": []
-            }
+            result = await self._parse_seo_response("".join(chunks).strip(), segments)
+            if result:
+                llm_cache.put(cache_key, result)
+            return result
             
-            # Initialiser description_lines avant de l'utiliser
-            description_lines = []
-            chapters_from_segments = []
+        except Exception as e:
+            import traceback
+            print(f"[OpenRouter] Exception: {e}")
+            print(f"[OpenRouter] Type d'erreur: {type(e).__name__}")
+            print(traceback.format_exc())
+            return None
+    
+    def _seo_request_body(self, transcript: str, language: str) -> Dict:
+        """Corps de la requête SEO (arguments de stream_completion)"""
+        # Les chapitres sont construits côté Python à partir des segments :
+        # le prompt ne contient que la transcription et le format attendu
+        prompt = f"""Analyse cette transcription et génère des métadonnées YouTube optimisées SEO en {language}.
+
+Titre avec les mots-clés du contenu, des chiffres ou une question si pertinent.
+
+Transcription:
+{transcript}"""
+        
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "Tu es un expert SEO YouTube. Base-toi uniquement sur le contenu réel fourni."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "response_format": SEO_RESPONSE_FORMAT,
+            "temperature": 0,
+            "max_tokens": SEO_MAX_TOKENS
+        }
+    
+    async def _parse_seo_response(self, content: str, segments: Optional[list]) -> Optional[Dict]:
+        """Construire les métadonnées SEO (chapitres inclus) à partir de la réponse JSON du modèle"""
+        # Parser la réponse
+        result = {
+            "title": "",
+            "description": "",
+            "keywords": [],
+            "hashtags": [],
+            "chapters": []
+        }
+        
+        # Sortie conforme à SEO_RESPONSE_FORMAT : parsée et validée AVANT les appels
+        # de titres de chapitres (réponse invalide = pas d'appels LLM inutiles)
+        data = orjson.loads(content)
+        result["title"] = data["title"].strip()
+        result["description"] = data["description"].strip()
+        result["keywords"] = [k.strip() for k in data["keywords"] if k.strip()]
+        result["hashtags"] = [
+            t.strip() if t.strip().startswith("#") else f"#{t.strip()}"
+            for t in data["hashtags"] if t.strip()
+        ]
+        
+        # Vérifier que nous avons au moins un titre et une description
+        if not (result["title"] and result["description"]):
+            print(f"[OpenRouter] Métadonnées incomplètes:")
+            print(f"  - Titre: {bool(result['title'])} ({len(result['title'])} chars)")
+            print(f"  - Description: {bool(result['description'])} ({len(result['description'])} chars)")
+            print(f"[OpenRouter] Réponse brute (premiers 500 chars): {content[:500]}")
+            return None
+        
+        chapters_from_segments = []
+        
+        # Générer les chapitres à partir des segments réels si disponibles
+        # Les chapitres utilisent les timestamps EXACTS des segments
+        if segments and len(segments) > 0:
+            # 1) Grouper les segments en chapitres logiques (toutes les ~60 secondes),
+            # avec le timestamp EXACT du premier segment de chaque groupe
+            buckets = []  # (début du chapitre, texte combiné)
+            current_chapter_start = segments[0]['start']  # Timestamp EXACT du premier segment
+            current_chapter_texts = [segments[0]['text']]
             
-            # Générer les chapitres à partir des segments réels si disponibles
-            # Les chapitres utilisent les timestamps EXACTS des segments
-            if segments and len(segments) > 0:
-                chapters = []
-                # Grouper les segments en chapitres logiques (tous les 30-60 secondes)
-                # Mais utiliser les timestamps EXACTS du premier segment de chaque groupe
-                current_chapter_start = segments[0]['start']  # Timestamp EXACT du premier segment
-                current_chapter_texts = [segments[0]['text']]
-                
-                for i, seg in enumerate(segments[1:], 1):
-                    # Créer un chapitre tous les 30-60 secondes ou à la fin
-                    time_diff = seg['start'] - current_chapter_start
-                    is_last = i == len(segments) - 1
-                    
-                    if time_diff >= 60 or is_last:  # Nouveau chapitre toutes les 60 secondes ou à la fin
-                        # Générer un titre de chapitre basé sur le contenu accumulé
-                        combined_text = " ".join(current_chapter_texts)[:300]
-                        chapter_title = await self._generate_chapter_title(combined_text)
-                        # Utiliser le timestamp EXACT du début du chapitre
-                        timestamp_str = self._format_timestamp(current_chapter_start)
-                        chapters.append({
-                            "timestamp": timestamp_str,
-                            "title": chapter_title or combined_text[:50].strip() + "..."
-                        })
-                        # Ajouter aussi à la description si pas déjà présent
-                        chapter_line = f"{timestamp_str} - {chapter_title or combined_text[:50].strip() + '...'}"
-                        chapters_from_segments.append(chapter_line)
-                        # Nouveau chapitre commence au timestamp EXACT de ce segment
-                        current_chapter_start = seg['start']
-                        current_chapter_texts = [seg['text']]
-                    else:
-                        # Accumuler le texte du chapitre (mais garder le timestamp du début)
-                        current_chapter_texts.append(seg['text'])
-                
-                # Ajouter le dernier chapitre si nécessaire
-                if current_chapter_texts:
-                    combined_text = " ".join(current_chapter_texts)[:300]
-                    chapter_title = await self._generate_chapter_title(combined_text)
-                    # Utiliser le timestamp EXACT
-                    timestamp_str = self._format_timestamp(current_chapter_start)
-                    chapters.append({
-                        "timestamp": timestamp_str,
-                        "title": chapter_title or combined_text[:50].strip() + "..."
-                    })
-                    # Ajouter aussi à la description si pas déjà présent
-                    chapter_line = f"{timestamp_str} - {chapter_title or combined_text[:50].strip() + '...'}"
-                    chapters_from_segments.append(chapter_line)
+            for i, seg in enumerate(segments[1:], 1):
+                # Créer un chapitre tous les 30-60 secondes ou à la fin
+                time_diff = seg['start'] - current_chapter_start
+                is_last = i == len(segments) - 1
                 
-                result["chapters"] = chapters
-                print(f"[OpenRouter] {len(chapters)} chapitres générés avec timestamps réels de la vidéo")
-            
-            lines = content.split("\n")
-            current_section = None
-            # description_lines est déjà initialisé plus haut
-            i = 0
+                if time_diff >= 60 or is_last:  # Nouveau chapitre toutes les 60 secondes ou à la fin
+                    buckets.append((current_chapter_start, " ".join(current_chapter_texts)[:300]))
+                    # Nouveau chapitre commence au timestamp EXACT de ce segment
+                    current_chapter_start = seg['start']
+                    current_chapter_texts = [seg['text']]
+                else:
+                    # Accumuler le texte du chapitre (mais garder le timestamp du début)
+                    current_chapter_texts.append(seg['text'])
             
-            while i < len(lines):
-                line = lines[i].strip()
-                if not line:
-                    i += 1
-                    continue
-                
-                # Détection des sections (plus tolérant)
-                line_upper = line.upper()
-                
-                if "TITRE" in line_upper:
-                    current_section = None  # On va extraire le titre maintenant
-                    # Extraire le titre après le ":"
-                    if ":" in line:
-                        title_part = line.split(":", 1)[1].strip()
-                        if title_part:
-                            result["title"] = title_part
-                        else:
-                            # Le titre est sur la ligne suivante
-                            if i + 1 < len(lines):
-                                next_line = lines[i + 1].strip()
-                                if next_line and not any(keyword in next_line.upper() for keyword in ["DESCRIPTION", "MOTS-CLES", "KEYWORDS", "CHAPITRES"]):
-                                    result["title"] = next_line
-                                    i += 1  # Skip la ligne suivante car on l'a utilisée
-                    else:
-                        # Pas de ":", le titre est sur la ligne suivante
-                        if i + 1 < len(lines):
-                            next_line = lines[i + 1].strip()
-                            if next_line and not any(keyword in next_line.upper() for keyword in ["DESCRIPTION", "MOTS-CLES", "KEYWORDS", "CHAPITRES"]):
-                                result["title"] = next_line
-                                i += 1  # Skip la ligne suivante
-                    i += 1
-                    continue
-                elif "DESCRIPTION" in line_upper or "DESCRI" in line_upper:
-                    current_section = "description"
-                    # Extraire le début de la description après le ":"
-                    if ":" in line:
-                        desc_start = line.split(":", 1)[1].strip()
-                        if desc_start:
-                            description_lines.append(desc_start)
-                    i += 1
-                    continue
-                elif "CHAPITRES" in line_upper or "CHAPTERS" in line_upper:
-                    current_section = "chapters"
-                    i += 1
-                    continue
-                elif "MOTS-CLES" in line_upper or "KEYWORDS" in line_upper or "MOTS CLES" in line_upper:
-                    current_section = "keywords"
-                    # Extraire les mots-clés après le ":"
-                    if ":" in line:
-                        keywords_str = line.split(":", 1)[1].strip()
-                    else:
-                        keywords_str = line
-                    # Parser les mots-clés (virgules)
-                    if keywords_str:
-                        result["keywords"] = [k.strip() for k in keywords_str.split(",") if k.strip()]
-                    i += 1
-                    continue
-                elif "HASHTAGS" in line_upper or "TAGS" in line_upper:
-                    current_section = "hashtags"
-                    # Extraire les hashtags après le ":"
-                    if ":" in line:
-                        tags_str = line.split(":", 1)[1].strip()
-                    else:
-                        tags_str = ""
-                    # Parser les tags (virgules ou espaces)
-                    hashtags_list = []
-                    if tags_str:
-                        if "," in tags_str:
-                            hashtags_list = [t.strip() for t in tags_str.split(",") if t.strip()]
-                        else:
-                            hashtags_list = [t.strip() for t in tags_str.split() if t.strip()]
-                    # Continuer à lire les lignes suivantes pour les hashtags (jusqu'à la prochaine section)
-                    i += 1
-                    while i < len(lines):
-                        next_line = lines[i].strip()
-                        if not next_line:
-                            i += 1
-                            continue
-                        # Si on rencontre une nouvelle section, arrêter
-                        if any(keyword in next_line.upper() for keyword in ["TITRE", "DESCRIPTION", "CHAPITRES", "MOTS-CLES", "KEYWORDS"]):
-                            break
-                        # Parser cette ligne pour les hashtags
-                        if "," in next_line:
-                            hashtags_list.extend([t.strip() for t in next_line.split(",") if t.strip()])
-                        else:
-                            hashtags_list.extend([t.strip() for t in next_line.split() if t.strip()])
-                        i += 1
-                    result["hashtags"] = hashtags_list
-                    continue
-                
-                # Ajouter au contenu de la section actuelle
-                if current_section == "description":
-                    # Vérifier si c'est une ligne de chapitre (format timestamp - titre)
-                    if ":" in line and any(char.isdigit() for char in line.split(":")[0]):
-                        # C'est probablement un chapitre, l'ajouter à la description aussi
-                        description_lines.append(line)
-                    # Ignorer les lignes qui commencent une nouvelle section
-                    elif not any(keyword in line.upper() for keyword in ["MOTS-CLES", "KEYWORDS", "CHAPITRES", "HASHTAGS", "TAGS"]):
-                        description_lines.append(line)
-                elif current_section == "chapters":
-                    # Parser les chapitres (format: timestamp - titre)
-                    if ":" in line and any(char.isdigit() for char in line.split(":")[0]):
-                        parts = line.split(" - ", 1)
-                        if len(parts) == 2:
-                            timestamp = parts[0].strip()
-                            title = parts[1].strip()
-                            result["chapters"].append({
-                                "timestamp": timestamp,
-                                "title": title
-                            })
-                
-                i += 1
+            # Ajouter le dernier chapitre si nécessaire
+            if current_chapter_texts:
+                buckets.append((current_chapter_start, " ".join(current_chapter_texts)[:300]))
             
-            # Construire la description
-            result["description"] = "\n".join(description_lines).strip()
-            result["description"] = result["description"].strip()
+            # 2) Tous les titres de chapitres en un seul appel
+            titles = await self._generate_chapter_titles_batch([text for _, text in buckets])
             
-            # Ajouter les chapitres générés à partir des segments si disponibles
-            if chapters_from_segments and len(chapters_from_segments) > 0:
-                # Vérifier si "CHAPITRES:" n'est pas déjà dans la description
-                if "CHAPITRES" not in result["description"].upper():
-                    result["description"] += "\n\nCHAPITRES:"
-                # Ajouter chaque chapitre
-                for chapter_line in chapters_from_segments:
-                    if chapter_line not in result["description"]:
-                        result["description"] += "\n" + chapter_line
+            # 3) Assembler chapitres et lignes de description
+            chapters = []
+            for (chapter_start, combined_text), chapter_title in zip(buckets, titles):
+                timestamp_str = self._format_timestamp(chapter_start)
+                title = chapter_title or combined_text[:50].strip() + "..."
+                chapters.append({
+                    "timestamp": timestamp_str,
+                    "title": title
+                })
+                # Ajouter aussi à la description si pas déjà présent
+                chapters_from_segments.append(f"{timestamp_str} - {title}")
             
-            # Ajouter les mots-clés à la fin de la description si présents
-            if result["keywords"] and len(result["keywords"]) > 0:
-                keywords_line = "Mots-clés: " + ", ".join(result["keywords"])
-                if "Mots-clés:" not in result["description"]:
-                    result["description"] += "\n\n" + keywords_line
+            result["chapters"] = chapters
+            print(f"[OpenRouter] {len(chapters)} chapitres générés avec timestamps réels de la vidéo")
+        
+        # Compléter la description (assemblage en liste, un seul join)
+        parts = [result["description"]]
+        seen = set(result["description"].splitlines())
+        
+        # Ajouter les chapitres générés à partir des segments si disponibles
+        if chapters_from_segments:
+            # Vérifier si "CHAPITRES:" n'est pas déjà dans la description
+            if "CHAPITRES" not in result["description"].upper():
+                parts.append("\nCHAPITRES:")
+            for chapter_line in chapters_from_segments:
+                if chapter_line not in seen:
+                    parts.append(chapter_line)
+                    seen.add(chapter_line)
+        
+        # Ajouter les mots-clés à la fin de la description si présents
+        if result["keywords"] and "Mots-clés:" not in result["description"]:
+            parts.append("\nMots-clés: " + ", ".join(result["keywords"]))
+        
+        result["description"] = "\n".join(parts).strip()
+        
+        print(f"[OpenRouter] Métadonnées générées: titre={len(result['title'])} chars, description={len(result['description'])} chars")
+        if result.get("chapters"):
+            print(f"  - {len(result['chapters'])} chapitres avec timestamps réels")
+        if result.get("keywords"):
+            print(f"  - {len(result['keywords'])} mots-clés")
+        if result.get("hashtags"):
+            print(f"  - {len(result['hashtags'])} hashtags")
+        return result
+    
+    def _segments_blocks(self, segments: list) -> Tuple[str, str, str]:
+        """
+        Empreinte (clés de cache) et textes horodatés des segments pour les prompts.
+        Mémoïsé sur l'identité de la liste : SEO, shorts et illustrations d'une même
+        vidéo (generate_all, workflow complet) ne reformatent pas les segments.
+        La liste ne doit pas être modifiée en place entre deux appels.
+        """
+        cached = self._segments_cache.get(id(segments))
+        if cached is not None and cached[0] is segments:
+            return cached[1:]
+        
+        digest = llm_cache.make_key(segments)
+        lines = []
+        illustration_lines = []
+        illustration_chars = 0
+        for seg in segments:
+            start_ts = self._format_timestamp(seg['start'])
+            lines.append(f"[{start_ts} - {self._format_timestamp(seg['end'])}] {seg['text']}")
+            # Bloc illustrations borné : les prompts n'en gardent que ILLUSTRATION_TRANSCRIPT_CHARS
+            text = seg.get("text", "").strip()
+            if text and illustration_chars < ILLUSTRATION_TRANSCRIPT_CHARS:
+                line = f"[{start_ts}] {text}\n"
+                illustration_lines.append(line)
+                illustration_chars += len(line)
+        
+        blocks = (
+            digest,
+            "\n".join(lines),
+            "".join(illustration_lines)[:ILLUSTRATION_TRANSCRIPT_CHARS]
+        )
+        # Une seule entrée : une nouvelle liste remplace la précédente
+        self._segments_cache = {id(segments): (segments, *blocks)}
+        return blocks
+    
+    def _format_timestamp(self, seconds: float) -> str:
+        """Formater un timestamp en format HH:MM:SS pour YouTube"""
+        return _format_hms(int(seconds))
+    
+    async def _generate_chapter_titles_batch(self, texts: List[str]) -> List[Optional[str]]:
+        """
+        Générer les titres de tous les chapitres en une seule requête (réponse JSON).
+        Repli sur un appel par chapitre, en parallèle, si la réponse est inexploitable.
+        """
+        if not texts:
+            return []
+        
+        client = self._get_client()
+        if not client:
+            return [None] * len(texts)
+        
+        # Même règle que _generate_chapter_title : pas de titre pour un texte trop court.
+        # Les extraits identiques (intros musicales, outros "merci, à bientôt") ne sont
+        # demandés qu'une fois : dict.fromkeys dédoublonne en gardant l'ordre.
+        unique_texts = list(dict.fromkeys(
+            text for text in texts if text and len(text.strip()) >= 10
+        ))
+        if not unique_texts:
+            return [None] * len(texts)
+        indexed = list(enumerate(unique_texts))
+        title_map: Dict[str, Optional[str]] = {}
+        
+        cache_key = llm_cache.make_key("chapters", self.cheap_model, texts)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Raccourcir les extraits si l'ensemble dépasse le budget d'entrée
+        excerpt_chars = 300
+        excerpts = "\n".join(f"[{i}] {text[:excerpt_chars]}" for i, text in indexed)
+        while excerpt_chars > 60 and _input_size(excerpts) > _input_budget():
+            excerpt_chars -= 60
+            excerpts = "\n".join(f"[{i}] {text[:excerpt_chars]}" for i, text in indexed)
+        prompt = f"""Pour chaque extrait ci-dessous, génère un titre de chapitre YouTube court (max 50 caractères).
+
+{excerpts}
+
+Réponds UNIQUEMENT en JSON: {{"titles": {{"<numéro de l'extrait>": "titre", ...}}}}"""
+        
+        try:
+            response = await client.chat.completions.create(
+                model=self.cheap_model,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0,
+                max_tokens=min(4000, CHAPTER_TITLES_TOKENS_PER_ITEM * len(indexed) + 50)
+            )
             
-            # Fallback: Générer des hashtags si l'IA ne les a pas générés
-            if not result["hashtags"] or len(result["hashtags"]) == 0:
-                hashtags_fallback = []
-                # Utiliser les mots-clés comme base
-                if result["keywords"]:
-                    for keyword in result["keywords"][:10]:
-                        # Nettoyer et formater en hashtag
-                        tag = keyword.strip().replace(" ", "").replace("-", "")
-                        if tag and len(tag) > 2:
-                            hashtags_fallback.append(f"#{tag}")
-                # Ajouter des hashtags basés sur le titre
-                if result["title"]:
-                    title_words = result["title"].split()
-                    for word in title_words[:5]:
-                        word_clean = word.strip().replace(",", "").replace(".", "").replace("!", "").replace("?", "")
-                        if word_clean and len(word_clean) > 3:
-                            hashtags_fallback.append(f"#{word_clean}")
-                # Ajouter des hashtags génériques si nécessaire
-                if language == "fr":
-                    hashtags_fallback.extend(["#YouTube", "#Vidéo", "#Tutoriel", "#Tech", "#Montage"])
-                else:
-                    hashtags_fallback.extend(["#YouTube", "#Video", "#Tutorial", "#Tech", "#Editing"])
-                result["hashtags"] = hashtags_fallback[:15]  # Limiter à 15
-                print(f"[OpenRouter] Hashtags générés par fallback: {len(result['hashtags'])} hashtags")
+            data = orjson.loads(response.choices[0].message.content)
+            batch_titles = data.get("titles", {}) if isinstance(data, dict) else {}
+            if isinstance(batch_titles, list):
+                batch_titles = {str(i): title for (i, _), title in zip(indexed, batch_titles)}
             
-            # Vérifier que nous avons au moins un titre et une description
-            if result["title"] and result["description"]:
-                print(f"[OpenRouter] Métadonnées générées: titre={len(result['title'])} chars, description={len(result['description'])} chars")
-                if result.get("chapters"):
-                    print(f"  - {len(result['chapters'])} chapitres avec timestamps réels")
-                if result.get("keywords"):
-                    print(f"  - {len(result['keywords'])} mots-clés")
-                if result.get("hashtags"):
-                    print(f"  - {len(result['hashtags'])} hashtags")
-                return result
-            else:
-                print(f"[OpenRouter] Métadonnées incomplètes:")
-                print(f"  - Titre: {bool(result['title'])} ({len(result['title'])} chars)")
-                print(f"  - Description: {bool(result['description'])} ({len(result['description'])} chars)")
-                print(f"[OpenRouter] Réponse brute (premiers 500 chars): {content[:500]}")
-                return None
+            for i, text in indexed:
+                title = batch_titles.get(str(i))
+                if isinstance(title, str):
+                    title = title.translate(_QUOTE_STRIP).strip()
+                    title_map[text] = title[:50] or None
             
+            missing = sum(1 for text in unique_texts if not title_map.get(text))
+            if missing == 0:
+                titles = [title_map.get(text) for text in texts]
+                llm_cache.put(cache_key, titles)
+                return titles
+            print(f"[OpenRouter] {missing} titres de chapitres manquants dans la réponse groupée")
         except Exception as e:
-            import traceback
-            print(f"[OpenRouter] Exception: {e}")
-            print(f"[OpenRouter] Type d'erreur: {type(e).__name__}")
-            print(traceback.format_exc())
-            return None
-    
-    def _format_timestamp(self, seconds: float) -> str:
-        """Formater un timestamp en format HH:MM:SS pour YouTube"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+            print(f"[OpenRouter] Erreur génération groupée des titres de chapitres: {e}")
+        
+        # Repli : un appel par chapitre manquant (concurrence bornée pour OpenRouter)
+        semaphore = asyncio.Semaphore(CHAPTER_TITLE_CONCURRENCY)
+        
+        async def bounded_chapter_title(text: str) -> Optional[str]:
+            async with semaphore:
+                return await self._generate_chapter_title(text)
+        
+        missing_texts = [text for text in unique_texts if not title_map.get(text)]
+        fallback_titles = await asyncio.gather(
+            *(bounded_chapter_title(text) for text in missing_texts)
+        )
+        title_map.update(zip(missing_texts, fallback_titles))
+        return [title_map.get(text) for text in texts]
     
     async def _generate_chapter_title(self, text: str) -> Optional[str]:
         """Générer un titre de chapitre court basé sur le texte"""
@@ -426,6 +1031,12 @@ ATTENTION: La section HASHTAGS est OBLIGATOIRE. Génère toujours entre 10 et 15
         if not client:
             return None
         
+        # Mémoïsation par texte (le décorateur lru_cache ne convient pas à une coroutine)
+        cache_key = llm_cache.make_key("chapter", self.cheap_model, text[:300])
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             prompt = f"""Génère un titre de chapitre YouTube court (max 50 caractères) basé sur ce texte:
 
@@ -433,19 +1044,23 @@ ATTENTION: La section HASHTAGS est OBLIGATOIRE. Génère toujours entre 10 et 15
 
 Réponds UNIQUEMENT avec le titre, sans commentaires."""
             
-            response = client.chat.completions.create(
-                model=self.model,
+            response = await client.chat.completions.create(
+                model=self.cheap_model,
                 messages=[
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0,
-                max_tokens=50
+                max_tokens=CHAPTER_TITLE_MAX_TOKENS,
+                stop=["\n"]  # Une seule ligne attendue
             )
             
             title = response.choices[0].message.content.strip()
             # Nettoyer le titre
-            title = title.replace('"', '').replace("'", "").strip()
-            return title[:50] if title else None
+            title = title.translate(_QUOTE_STRIP).strip()
+            title = title[:50] if title else None
+            if title:
+                llm_cache.put(cache_key, title)
+            return title
             
         except Exception as e:
             print(f"[OpenRouter] Erreur génération titre chapitre: {e}")
@@ -477,11 +1092,14 @@ Réponds UNIQUEMENT avec le titre, sans commentaires."""
             print("[OpenRouter] Aucun segment fourni pour suggestions shorts")
             return None
         
-        # Formater les segments avec timestamps
-        segments_text = "\n".join([
-            f"[{self._format_timestamp(seg['start'])} - {self._format_timestamp(seg['end'])}] {seg['text']}"
-            for seg in segments
-        ])
+        # Segments formatés avec timestamps (partagés avec le SEO et les illustrations)
+        segments_digest, segments_text, _ = self._segments_blocks(segments)
+        
+        cache_key = llm_cache.make_key("shorts", self.model, language, video_duration, segments_digest)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[OpenRouter] Suggestions shorts servies depuis le cache")
+            return cached
         
         prompt = f"""Tu es un expert en création de contenu viral pour les réseaux sociaux. Analyse cette transcription de vidéo et identifie entre 1 et 5 moments parfaits pour créer des YouTube Shorts/TikToks.
 
@@ -513,7 +1131,7 @@ Réponds UNIQUEMENT au format JSON (sans markdown, sans ```):
         try:
             print("[OpenRouter] Génération suggestions shorts...")
             
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {
@@ -526,9 +1144,11 @@ Réponds UNIQUEMENT au format JSON (sans markdown, sans ```):
                     }
                 ],
                 temperature=0.3,  # Un peu de créativité pour trouver les meilleurs moments
-                max_tokens=1500
+                max_tokens=SHORTS_MAX_TOKENS
             )
             
+            if response.choices[0].finish_reason == "length":
+                print(f"[OpenRouter] Suggestions shorts tronquées (max_tokens={SHORTS_MAX_TOKENS})")
             content = response.choices[0].message.content.strip()
             
             # Nettoyer le JSON (enlever les éventuels markdown)
@@ -541,20 +1161,31 @@ Réponds UNIQUEMENT au format JSON (sans markdown, sans ```):
             
             # Parser le JSON
             try:
-                shorts = json.loads(content)
+                shorts = orjson.loads(content)
                 
                 if not isinstance(shorts, list):
                     print(f"[OpenRouter] Réponse non-liste: {content[:200]}")
                     return []
                 
+                # Frontières réelles des segments (triées) pour recaler les timestamps du LLM
+                segment_starts = sorted(seg['start'] for seg in segments)
+                segment_ends = sorted(seg['end'] for seg in segments)
+                
                 # Valider et filtrer les shorts
                 valid_shorts = []
                 for short in shorts:
                     if not isinstance(short, dict):
                         continue
                     
-                    start = float(short.get("start", 0))
-                    end = float(short.get("end", 0))
+                    raw_start = float(short.get("start", 0))
+                    raw_end = float(short.get("end", 0))
+                    start = _snap_to_boundary(segment_starts, raw_start)
+                    end = _snap_to_boundary(segment_ends, raw_end)
+                    if abs(start - raw_start) > SHORT_SNAP_TOLERANCE or abs(end - raw_end) > SHORT_SNAP_TOLERANCE:
+                        print(f"[OpenRouter] Short ignoré: hors des frontières de segments ({raw_start}-{raw_end} -> {start}-{end})")
+                        continue
+                    if start != raw_start or end != raw_end:
+                        print(f"[OpenRouter] Short recalé: {raw_start}-{raw_end} -> {start}-{end}")
                     duration = end - start
                     
                     # Vérifier les contraintes
@@ -578,6 +1209,8 @@ Réponds UNIQUEMENT au format JSON (sans markdown, sans ```):
                     })
                 
                 print(f"[OpenRouter] {len(valid_shorts)} short(s) suggéré(s)")
+                if valid_shorts:
+                    llm_cache.put(cache_key, valid_shorts[:5])
                 
                 # Si aucun short trouvé, créer un short par défaut au début
                 if len(valid_shorts) == 0:
@@ -644,108 +1277,203 @@ Réponds UNIQUEMENT au format JSON (sans markdown, sans ```):
         if not client:
             return None
         
-        # Construire le texte avec timestamps
-        transcript_text = ""
-        for segment in segments:
-            start = segment.get("start", 0)
-            text = segment.get("text", "").strip()
-            if text:
-                timestamp = self._format_timestamp(start)
-                transcript_text += f"[{timestamp}] {text}\n"
+        # Requêtes identiques (relances, reprises de job) servies depuis le cache
+        request = self._illustrations_request(segments, video_duration, max_illustrations)
+        cache_key = llm_cache.make_key("illustrations", request)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[OpenRouter] Illustrations servies depuis le cache")
+            return cached
         
-        prompt = f"""Analyse cette transcription vidéo et identifie les meilleurs moments pour insérer un B-ROLL (clip vidéo uniquement, PAS d'image fixe).
-
-TRANSCRIPTION:
-{transcript_text[:6000]}
-
-DURÉE TOTALE: {video_duration:.1f} secondes
-
-INSTRUCTIONS:
-1. Identifie SEULEMENT {max_illustrations} moments clés maximum (pas plus !)
-2. Choisis des moments espacés dans la vidéo
-3. Pour chaque moment, fournis:
-   - timestamp: le moment exact en secondes
-   - duration: durée du B-roll (2-3 secondes)
-   - keyword: mot-clé EN ANGLAIS pour rechercher un CLIP VIDÉO sur Pexels (1-2 mots simples)
-   - reason: pourquoi ce moment mérite un B-roll
-
-CRITÈRES:
-- Privilégier les moments visuellement représentables (actions, objets, lieux)
-- Éviter les concepts trop abstraits
-- Espacer les B-rolls (pas 2 B-rolls consécutifs)
-
-MOTS-CLÉS POUR CLIPS VIDÉO:
-- Utiliser des termes GÉNÉRIQUES et CONCRETS (ex: "coding", "typing", "city", "nature")
-- Éviter les termes trop spécifiques qui ne trouveront pas de résultats
-- Penser "vidéo en mouvement" pas "image fixe"
-
-Réponds UNIQUEMENT en JSON valide:
-[
-  {{"timestamp": 15.5, "duration": 4, "keyword": "coding laptop", "reason": "Moment de programmation"}},
-  ...
-]"""
-
         try:
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Tu es un expert en montage vidéo. Tu identifies les moments où des B-rolls (clips d'illustration) amélioreraient une vidéo. Réponds uniquement en JSON valide."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
-            
-            content = response.choices[0].message.content.strip()
+            # Réponse en flux, accumulée puis parsée d'un bloc
+            chunks = []
+            async for delta in self.stream_completion(**request):
+                chunks.append(delta)
             
-            # Extraire le JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-            
-            illustrations = json.loads(content)
-            
-            if not isinstance(illustrations, list):
-                print(f"[OpenRouter] Format invalide pour illustrations")
-                return None
-            
-            # Valider et nettoyer les résultats
-            valid_illustrations = []
-            for illust in illustrations:
-                if not isinstance(illust, dict):
-                    continue
-                
-                timestamp = float(illust.get("timestamp", 0))
-                duration = float(illust.get("duration", 3))
-                keyword = illust.get("keyword", "").strip()
-                reason = illust.get("reason", "")
-                
-                # Vérifier la validité
-                if timestamp < 0 or timestamp >= video_duration:
-                    continue
-                if not keyword:
-                    continue
-                if duration < 1 or duration > 10:
-                    duration = 3
-                
-                valid_illustrations.append({
-                    "timestamp": timestamp,
-                    "duration": duration,
-                    "keyword": keyword,
-                    "reason": reason
-                })
-            
-            print(f"[OpenRouter] {len(valid_illustrations)} moments d'illustration identifiés")
-            return valid_illustrations[:max_illustrations]
+            # Sortie conforme à ILLUSTRATIONS_RESPONSE_FORMAT : JSON valide, sans bloc markdown
+            content = "".join(chunks)
+            valid_illustrations = self._decode_illustrations(content, video_duration, max_illustrations)
+            if valid_illustrations:
+                llm_cache.put(cache_key, valid_illustrations)
+            return valid_illustrations
             
         except Exception as e:
             print(f"[OpenRouter] Erreur analyse illustrations: {e}")
             return None
     
+    def _illustrations_request(
+        self,
+        segments: List[Dict],
+        video_duration: float,
+        max_illustrations: int
+    ) -> Dict:
+        """Paramètres de la complétion d'analyse des illustrations"""
+        # Texte avec timestamps (partagé avec les shorts du même jeu de segments)
+        transcript_text = self._segments_blocks(segments)[2]
+        
+        # Partie dynamique (transcription) en dernier : les consignes fixes forment un préfixe
+        # identique d'un appel à l'autre, mis en cache par le fournisseur
+        prompt = f"""TRANSCRIPTION:
+{transcript_text}
+
+DURÉE TOTALE: {video_duration:.1f} secondes
+
+Identifie SEULEMENT {max_illustrations} moments clés maximum (pas plus !)"""
+        
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": [_cacheable_text(ILLUSTRATION_SYSTEM_PROMPT)]
+                },
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": ILLUSTRATIONS_RESPONSE_FORMAT,
+            "temperature": 0.7,
+            "max_tokens": 1500
+        }
+    
+    async def stream_illustrations(
+        self,
+        segments: List[Dict],
+        video_duration: float,
+        max_illustrations: int = 5
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        Variante en flux d'analyze_for_illustrations : chaque moment est produit dès que
+        son objet JSON est complet dans la réponse, pour lancer le téléchargement Pexels
+        correspondant avant la fin de la génération.
+        """
+        print(f"[OpenRouter] Analyse pour illustrations (flux)...")
+        
+        # Même cache qu'analyze_for_illustrations
+        request = self._illustrations_request(segments, video_duration, max_illustrations)
+        cache_key = llm_cache.make_key("illustrations", request)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[OpenRouter] Illustrations servies depuis le cache")
+            for illust in cached:
+                yield illust
+            return
+        
+        decoder = json.JSONDecoder()
+        buffer = ""
+        pos = None  # Position courante dans le tableau "illustrations" (après le "[")
+        emitted = []
+        
+        async for delta in self.stream_completion(**request):
+            buffer += delta
+            if pos is None:
+                start = buffer.find("[")
+                if start < 0:
+                    continue
+                pos = start + 1
+            
+            # Décoder les objets complets du tableau ; un objet incomplet attend le fragment suivant
+            while len(emitted) < max_illustrations:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos >= len(buffer) or buffer[pos] == "]":
+                    break
+                try:
+                    illust, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break
+                
+                valid = self._validate_illustration(illust, video_duration)
+                if valid:
+                    emitted.append(valid)
+                    yield valid
+        
+        print(f"[OpenRouter] {len(emitted)} moments d'illustration identifiés (flux)")
+        if emitted:
+            llm_cache.put(cache_key, emitted)
+    
+    def _decode_illustrations(
+        self,
+        content: str,
+        video_duration: float,
+        max_illustrations: int
+    ) -> Optional[List[Dict]]:
+        """
+        Décoder et valider la réponse JSON des illustrations.
+        Avec msgspec, décodage typé en C (coercition des champs comprise) ; les bornes
+        restent vérifiées ici. Sans msgspec ou si le typage échoue : json + _validate_illustrations.
+        """
+        if MSGSPEC_AVAILABLE:
+            import msgspec
+            try:
+                items = msgspec.json.decode(
+                    content.encode("utf-8"), type=_get_illustrations_type(), strict=False
+                ).illustrations
+            except (msgspec.ValidationError, msgspec.DecodeError):
+                # JSON invalide pour msgspec (BOM, jeton en trop...) : repli orjson ci-dessous
+                items = None
+            if items is not None:
+                valid_illustrations = [
+                    {
+                        "timestamp": item.timestamp,
+                        "duration": item.duration if 1 <= item.duration <= 10 else 3,
+                        "keyword": item.keyword.strip(),
+                        "reason": item.reason
+                    }
+                    for item in items
+                    if 0 <= item.timestamp < video_duration and item.keyword.strip()
+                ]
+                logger.info("%d moments d'illustration identifiés", len(valid_illustrations))
+                return valid_illustrations[:max_illustrations]
+        
+        return self._validate_illustrations(
+            orjson.loads(content)["illustrations"], video_duration, max_illustrations
+        )
+    
+    def _validate_illustrations(
+        self,
+        illustrations,
+        video_duration: float,
+        max_illustrations: int
+    ) -> Optional[List[Dict]]:
+        """Valider et nettoyer les moments d'illustration proposés par le modèle"""
+        if not isinstance(illustrations, list):
+            print(f"[OpenRouter] Format invalide pour illustrations")
+            return None
+        
+        valid_illustrations = []
+        for illust in illustrations:
+            valid = self._validate_illustration(illust, video_duration)
+            if valid:
+                valid_illustrations.append(valid)
+        
+        logger.info("%d moments d'illustration identifiés", len(valid_illustrations))
+        return valid_illustrations[:max_illustrations]
+    
+    def _validate_illustration(self, illust, video_duration: float) -> Optional[Dict]:
+        """Valider un moment d'illustration ; None s'il est inutilisable"""
+        if not isinstance(illust, dict):
+            return None
+        
+        timestamp = float(illust.get("timestamp", 0))
+        duration = float(illust.get("duration", 3))
+        keyword = illust.get("keyword", "").strip()
+        reason = illust.get("reason", "")
+        
+        # Vérifier la validité
+        if timestamp < 0 or timestamp >= video_duration:
+            return None
+        if not keyword:
+            return None
+        if duration < 1 or duration > 10:
+            duration = 3
+        
+        return {
+            "timestamp": timestamp,
+            "duration": duration,
+            "keyword": keyword,
+            "reason": reason
+        }
+    
     async def generate_thumbnail_prompt(
         self,
         transcript: str,
@@ -789,32 +1517,30 @@ EXEMPLES DE TITRES VIRAUX:
 - "VOUS N'ALLEZ PAS Y CROIRE!" (surprise)
 
 FORMAT DE RÉPONSE (en anglais):
-TITLE: [ton titre court viral ici]
-
-VISUAL PROMPT: [prompt détaillé de 150-200 mots décrivant l'image complète avec le texte inclus]
-
-Le prompt visuel doit inclure:
-- LE PERSONNAGE PHOTORÉALISTE: Le personnage de la webcam doit être GRAND (45-55% de l'image), apparaissant NATURELLEMENT au premier plan avec un effet de profondeur réaliste. Le personnage doit être PHOTORÉALISTE (comme une vraie photo, pas cartoon, pas illustration). Éclairage portrait réaliste (lumière clé naturelle, rim lighting subtil, ombre portée naturelle), expression naturelle mais expressive (surprise, enthousiasme), personnage naturellement positionné
-- Le texte principal (le titre créé) en TRÈS GRAND (60-70% de la hauteur), BOLD, UPPERCASE, avec contour épais noir (10px) et couleur jaune vif ou blanc, positionné DERRIÈRE le personnage (créant des couches de profondeur réalistes)
-- Flèches rouges géantes pointant vers le texte ET le personnage
-- Cercles rouges, badges "NEW" ou "HOT" autour du personnage
-- Explosions, éclairs, effets de vitesse DERRIÈRE le personnage (fond très flou avec bokeh réaliste) pour le faire ressortir naturellement
-- Couleurs vives (rouge #FF0000, jaune #FFFF00, bleu #00FFFF)
-- Composition photoréaliste avec profondeur: Personnage au premier plan (gauche ou droite, naturellement positionné), texte au centre/haut DERRIÈRE le personnage, effets dynamiques en arrière-plan très flou avec bokeh réaliste
-- Éclairage portrait réaliste: Lumière clé naturelle sur le visage créant des ombres réalistes, rim lighting subtil autour du personnage (séparation naturelle), fond naturellement plus sombre pour contraste réaliste
-- Style PHOTORÉALISTE professionnel avec profondeur de champ EXTREME (personnage net comme une photo portrait f/1.4, fond très flou avec bokeh crémeux réaliste), ombre portée naturelle derrière le personnage créant la profondeur réaliste
+TITLE: [ton titre court viral ici]
+
+VISUAL PROMPT: [prompt détaillé de 150-200 mots décrivant l'image complète avec le texte inclus]
+
+{THUMBNAIL_VISUAL_GUIDELINES}
 
 Réponds dans ce format exact."""
 
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 400
+        }
+        cache_key = llm_cache.make_key("thumbnail_prompt", request)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[OpenRouter] Prompt miniature servi depuis le cache")
+            return cached
+        
         try:
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=400
-            )
+            response = await client.chat.completions.create(**request)
             
             response_text = response.choices[0].message.content.strip()
             
@@ -822,21 +1548,31 @@ Réponds dans ce format exact."""
             thumbnail_title = None
             visual_prompt = None
             
-            # Chercher le titre après "TITLE:"
-            if "TITLE:" in response_text.upper():
-                title_match = response_text.split("TITLE:", 1)[1].split("VISUAL PROMPT:", 1)[0].strip()
-                thumbnail_title = title_match.split("\n")[0].strip()
-            
-            # Chercher le prompt visuel après "VISUAL PROMPT:"
-            if "VISUAL PROMPT:" in response_text.upper():
-                visual_prompt = response_text.split("VISUAL PROMPT:", 1)[1].strip()
+            m = _TITLE_RE.search(response_text)
+            if m:
+                # Titre : première ligne après "TITLE:" ; prompt visuel après "VISUAL PROMPT:"
+                thumbnail_title = m.group(1).split("\n")[0].strip()
+                visual_prompt = m.group(2)
             else:
-                # Si pas de format structuré, utiliser tout le texte
-                visual_prompt = response_text
+                m = _VISUAL_RE.search(response_text)
+                visual_prompt = m.group(1) if m else None
+            
+            # Si pas de format structuré, utiliser tout le texte
+            visual_prompt = visual_prompt.strip() if visual_prompt else response_text
+            
+            final_prompt = self._compose_thumbnail_prompt(thumbnail_title, visual_prompt or response_text)
+            if final_prompt:
+                llm_cache.put(cache_key, final_prompt)
+            return final_prompt
             
-            # Combiner le titre et le prompt visuel
-            if thumbnail_title:
-                final_prompt = f"""Create a VIRAL YouTube thumbnail with this EXACT TEXT prominently displayed:
+        except Exception as e:
+            print(f"[OpenRouter] Erreur génération prompt miniature: {e}")
+            return None
+    
+    def _compose_thumbnail_prompt(self, thumbnail_title: Optional[str], visual_prompt: str) -> str:
+        """Combiner le titre viral et le prompt visuel en prompt final pour Gemini"""
+        if thumbnail_title:
+            final_prompt = f"""Create a VIRAL YouTube thumbnail with this EXACT TEXT prominently displayed:
 
 TEXT TO DISPLAY: "{thumbnail_title.upper()}"
 
@@ -844,18 +1580,14 @@ VISUAL DESCRIPTION:
 {visual_prompt}
 
 CRITICAL: The text "{thumbnail_title.upper()}" MUST be included in the image, VERY LARGE (70-80% of height), BOLD, with thick black outline."""
-            else:
-                final_prompt = visual_prompt if visual_prompt else response_text
-            
-            print(f"[OpenRouter] Prompt miniature généré: {len(final_prompt)} chars")
-            if thumbnail_title:
-                print(f"[OpenRouter] Titre viral extrait: {thumbnail_title}")
-            
-            return final_prompt
-            
-        except Exception as e:
-            print(f"[OpenRouter] Erreur génération prompt miniature: {e}")
-            return None
+        else:
+            final_prompt = visual_prompt
+        
+        print(f"[OpenRouter] Prompt miniature généré: {len(final_prompt)} chars")
+        if thumbnail_title:
+            print(f"[OpenRouter] Titre viral extrait: {thumbnail_title}")
+        
+        return final_prompt
     
     async def generate_thumbnail_with_gemini(
         self,
@@ -874,171 +1606,36 @@ CRITICAL: The text "{thumbnail_title.upper()}" MUST be included in the image, VE
         Returns:
             Chemin du fichier généré ou None si erreur
         """
-        import aiohttp
-        import base64
-        
         if not self.api_key:
             print("[OpenRouter] API key non configurée pour Gemini")
             return None
         
-        # Construire le prompt avec contexte
-        full_prompt = f"""Create a VIRAL YouTube thumbnail image that will get MILLIONS of clicks. Follow these specifications EXACTLY:
-
-{prompt}
-
-CRITICAL VIRAL THUMBNAIL REQUIREMENTS (MUST FOLLOW ALL):
-1. TEXT IS MANDATORY AND DOMINANT:
-   - Include the main title text EXTREMELY LARGE (70-80% of image height)
-   - Text must be BOLD, UPPERCASE, with THICK black outline (10-12px) for maximum readability
-   - Text color: Bright yellow (#FFFF00) or white (#FFFFFF) with black outline
-   - Position: Centered or slightly diagonal for dynamism
-   - Add strong drop shadow and glow effect
-   - Background: Dark semi-transparent overlay (black with 50% opacity) behind text
-
-2. ULTRA-VIBRANT COLORS:
-   - Primary: Bright red (#FF0000), electric yellow (#FFFF00), neon blue (#00FFFF)
-   - Extreme contrasts: Dark backgrounds with bright foregrounds
-   - Saturation: MAXIMUM (100%)
-
-3. SHOCK ELEMENTS (MUST INCLUDE):
-   - Large red arrows (2-3) pointing directly at the text
-   - Red circles or badges with "NEW", "HOT", "FREE", or "10X"
-   - Explosion effects around key elements
-   - Lightning bolts or electric effects
-   - Speed lines or motion blur
-   - Particle effects
-
-4. NATURAL BUT EXPRESSIVE EMOTIONS FROM THE PERSON:
-   - THE PERSON'S FACE must show NATURAL emotion (surprised, excited, but REALISTIC, not exaggerated cartoon)
-   - Person's expression should be NATURAL and PHOTOREALISTIC (like a real person, not cartoon)
-   - Person's hands NATURALLY positioned or gesturing (realistic gesture, not dramatic cartoon)
-   - The person's expression should NATURALLY convey the emotion of the video topic
-   - Person should look NATURALLY at camera or at the text (natural eye contact, photorealistic)
-
-5. PHOTOREALISTIC COMPOSITION WITH REALISTIC 3D DEPTH:
-   - THE PERSON IS THE DOMINANT ELEMENT (45-55% of image, large, naturally in foreground, PHOTOREALISTIC)
-   - Person positioned naturally on left or right side (rule of thirds, realistic portrait composition)
-   - Text positioned BEHIND person (creating realistic depth layers: Person in front, text behind)
-   - EXTREME DEPTH LAYERS: Foreground (PERSON - crystal sharp, photorealistic), Midground (text - slightly blurred), Background (effects - heavily blurred with realistic bokeh)
-   - Person naturally in front of other elements (realistic depth, not breaking frame unnaturally)
-   - Natural composition: Professional portrait composition, person naturally positioned
-   - Person's shadow naturally cast (realistic lighting, natural shadow)
-   - Natural pose: Person naturally positioned, photorealistic
-
-6. HOOK ELEMENTS:
-   - Large numbers or percentages (if relevant)
-   - Badges or stickers
-   - Call-to-action elements
-
-7. PHOTOREALISTIC QUALITY WITH REALISTIC 3D DEPTH:
-   - REALISTIC PORTRAIT LIGHTING ON PERSON: 
-     * REALISTIC KEY LIGHT from front-left/right creating natural shadows on face (like professional portrait)
-     * NATURAL RIM LIGHT from behind creating realistic separation (not glowing, just natural highlight)
-     * NATURAL BACK LIGHT creating realistic separation and volume
-     * Natural light sources creating REALISTIC 3D FORM (face looks naturally rounded, photorealistic)
-   - PERFECT PHOTOREALISTIC SHARPNESS: PERSON crystal sharp (like f/1.4 portrait, photorealistic), text slightly soft, background EXTREMELY blurred with realistic bokeh
-   - EXTREME DEPTH OF FIELD: PERSON in perfect focus (appears close, photorealistic), background EXTREMELY blurred with CREAMY BOKEH (appears far, realistic)
-   - REALISTIC COLOR GRADING: Person warm/vibrant colors (appears close), background cool/desaturated (appears far, realistic)
-   - NATURAL SEPARATION: Person naturally separated from background through realistic depth of field and natural lighting (NO glowing halos on person, keep person photorealistic)
-   - NATURAL CONTRAST: Person naturally contrasted (realistic highlights and shadows), background naturally softer
-   - REALISTIC SHADOWS: Natural cast shadow (realistic lighting, natural shadow falloff)
-   - The person should look PHOTOREALISTIC, like a REAL PROFESSIONAL PHOTOGRAPH with realistic depth of field
-
-8. TECHNICAL SPECS:
-   - Resolution: 1280x720 pixels (16:9 aspect ratio)
-   - Format: High quality, sharp, no compression artifacts
-   - Every pixel must be optimized for maximum clickability
-
-MAXIMUM CLICKABILITY RULE: Every single element must scream "CLICK ME NOW!" The thumbnail should be impossible to ignore.
-
-Generate the COMPLETE thumbnail image WITH ALL TEXT AND ELEMENTS NOW. Make it ULTRA-VIRAL, CLICKABLE, and PROFESSIONAL!"""
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "HTTP-Referer": "http://localhost:8000",
-            "X-Title": "YouTube Pipeline",
-            "Content-Type": "application/json"
-        }
+        # Même pool de connexions (keep-alive, HTTP/2) que les autres appels OpenRouter
+        client = self._get_client()
+        if not client:
+            return None
+        
+        if webcam_frame_base64:
+            # Moins d'octets envoyés et de tokens d'entrée ; décodage/encodage hors de la boucle
+            # (thread : Pillow libère le GIL pendant le redimensionnement)
+            webcam_frame_base64 = await asyncio.to_thread(_downscale_frame_base64, webcam_frame_base64)
         
+        # Construire le prompt avec contexte : seule la description varie d'un appel à l'autre
+        full_prompt = THUMBNAIL_PROMPT_HEADER + prompt + THUMBNAIL_PROMPT_FOOTER
+
         # Construire le message
         messages = []
         
         if webcam_frame_base64:
             # Inclure la frame webcam pour que Gemini puisse extraire le personnage
-            person_prompt = """
-CRITICAL: THE PERSON FROM THE PROVIDED IMAGE MUST BE PHOTOREALISTIC (REAL-LIFE PHOTO) BUT WITH EXTREME 3D DEPTH:
-
-1. PHOTOREALISTIC PERSON WITH 3D DEPTH:
-   - The person must look like a REAL PHOTOGRAPH (photorealistic, not cartoon, not illustration)
-   - Use REALISTIC forced perspective: Person appears MUCH CLOSER than background (like real portrait photography)
-   - Create REALISTIC illusion of depth: Person's face/body should appear naturally in foreground
-   - The person should look like they're NATURALLY IN FRONT OF THE CAMERA (realistic close-up portrait)
-
-2. REALISTIC BUT DRAMATIC 3D LIGHTING:
-   - REALISTIC KEY LIGHT: Bright but natural spotlight from front-left or front-right (like professional portrait studio)
-   - REALISTIC RIM LIGHTING: Natural edge light around the person creating realistic separation (not glowing, just natural highlight)
-   - REALISTIC FILL LIGHT: Soft natural fill light on shadow side to maintain detail
-   - REALISTIC BACK LIGHT: Natural light from behind creating realistic separation from background
-   - The lighting should create REALISTIC 3D VOLUME (face looks naturally rounded, photorealistic)
-
-3. REALISTIC SIZE AND SCALE WITH 3D PERSPECTIVE:
-   - The person must occupy 45-55% of the thumbnail (large, realistic portrait size)
-   - Face should be LARGE (like a professional portrait close-up, realistic)
-   - Use REALISTIC foreshortening: Natural perspective (hands/arms closer appear naturally larger)
-   - The person should appear to be NATURALLY IN FRONT OF THE CAMERA (realistic close-up, not extreme)
-
-4. REALISTIC 3D SHADOWS AND DEPTH:
-   - REALISTIC CAST SHADOW: Natural shadow BEHIND the person (realistic lighting, natural shadow)
-   - Shadow should be NATURAL and REALISTIC (like person standing in real studio light)
-   - Natural shadow falloff: Shadow gets softer as it extends away (realistic)
-   - Shadow should look REALISTIC (not exaggerated, just natural depth)
-
-5. PHOTOREALISTIC VOLUME AND FORM:
-   - Face must have NATURAL 3D VOLUME (realistic cheekbones, nose, chin with natural depth)
-   - Use REALISTIC chiaroscuro (natural light/dark contrast) to show 3D form
-   - Clothing should show NATURAL folds and wrinkles (realistic texture, photorealistic)
-   - Hair should have NATURAL volume and depth (realistic hair, photorealistic)
-   - The person should look PHOTOREALISTIC, like a REAL PHOTOGRAPH, not a cartoon or illustration
-
-6. NATURAL BUT EXPRESSIVE EXPRESSION AND POSE:
-   - NATURAL facial expression (surprised, excited, but REALISTIC, not exaggerated cartoon)
-   - Person NATURALLY positioned (not leaning unnaturally, just naturally forward)
-   - Hands/arms NATURALLY positioned or gesturing (realistic gesture, not dramatic cartoon)
-   - Natural eye contact and expression (realistic)
-   - REALISTIC pose: Natural body position, photorealistic
-
-7. VISUAL EFFECTS FOR 3D POP-OUT (BUT PERSON STAYS REALISTIC):
-   - NATURAL DEPTH BLUR: Background heavily blurred with REALISTIC bokeh (like f/1.4 portrait), person crystal sharp
-   - NATURAL COLOR SEPARATION: Person naturally vibrant, background naturally desaturated (realistic color grading)
-   - PARTICLE EFFECTS: Sparks, energy, light rays AROUND the person (visual effects, but person stays photorealistic)
-   - NO ARTIFICIAL GLOWING HALO on person (keep person realistic, effects are separate)
-   - REFLECTIONS: Natural reflections on person's skin/clothing (realistic surface properties)
-
-8. REALISTIC COMPOSITION WITH 3D DEPTH:
-   - Person positioned naturally on left/right (rule of thirds, realistic portrait composition)
-   - Text positioned behind person (creating realistic depth layers)
-   - Person naturally in front of other elements (realistic depth)
-   - Natural composition: Professional portrait composition
-   - Person should look NATURALLY IN FRONT (realistic depth, not breaking frame unnaturally)
-
-9. PHOTOREALISTIC TECHNICAL QUALITY WITH 3D DEPTH:
-   - EXTREME DEPTH OF FIELD: Person EXTREMELY sharp (like f/1.4 portrait, photorealistic), background EXTREMELY blurred (realistic bokeh)
-   - REALISTIC COLOR GRADING: Person warm tones, background cool tones (realistic color separation)
-   - NATURAL CONTRAST: Person naturally contrasted (realistic highlights and shadows), background naturally softer
-   - NATURAL SATURATION: Person naturally saturated, background naturally desaturated
-   - The person should look like a REAL PHOTOGRAPH with realistic depth of field
-
-STYLE: PHOTOREALISTIC, REALISTIC, LIKE A REAL PHOTOGRAPH. The person must look REAL, not cartoon, not illustration, not 3D model.
-BUT with extreme depth of field and visual effects around them for 3D pop-out effect.
-
-USE THE PERSON'S EXACT LIKENESS FROM THE PROVIDED IMAGE, and render them PHOTOREALISTICALLY (like a real photograph) with REALISTIC 3D DEPTH through natural depth of field and realistic lighting. The person should look like a REAL PERSON IN A REAL PHOTOGRAPH, not a cartoon, not an illustration, not a 3D model.
-"""
             messages.append({
                 "role": "user",
                 "content": [
+                    # Consignes fixes en tête (préfixe mis en cache), puis la partie dynamique
+                    _cacheable_text(THUMBNAIL_PERSON_REQUIREMENTS),
                     {
                         "type": "text",
-                        "text": f"{person_prompt}\n\n{full_prompt}"
+                        "text": full_prompt
                     },
                     {
                         "type": "image_url",
@@ -1051,143 +1648,60 @@ USE THE PERSON'S EXACT LIKENESS FROM THE PROVIDED IMAGE, and render them PHOTORE
         else:
             messages.append({
                 "role": "user",
-                "content": full_prompt
+                "content": [
+                    _cacheable_text(THUMBNAIL_REQUIREMENTS),
+                    {
+                        "type": "text",
+                        "text": full_prompt
+                    }
+                ]
             })
         
-        payload = {
-            "model": "google/gemini-3-pro-image-preview",
-            "messages": messages,
-            "max_tokens": 4096
-        }
-        
         try:
             print("[OpenRouter] Génération miniature avec Gemini...")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"[OpenRouter] Erreur Gemini: {response.status} - {error_text[:500]}")
-                        return None
-                    
-                    data = await response.json()
-                    
-                    # Debug: sauvegarder la réponse complète dans un fichier temporaire
-                    debug_file = Path(output_path).parent / "gemini_response_debug.json"
-                    with open(debug_file, "w", encoding="utf-8") as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    print(f"[OpenRouter] Réponse Gemini sauvegardée dans: {debug_file}")
-                    
-                    # Extraire le contenu de la réponse
-                    content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                    
-                    # Vérifier d'abord la clé "images" (format Gemini)
-                    message = data.get("choices", [{}])[0].get("message", {})
-                    images = message.get("images", [])
-                    if images:
-                        for img in images:
-                            img_type = img.get("type", "")
-                            if img_type == "image_url":
-                                image_url = img.get("image_url", {}).get("url", "")
-                                if image_url.startswith("data:image"):
-                                    image_data = image_url.split("base64,")[1]
-                                    try:
-                                        image_bytes = base64.b64decode(image_data)
-                                        with open(output_path, "wb") as f:
-                                            f.write(image_bytes)
-                                        print(f"[OpenRouter] Miniature générée depuis images[].image_url: {output_path}")
-                                        return output_path
-                                    except Exception as e:
-                                        print(f"[OpenRouter] Erreur décodage images[].image_url: {e}")
-                            elif img_type == "image" and "b64_json" in img:
-                                b64_json = img.get("b64_json", "")
-                                if b64_json:
-                                    try:
-                                        image_bytes = base64.b64decode(b64_json)
-                                        with open(output_path, "wb") as f:
-                                            f.write(image_bytes)
-                                        print(f"[OpenRouter] Miniature générée depuis images[].b64_json: {output_path}")
-                                        return output_path
-                                    except Exception as e:
-                                        print(f"[OpenRouter] Erreur décodage images[].b64_json: {e}")
-                    
-                    # Vérifier si c'est une liste (format multimodal)
-                    if isinstance(message.get("content"), list):
-                        # Chercher une image dans le contenu multimodal
-                        for item in message["content"]:
-                            item_type = item.get("type", "")
-                            
-                            # Format 1: image_url avec data:image
-                            if item_type == "image_url":
-                                image_url = item.get("image_url", {}).get("url", "")
-                                if image_url.startswith("data:image"):
-                                    image_data = image_url.split("base64,")[1]
-                                    try:
-                                        image_bytes = base64.b64decode(image_data)
-                                        with open(output_path, "wb") as f:
-                                            f.write(image_bytes)
-                                        print(f"[OpenRouter] Miniature générée depuis image_url: {output_path}")
-                                        return output_path
-                                    except Exception as e:
-                                        print(f"[OpenRouter] Erreur décodage image_url: {e}")
-                            
-                            # Format 2: image avec b64_json
-                            elif item_type == "image":
-                                image_obj = item.get("image", {})
-                                b64_json = image_obj.get("b64_json", "")
-                                if b64_json:
-                                    try:
-                                        image_bytes = base64.b64decode(b64_json)
-                                        with open(output_path, "wb") as f:
-                                            f.write(image_bytes)
-                                        print(f"[OpenRouter] Miniature générée depuis b64_json: {output_path}")
-                                        return output_path
-                                    except Exception as e:
-                                        print(f"[OpenRouter] Erreur décodage b64_json: {e}")
-                            
-                            # Format 3: image avec url directe
-                            elif item_type == "image" and "url" in item:
-                                image_url = item.get("url", "")
-                                if image_url.startswith("data:image"):
-                                    image_data = image_url.split("base64,")[1]
-                                    try:
-                                        image_bytes = base64.b64decode(image_data)
-                                        with open(output_path, "wb") as f:
-                                            f.write(image_bytes)
-                                        print(f"[OpenRouter] Miniature générée depuis image.url: {output_path}")
-                                        return output_path
-                                    except Exception as e:
-                                        print(f"[OpenRouter] Erreur décodage image.url: {e}")
-                    
-                    # Vérifier si la réponse contient une image en base64
-                    if "data:image" in content or content.startswith("/9j/") or content.startswith("iVBOR"):
-                        # Extraire le base64 de l'image
-                        if "base64," in content:
-                            image_data = content.split("base64,")[1].split('"')[0]
-                        else:
-                            image_data = content
-                        
-                        # Décoder et sauvegarder
-                        try:
-                            image_bytes = base64.b64decode(image_data)
-                            with open(output_path, "wb") as f:
-                                f.write(image_bytes)
-                            print(f"[OpenRouter] Miniature générée: {output_path}")
-                            return output_path
-                        except Exception as e:
-                            print(f"[OpenRouter] Erreur décodage image: {e}")
-                            return None
-                    else:
-                        # Gemini n'a pas généré d'image directement
-                        # On peut utiliser le texte retourné comme nouveau prompt
-                        print(f"[OpenRouter] Gemini n'a pas généré d'image directement")
-                        print(f"[OpenRouter] Réponse: {content[:500]}")
-                        return None
-                        
+            # Réponse brute : les images (images[], contenu multimodal) sont hors du schéma du SDK
+            try:
+                raw = await client.with_options(
+                    timeout=GEMINI_TIMEOUT, max_retries=0
+                ).chat.completions.with_raw_response.create(
+                    model="google/gemini-3-pro-image-preview",
+                    messages=messages,
+                    max_tokens=4096
+                )
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if status is None:
+                    raise
+                print(f"[OpenRouter] Erreur Gemini: {status} - {str(e)[:500]}")
+                return None
+            
+            data = raw.http_response.json()
+            _log_prompt_cache(data.get("usage"))
+            
+            # Debug (DEBUG_GEMINI=1) : sauvegarder la réponse complète (plusieurs Mo) hors de la boucle
+            if os.getenv("DEBUG_GEMINI"):
+                debug_file = Path(output_path).parent / "gemini_response_debug.json"
+                await asyncio.to_thread(_write_debug_json, debug_file, data)
+                print(f"[OpenRouter] Réponse Gemini sauvegardée dans: {debug_file}")
+            
+            message = data.get("choices", [{}])[0].get("message", {})
+            
+            # Première image trouvée (formats Gemini/OpenRouter, voir _iter_image_payloads)
+            for label, source, start, end in _iter_image_payloads(message):
+                try:
+                    await asyncio.to_thread(_save_base64_image, source, output_path, start, end)
+                    print(f"[OpenRouter] Miniature générée depuis {label}: {output_path}")
+                    return output_path
+                except Exception as e:
+                    print(f"[OpenRouter] Erreur décodage {label}: {e}")
+            
+            # Gemini n'a pas généré d'image directement
+            content = message.get("content") or ""
+            print(f"[OpenRouter] Gemini n'a pas généré d'image directement")
+            print(f"[OpenRouter] Réponse: {str(content)[:500]}")
+            return None
+            
         except Exception as e:
             import traceback
             print(f"[OpenRouter] Erreur génération miniature: {e}")
@@ -1202,6 +1716,7 @@ USE THE PERSON'S EXACT LIKENESS FROM THE PROVIDED IMAGE, and render them PHOTORE
     ) -> Optional[Dict]:
         """
         Générer titre et description pour un short avec mentions branding
+        (un short isolé ; pour tous les shorts d'une vidéo, analyze_video_bundle en un appel)
         
         Args:
             transcript_segment: Transcription du segment du short
@@ -1215,62 +1730,216 @@ USE THE PERSON'S EXACT LIKENESS FROM THE PROVIDED IMAGE, and render them PHOTORE
         if not client:
             return None
         
-        prompt = f"""Tu es un expert en création de contenu viral. Génère un titre et une description pour ce short YouTube/TikTok.
-
-TRANSCRIPTION DU SHORT:
-{transcript_segment[:1000]}
-
-RÈGLES:
-1. Titre: Maximum 60 caractères, accrocheur, avec emoji
-2. Description: 2-3 lignes engageantes
-3. Inclure un appel à l'action pour rejoindre la communauté
-4. Mentionner: skool.com/vibeacademy ou vibeacademy.eu
-5. Ajouter 5-10 hashtags pertinents
-
-Réponds au format JSON:
-{{
-  "title": "🔥 Titre accrocheur ici",
-  "description": "Description engageante...\\n\\n🚀 Rejoins la communauté: skool.com/vibeacademy",
-  "hashtags": ["#short", "#tutorial", "#tech"]
-}}"""
+        # Partie dynamique en dernier : le préfixe fixe est partagé par tous les shorts
+        prompt = f"""TRANSCRIPTION DU SHORT:
+{transcript_segment[:1000]}"""
+        
+        # Relance du pipeline sur le même short : réponse identique à réutiliser
+        cache_key = llm_cache.make_key("short_metadata", self.model, SHORT_METADATA_SYSTEM_PROMPT, prompt)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print(f"[OpenRouter] Métadonnées short {short_index} depuis le cache")
+            return cached
 
         try:
-            response = client.chat.completions.create(
+            # Réponse en flux : le titre est connu (et journalisé) avant la fin de la génération
+            chunks = []
+            buffer = ""
+            title_at = -1
+            async for delta in self.stream_completion(
                 model=self.model,
                 messages=[
                     {
                         "role": "system",
-                        "content": "Tu génères du contenu viral pour les réseaux sociaux. Réponds uniquement en JSON valide."
+                        "content": [_cacheable_text(SHORT_METADATA_SYSTEM_PROMPT)]
                     },
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 max_tokens=500
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Extraire le JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
+            ):
+                chunks.append(delta)
+                if buffer is not None:
+                    # Tampon tenu seulement jusqu'au titre ; seule la fin est parcourue
+                    # ("title" peut être à cheval sur deux fragments)
+                    scan_from = max(0, len(buffer) - len('"title"'))
+                    buffer += delta
+                    if title_at < 0:
+                        title_at = buffer.find('"title"', scan_from)
+                    m = _PARTIAL_TITLE_RE.match(buffer, title_at) if title_at >= 0 else None
+                    if m:
+                        buffer = None
+                        print(f"[OpenRouter] Short {short_index}: titre reçu \"{m.group(1)}\"")
             
-            result = json.loads(content)
+            # Post-traitement (mentions branding) sur le JSON complet
+            content = _strip_code_fence("".join(chunks).strip())
             
-            # Assurer que les mentions sont présentes
-            if "skool.com/vibeacademy" not in result.get("description", ""):
-                result["description"] += "\n\n🚀 Rejoins-nous: skool.com/vibeacademy"
-            
-            print(f"[OpenRouter] Métadonnées short {short_index} générées")
-            return result
+            result = self._finalize_short_metadata(orjson.loads(content), short_index)
             
         except Exception as e:
             print(f"[OpenRouter] Erreur génération métadonnées short: {e}")
-            # Retourner des valeurs par défaut
-            return {
-                "title": f"🔥 Short #{short_index}",
-                "description": f"Découvre ce moment incroyable!\n\n🚀 Rejoins la communauté: skool.com/vibeacademy\n🌐 Plus d'infos: vibeacademy.eu",
-                "hashtags": ["#short", "#viral", "#tutorial", "#vibeacademy"]
-            }
+            return self._default_short_metadata(short_index)
+        
+        llm_cache.put(cache_key, result)
+        return result
+    
+    def _finalize_short_metadata(self, result: Dict, short_index: int) -> Dict:
+        """Assurer que les mentions branding sont présentes dans la description"""
+        result["description"] = result.get("description", "")
+        if "skool.com/vibeacademy" not in result["description"]:
+            result["description"] += "\n\n🚀 Rejoins-nous: skool.com/vibeacademy"
+        
+        print(f"[OpenRouter] Métadonnées short {short_index} générées")
+        return result
+    
+    def _default_short_metadata(self, short_index: int) -> Dict:
+        """Valeurs par défaut d'un short quand la génération échoue"""
+        return {
+            "title": f"🔥 Short #{short_index}",
+            "description": f"Découvre ce moment incroyable!\n\n🚀 Rejoins la communauté: skool.com/vibeacademy\n🌐 Plus d'infos: vibeacademy.eu",
+            "hashtags": ["#short", "#viral", "#tutorial", "#vibeacademy"]
+        }
+    
+    async def analyze_video_bundle(
+        self,
+        segments: Optional[List[Dict]],
+        transcript: str,
+        title: Optional[str],
+        video_duration: float,
+        max_illustrations: int = 5,
+        short_texts: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Illustrations B-roll, prompt miniature et métadonnées des shorts en UN seul appel :
+        la transcription n'est envoyée qu'une fois, une seule réponse JSON à parser.
+        
+        Chaque section est optionnelle (segments, title ou short_texts absents = section omise) ;
+        analyze_for_illustrations, generate_thumbnail_prompt et generate_short_metadata
+        restent disponibles pour un besoin isolé.
+        
+        Returns:
+            Dict avec "illustrations" (liste ou None), "thumbnail_prompt" (str ou None)
+            et "shorts" (une entrée par texte de short_texts, valeurs par défaut si absente)
+        """
+        short_texts = short_texts or []
+        want_illustrations = bool(segments)
+        want_thumbnail = bool(title)
+        result = {
+            "illustrations": None,
+            "thumbnail_prompt": None,
+            "shorts": [self._default_short_metadata(i + 1) for i in range(len(short_texts))]
+        }
+        if not (want_illustrations or want_thumbnail or short_texts):
+            return result
+        
+        client = self._get_client()
+        if not client:
+            return result
+        
+        # Transcription horodatée si disponible (utile aux illustrations), sinon texte brut
+        if want_illustrations:
+            transcript_text = self._segments_blocks(segments)[2]
+        else:
+            transcript_text = transcript[:2000]
+        
+        # Préfixe fixe (consignes + format) dans le message système mis en cache ; les paramètres
+        # de la vidéo puis la transcription en fin de message utilisateur
+        instructions = [
+            "Tu es un expert en montage vidéo et en contenu viral YouTube. Réponds uniquement en JSON valide.\n\n"
+            "Analyse la vidéo dont la transcription est fournie en fin de message et réalise les tâches ci-dessous."
+        ]
+        expected = []
+        parameters = []
+        if want_illustrations:
+            instructions.append(f"""ILLUSTRATIONS:
+Identifie les moments clés (nombre maximum indiqué) pour insérer un B-ROLL (clip vidéo uniquement, PAS d'image fixe), espacés dans la vidéo.
+Pour chaque moment: timestamp (secondes), duration (2-3 secondes), keyword (EN ANGLAIS, 1-2 mots simples pour Pexels), reason.
+
+{ILLUSTRATION_GUIDELINES}""")
+            expected.append('"illustrations": [{"timestamp": 15.5, "duration": 3, "keyword": "coding laptop", "reason": "..."}]')
+            parameters.append(
+                f"ILLUSTRATIONS: SEULEMENT {max_illustrations} moments maximum "
+                f"(durée totale: {video_duration:.1f} secondes)."
+            )
+        if want_thumbnail:
+            instructions.append(f"""THUMBNAIL:
+Miniature YouTube VIRALE pour la vidéo dont le titre est indiqué.
+Crée un titre COURT ET VIRAL (3-5 mots max, ex: "10X PLUS RAPIDE!") puis un prompt visuel détaillé EN ANGLAIS de 150-200 mots incluant ce titre.
+
+{THUMBNAIL_VISUAL_GUIDELINES}""")
+            expected.append('"thumbnail": {"title": "...", "visual_prompt": "..."}')
+            parameters.append(f'THUMBNAIL: vidéo "{title}".')
+        if short_texts:
+            instructions.append(f"""SHORTS_METADATA:
+Titre et description pour chaque short YouTube/TikTok listé.
+
+{SHORT_METADATA_RULES}""")
+            expected.append('"shorts": [{"index": 1, "title": "🔥 ...", "description": "...", "hashtags": ["#short"]}]')
+            shorts_list = "\n".join(
+                f"[{i + 1}] {text[:1000]}" for i, text in enumerate(short_texts)
+            )
+            parameters.append(f"SHORTS_METADATA:\n{shorts_list}")
+        
+        expected_text = ",\n  ".join(expected)
+        instructions.append(f"""Réponds UNIQUEMENT avec un objet JSON:
+{{
+  {expected_text}
+}}""")
+        system_content = "\n\n".join(instructions)
+        prompt = "\n\n".join(parameters) + f"\n\nTRANSCRIPTION:\n{transcript_text}"
+        
+        # Relance du pipeline : même vidéo, même réponse
+        cache_key = llm_cache.make_key("bundle", self.model, system_content, prompt)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print("[OpenRouter] Analyse groupée servie depuis le cache")
+            return cached
+        
+        try:
+            print("[OpenRouter] Analyse groupée (illustrations, miniature, shorts)...")
+            # Réponse en flux (jusqu'à 1900 + 300 tokens par short) : réception pendant la génération
+            chunks = []
+            async for delta in self.stream_completion(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": [_cacheable_text(system_content)]},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.7,
+                max_tokens=BUNDLE_BASE_MAX_TOKENS + BUNDLE_TOKENS_PER_SHORT * len(short_texts)
+            ):
+                chunks.append(delta)
+            data = orjson.loads("".join(chunks))
+        except Exception as e:
+            print(f"[OpenRouter] Erreur analyse groupée: {e}")
+            return result
+        
+        # Répartir les champs vers les validations de chaque méthode dédiée
+        if want_illustrations:
+            result["illustrations"] = self._validate_illustrations(
+                data.get("illustrations"), video_duration, max_illustrations
+            )
+        
+        thumbnail = data.get("thumbnail")
+        if want_thumbnail and isinstance(thumbnail, dict) and thumbnail.get("visual_prompt"):
+            result["thumbnail_prompt"] = self._compose_thumbnail_prompt(
+                (thumbnail.get("title") or "").strip() or None,
+                thumbnail["visual_prompt"].strip()
+            )
+        
+        shorts = data.get("shorts")
+        filled = set()
+        for position, item in enumerate(shorts if isinstance(shorts, list) else []):
+            if not isinstance(item, dict):
+                continue
+            short_index = item.get("index", position + 1)
+            if isinstance(short_index, int) and 1 <= short_index <= len(short_texts):
+                result["shorts"][short_index - 1] = self._finalize_short_metadata(item, short_index)
+                filled.add(short_index)
+        
+        # Réponse incomplète (valeurs par défaut) : pas de mise en cache, la relance retentera
+        if (not want_thumbnail or result["thumbnail_prompt"]) and len(filled) == len(short_texts):
+            llm_cache.put(cache_key, result)
+        return result
 
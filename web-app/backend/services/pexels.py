@@ -2,11 +2,17 @@
 Service Pexels pour télécharger des clips vidéo d'illustration
 """
 import os
+import json
+import time
+import hashlib
 import aiohttp
+import aiofiles
 import asyncio
-from typing import Optional, List, Dict
+import threading
+from typing import Optional, List, Dict, AsyncIterator
 from pathlib import Path
 from dotenv import load_dotenv
+from services.ffmpeg_caps import preferred_h264_args
 
 # Charger le .env depuis la racine du projet
 env_path = Path(__file__).parent.parent.parent.parent / ".env"
@@ -16,6 +22,79 @@ else:
     load_dotenv()
 
 
+# Limites de l'API Pexels : recherches cadencées par un seau à jetons (rafales autorisées),
+# téléchargements (CDN) en parallèle dans la limite de PEXELS_MAX_CONCURRENCY
+PEXELS_SEARCH_RATE = 2.0  # recherches par seconde
+PEXELS_SEARCH_BURST = 2
+PEXELS_MAX_CONCURRENCY = 5
+
+# Taille des blocs écrits sur disque pendant un téléchargement
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+
+
+class _TokenBucket:
+    """Seau à jetons partagé par le processus (indépendant de la boucle d'événements)"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _reserve(self) -> float:
+        """Réserver un jeton ; retourne l'attente nécessaire (jetons négatifs = file d'attente)"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+    
+    async def acquire(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+_search_limiter = _TokenBucket(PEXELS_SEARCH_RATE, PEXELS_SEARCH_BURST)
+
+# Cache des recherches (relances du pipeline, mot-clé générique de repli) :
+# liste de résultats déjà allégée, sur disque si diskcache est installé
+SEARCH_CACHE_TTL = 24 * 3600  # secondes
+_search_cache = None
+
+
+def _search_cache_key(query: str, orientation: str, size: str, per_page: int) -> str:
+    """Clé SHA-256 de la recherche normalisée"""
+    raw = json.dumps([query.lower().strip(), orientation, size, per_page])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get_search_cache():
+    global _search_cache
+    if _search_cache is None:
+        try:
+            import diskcache
+            _search_cache = diskcache.Cache(os.getenv("PEXELS_CACHE_DIR", ".pexels_cache"))
+        except Exception as e:
+            print(f"[Pexels] Cache disque indisponible: {e}")
+            _search_cache = False
+    return _search_cache or None
+
+
+# Session HTTP partagée (keep-alive) : (boucle, session), une session est liée à sa boucle
+_shared_session: Optional[tuple] = None
+
+
+async def close_shared_session() -> None:
+    """Fermer la session Pexels liée à la boucle courante (arrêt de l'application)"""
+    global _shared_session
+    if _shared_session and _shared_session[0] is asyncio.get_running_loop():
+        await _shared_session[1].close()
+        _shared_session = None
+
+
 class PexelsService:
     """Service pour rechercher et télécharger des clips vidéo depuis Pexels"""
     
@@ -28,6 +107,36 @@ class PexelsService:
         """Vérifie si l'API Pexels est configurée"""
         return bool(self.api_key)
     
+    async def _session(self) -> aiohttp.ClientSession:
+        """Session aiohttp partagée : connexions TCP/TLS réutilisées entre recherches et téléchargements"""
+        global _shared_session
+        loop = asyncio.get_running_loop()
+        if _shared_session and _shared_session[0] is loop and not _shared_session[1].closed:
+            return _shared_session[1]
+        if _shared_session:
+            # Session d'une autre boucle : la fermer sur sa boucle si elle tourne encore
+            # (boucle arrêtée : fermée par close_shared_session avant, voir tasks.run_async)
+            old_loop, old_session = _shared_session
+            if old_loop.is_running() and not old_loop.is_closed():
+                asyncio.run_coroutine_threadsafe(old_session.close(), old_loop)
+        
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=50,
+                limit_per_host=20,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            ),
+            # Pas de limite globale (gros clips HD) : seul un arrêt du flux de plus de 60 s échoue
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=60)
+        )
+        _shared_session = (loop, session)
+        return session
+    
+    async def close(self):
+        """Fermer la session HTTP partagée"""
+        await close_shared_session()
+    
     async def search_videos(
         self,
         query: str,
@@ -62,65 +171,80 @@ class PexelsService:
             "size": size
         }
         
+        # diskcache = SQLite bloquant : lectures/écritures hors de la boucle d'événements
+        cache = await asyncio.to_thread(_get_search_cache)
+        cache_key = _search_cache_key(query, orientation, size, per_page)
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                print(f"[Pexels] Cache hit pour '{query}'")
+                return cached
+        
+        await _search_limiter.acquire()
+        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.videos_url,
-                    headers=headers,
-                    params=params
-                ) as response:
-                    if response.status != 200:
-                        print(f"[Pexels] Erreur API: {response.status}")
-                        return None
-                    
-                    data = await response.json()
-                    videos = data.get("videos", [])
+            session = await self._session()
+            async with session.get(
+                self.videos_url,
+                headers=headers,
+                params=params
+            ) as response:
+                if response.status != 200:
+                    print(f"[Pexels] Erreur API: {response.status}")
+                    return None
+                
+                data = await response.json()
+                videos = data.get("videos", [])
+                
+                if not videos:
+                    print(f"[Pexels] Aucune vidéo trouvée pour '{query}'")
+                    if cache is not None:
+                        await asyncio.to_thread(cache.set, cache_key, [], expire=SEARCH_CACHE_TTL)
+                    return []
+                
+                # Extraire les informations utiles
+                results = []
+                for video in videos:
+                    video_files = video.get("video_files", [])
                     
-                    if not videos:
-                        print(f"[Pexels] Aucune vidéo trouvée pour '{query}'")
-                        return []
-                    
-                    # Extraire les informations utiles
-                    results = []
-                    for video in videos:
-                        video_files = video.get("video_files", [])
+                    # Trouver la meilleure qualité HD (préférer 1080p ou 720p)
+                    best_file = None
+                    for vf in video_files:
+                        quality = vf.get("quality", "")
+                        width = vf.get("width", 0)
                         
-                        # Trouver la meilleure qualité HD (préférer 1080p ou 720p)
-                        best_file = None
+                        if quality == "hd" and width >= 1280:
+                            if best_file is None or width > best_file.get("width", 0):
+                                best_file = vf
+                    
+                    # Fallback sur la première vidéo HD disponible
+                    if not best_file:
                         for vf in video_files:
-                            quality = vf.get("quality", "")
-                            width = vf.get("width", 0)
-                            
-                            if quality == "hd" and width >= 1280:
-                                if best_file is None or width > best_file.get("width", 0):
-                                    best_file = vf
-                        
-                        # Fallback sur la première vidéo HD disponible
-                        if not best_file:
-                            for vf in video_files:
-                                if vf.get("quality") == "hd":
-                                    best_file = vf
-                                    break
-                        
-                        # Fallback sur n'importe quelle vidéo
-                        if not best_file and video_files:
-                            best_file = video_files[0]
-                        
-                        if best_file:
-                            results.append({
-                                "id": video.get("id"),
-                                "width": best_file.get("width"),
-                                "height": best_file.get("height"),
-                                "duration": video.get("duration"),
-                                "url": best_file.get("link"),
-                                "file_type": best_file.get("file_type", "video/mp4"),
-                                "user": video.get("user", {}).get("name", "Unknown"),
-                                "thumbnail": video.get("image")
-                            })
+                            if vf.get("quality") == "hd":
+                                best_file = vf
+                                break
                     
-                    print(f"[Pexels] {len(results)} vidéo(s) trouvée(s) pour '{query}'")
-                    return results
+                    # Fallback sur n'importe quelle vidéo
+                    if not best_file and video_files:
+                        best_file = video_files[0]
                     
+                    if best_file:
+                        results.append({
+                            "id": video.get("id"),
+                            "width": best_file.get("width"),
+                            "height": best_file.get("height"),
+                            "duration": video.get("duration"),
+                            "url": best_file.get("link"),
+                            "file_type": best_file.get("file_type", "video/mp4"),
+                            "user": video.get("user", {}).get("name", "Unknown"),
+                            "thumbnail": video.get("image")
+                        })
+                
+                print(f"[Pexels] {len(results)} vidéo(s) trouvée(s) pour '{query}'")
+                if cache is not None:
+                    await asyncio.to_thread(cache.set, cache_key, results, expire=SEARCH_CACHE_TTL)
+                return results
+                
         except Exception as e:
             print(f"[Pexels] Erreur recherche: {e}")
             return None
@@ -143,32 +267,55 @@ class PexelsService:
             True si téléchargé avec succès
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url) as response:
-                    if response.status != 200:
-                        print(f"[Pexels] Erreur téléchargement: {response.status}")
-                        return False
-                    
-                    # Télécharger en chunks
-                    output_file = Path(output_path)
-                    output_file.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    with open(output_file, "wb") as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            f.write(chunk)
+            session = await self._session()
+            async with session.get(video_url) as response:
+                if response.status != 200:
+                    print(f"[Pexels] Erreur téléchargement: {response.status}")
+                    return False
+                
+                # Télécharger en chunks
+                output_file = Path(output_path)
+                output_file.parent.mkdir(parents=True, exist_ok=True)
+                
+                # Écriture asynchrone : ne bloque pas les autres téléchargements en cours
+                async with aiofiles.open(output_file, "wb") as f:
+                    # Taille annoncée : fichier préalloué d'un bloc (moins de fragmentation)
+                    size = response.content_length or 0
+                    if size > 0:
+                        await self._preallocate(f, size)
                     
-                    print(f"[Pexels] Vidéo téléchargée: {output_path} ({output_file.stat().st_size} bytes)")
-                    
-                    # Si max_duration spécifié, découper la vidéo
-                    if max_duration and max_duration > 0:
-                        await self._trim_video(output_path, max_duration)
-                    
-                    return True
+                    written = 0
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
+                        written += len(chunk)
                     
+                    # Taille annoncée inexacte : ne pas laisser de zéros en fin de fichier
+                    if size > 0 and written != size:
+                        await f.truncate(written)
+                
+                print(f"[Pexels] Vidéo téléchargée: {output_path} ({output_file.stat().st_size} bytes)")
+                
+                # Si max_duration spécifié, découper la vidéo
+                if max_duration and max_duration > 0:
+                    await self._trim_video(output_path, max_duration)
+                
+                return True
+                
         except Exception as e:
             print(f"[Pexels] Erreur téléchargement: {e}")
             return False
     
+    async def _preallocate(self, f, size: int):
+        """Réserver la taille finale du fichier (posix_fallocate, sinon extension par truncate)"""
+        try:
+            if hasattr(os, "posix_fallocate"):
+                await asyncio.to_thread(os.posix_fallocate, f.fileno(), 0, size)
+            else:
+                await f.truncate(size)
+        except OSError as e:
+            # Système de fichiers sans préallocation : écriture normale
+            print(f"[Pexels] Préallocation impossible: {e}")
+    
     async def _trim_video(self, video_path: str, max_duration: float) -> bool:
         """Découper une vidéo à une durée maximale"""
         import subprocess
@@ -180,18 +327,22 @@ class PexelsService:
         
         temp_path = video_path + ".temp.mp4"
         
+        # Encodeur matériel si disponible (détection lancée une seule fois, hors de la boucle)
+        video_args = await asyncio.to_thread(preferred_h264_args, ffmpeg_path)
+        
         cmd = [
             ffmpeg_path, "-y",
             "-i", video_path,
             "-t", str(max_duration),
-            "-c:v", "libx264", "-preset", "fast", "-crf", "18",
+            *video_args,
             "-c:a", "aac", "-b:a", "192k",
             "-movflags", "+faststart",
             temp_path
         ]
         
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+            # Hors de la boucle : plusieurs téléchargements se terminent en même temps
+            result = await asyncio.to_thread(subprocess.run, cmd, capture_output=True, text=True, timeout=60)
             if result.returncode == 0:
                 # Remplacer le fichier original
                 Path(video_path).unlink()
@@ -254,72 +405,82 @@ class PexelsService:
         
         return None
     
-    async def download_illustrations(
+    async def download_illustrations_stream(
         self,
-        illustrations: List[Dict],
+        illustrations: AsyncIterator[Dict],
         output_dir: str
     ) -> List[Dict]:
         """
-        Télécharger plusieurs clips d'illustration
+        Télécharger les clips d'illustration à partir d'un flux (OpenRouterService.stream_illustrations) :
+        chaque téléchargement démarre dès que son moment arrive, pendant que le LLM génère la suite.
         
-        Args:
-            illustrations: Liste de {timestamp, duration, keyword, reason}
-            output_dir: Dossier de sortie
-            
         Returns:
-            Liste des illustrations téléchargées avec leurs chemins locaux
+            Liste des illustrations téléchargées avec leurs chemins locaux (ordre d'arrivée)
         """
         if not self.api_key:
             print("[Pexels] API key non configurée - illustrations ignorées")
             return []
         
-        results = []
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        for i, illust in enumerate(illustrations):
-            keyword = illust.get("keyword", "")
-            duration = illust.get("duration", 3)
-            
-            if not keyword:
-                continue
-            
-            # Nom de fichier sécurisé
-            safe_keyword = "".join(c for c in keyword if c.isalnum() or c in " _-")[:30]
-            filename = f"pexels_{i}_{safe_keyword.replace(' ', '_')}.mp4"
-            file_path = str(output_path / filename)
-            
-            print(f"[Pexels] Téléchargement {i+1}/{len(illustrations)}: '{keyword}'")
-            
-            video_info = await self.search_and_download(
-                query=keyword,
-                output_path=file_path,
-                max_duration=duration + 1,  # +1s de marge
-                orientation="landscape"
-            )
-            
-            if video_info:
-                results.append({
-                    **illust,
-                    "local_path": file_path,
-                    "pexels_id": video_info.get("id"),
-                    "pexels_user": video_info.get("user"),
-                    "downloaded": True
-                })
-            else:
-                results.append({
-                    **illust,
-                    "downloaded": False,
-                    "error": f"Aucune vidéo trouvée pour '{keyword}'"
-                })
-            
-            # Petit délai entre les requêtes pour respecter les rate limits
-            await asyncio.sleep(0.5)
+        semaphore = asyncio.Semaphore(PEXELS_MAX_CONCURRENCY)
+        
+        async def bounded_download(i: int, illust: Dict) -> Dict:
+            async with semaphore:
+                print(f"[Pexels] Téléchargement {i+1}: '{illust['keyword']}'")
+                # Une illustration en échec n'interrompt pas les autres téléchargements
+                try:
+                    return await self._download_illustration(i, illust, output_path)
+                except Exception as e:
+                    return {**illust, "downloaded": False, "error": str(e)}
         
+        tasks = []
+        try:
+            async for illust in illustrations:
+                if not illust.get("keyword", ""):
+                    continue
+                tasks.append(asyncio.create_task(bounded_download(len(tasks), illust)))
+        except Exception as e:
+            # Les téléchargements déjà lancés restent valables
+            print(f"[Pexels] Flux d'illustrations interrompu: {e}")
+        
+        results = list(await asyncio.gather(*tasks)) if tasks else []
         downloaded_count = sum(1 for r in results if r.get("downloaded"))
-        print(f"[Pexels] {downloaded_count}/{len(illustrations)} illustrations téléchargées")
+        print(f"[Pexels] {downloaded_count}/{len(results)} illustrations téléchargées")
         
         return results
+    
+    async def _download_illustration(self, index: int, illust: Dict, output_path: Path) -> Dict:
+        """Rechercher et télécharger le clip d'une illustration"""
+        keyword = illust.get("keyword", "")
+        duration = illust.get("duration", 3)
+        
+        # Nom de fichier sécurisé
+        safe_keyword = "".join(c for c in keyword if c.isalnum() or c in " _-")[:30]
+        filename = f"pexels_{index}_{safe_keyword.replace(' ', '_')}.mp4"
+        file_path = str(output_path / filename)
+        
+        video_info = await self.search_and_download(
+            query=keyword,
+            output_path=file_path,
+            max_duration=duration + 1,  # +1s de marge
+            orientation="landscape"
+        )
+        
+        if video_info:
+            return {
+                **illust,
+                "local_path": file_path,
+                "pexels_id": video_info.get("id"),
+                "pexels_user": video_info.get("user"),
+                "downloaded": True
+            }
+        return {
+            **illust,
+            "downloaded": False,
+            "error": f"Aucune vidéo trouvée pour '{keyword}'"
+        }
 
 
 
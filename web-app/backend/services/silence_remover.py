@@ -7,7 +7,11 @@ import subprocess
 import os
 import shutil
 import re
+import bisect
 from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from services.ffmpeg_caps import preferred_h264_args
 
 FFMPEG = os.environ.get('FFMPEG_PATH', 'C:/Dev/Yt/ffmpeg/ffmpeg.exe')
 FFPROBE = os.environ.get('FFPROBE_PATH', 'C:/Dev/Yt/ffmpeg/ffprobe.exe')
@@ -17,41 +21,67 @@ DEFAULT_SILENCE_THRESHOLD = -40  # dB (moins sensible, ignore le bruit de fond)
 DEFAULT_SILENCE_DURATION = 2.0   # secondes (uniquement les vraies pauses)
 DEFAULT_PADDING = 0.15           # secondes
 
+# Decoupes FFmpeg simultanees (mode copie de flux, etape 2) : la moitie des coeurs par defaut,
+# sans saturer le disque ; SILENCE_CUT_WORKERS pour ajuster
+CUT_WORKERS = max(1, int(os.environ.get('SILENCE_CUT_WORKERS') or (os.cpu_count() or 2) // 2))
 
-def get_duration(file_path: str) -> float:
-    """Retourne la duree d'une video en secondes"""
+# Lignes silencedetect dans la sortie stderr de FFmpeg (compilee une seule fois,
+# sur les octets bruts : pas de decodage UTF-8 du log complet)
+_SIL = re.compile(rb'silence_(start|end): ([\d.]+)')
+# Duree du fichier d'entree, affichee par FFmpeg dans le meme log
+_DURATION = re.compile(rb'Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)')
+
+
+@lru_cache(maxsize=256)
+def _probe_duration(file_path: str, mtime_ns: int, size: int) -> float:
     result = subprocess.run([
         FFPROBE, '-v', 'error',
         '-show_entries', 'format=duration',
-        '-of', 'csv=p=0', str(file_path)
+        '-of', 'csv=p=0', file_path
     ], capture_output=True, text=True)
     return float(result.stdout.strip())
 
 
+def get_duration(file_path: str) -> float:
+    """Retourne la duree d'une video en secondes (memoisee tant que le fichier ne change pas)"""
+    stat = os.stat(file_path)
+    return _probe_duration(str(file_path), stat.st_mtime_ns, stat.st_size)
+
+
 def detect_silences(file_path: str, threshold_db: int = DEFAULT_SILENCE_THRESHOLD, 
-                    min_duration: float = DEFAULT_SILENCE_DURATION) -> list:
+                    min_duration: float = DEFAULT_SILENCE_DURATION) -> tuple:
     """
     Detecte les silences dans une video
-    Retourne une liste de {'start': float, 'end': float}
+    Retourne (silences, duree) : liste de {'start': float, 'end': float} et duree totale
+    en secondes, lue dans le meme log FFmpeg (ffprobe seulement si elle n'y figure pas)
     """
+    # Audio seul ; conversion mono 16 kHz dans la chaine de filtres, AVANT silencedetect
+    # (le mixage mono detecte sur la moyenne des canaux, et non plus canal par canal).
+    # '0:a:0?' : sans piste audio, aucun silence (la duree reste lue dans l'en-tete du log)
     result = subprocess.run([
         FFMPEG, '-i', str(file_path),
-        '-af', f'silencedetect=noise={threshold_db}dB:d={min_duration}',
+        '-map', '0:a:0?', '-vn', '-sn', '-dn',
+        '-af', f'aresample=16000,aformat=channel_layouts=mono,silencedetect=noise={threshold_db}dB:d={min_duration}',
         '-f', 'null', '-'
-    ], capture_output=True, text=True)
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     
+    # Un seul parcours du log complet (peut depasser 10k lignes sur une longue video)
     silences = []
-    for line in result.stderr.split('\n'):
-        if 'silence_start' in line:
-            match = re.search(r'silence_start: ([\d.]+)', line)
-            if match:
-                silences.append({'start': float(match.group(1)), 'end': None})
-        elif 'silence_end' in line:
-            match = re.search(r'silence_end: ([\d.]+)', line)
-            if match and silences and silences[-1]['end'] is None:
-                silences[-1]['end'] = float(match.group(1))
+    for match in _SIL.finditer(result.stderr):
+        kind, value = match.group(1), float(match.group(2))
+        if kind == b'start':
+            silences.append({'start': value, 'end': None})
+        elif silences and silences[-1]['end'] is None:
+            silences[-1]['end'] = value
+    
+    match = _DURATION.search(result.stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    else:
+        duration = get_duration(str(file_path))
     
-    return silences
+    return silences, duration
 
 
 def get_speech_segments(silences: list, total_duration: float, 
@@ -84,13 +114,147 @@ def get_speech_segments(silences: list, total_duration: float,
     return merged
 
 
+def get_keyframes(file_path: str) -> list:
+    """
+    Retourne les instants (secondes) des images cles de la video, tries
+    Lecture des paquets uniquement (drapeau K), sans decodage
+    """
+    result = subprocess.run([
+        FFPROBE, '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0', str(file_path)
+    ], capture_output=True, text=True)
+    
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' in flags and pts not in ('', 'N/A'):
+            keyframes.append(float(pts))
+    keyframes.sort()
+    return keyframes
+
+
+def snap_to_keyframes(segments: list, keyframes: list, total_duration: float) -> list:
+    """
+    Elargit chaque segment aux images cles englobantes (debut recule, fin avancee)
+    pour une decoupe sans re-encodage, puis fusionne les segments qui se chevauchent
+    """
+    if not keyframes:
+        return [seg.copy() for seg in segments]
+    
+    snapped = []
+    for seg in segments:
+        i = bisect.bisect_right(keyframes, seg['start']) - 1
+        j = bisect.bisect_left(keyframes, seg['end'])
+        start = keyframes[i] if i >= 0 else 0.0
+        end = keyframes[j] if j < len(keyframes) else total_duration
+        if snapped and start <= snapped[-1]['end']:
+            snapped[-1]['end'] = max(snapped[-1]['end'], end)
+        else:
+            snapped.append({'start': start, 'end': end})
+    
+    return snapped
+
+
+def _cut_segments_copy(input_path: Path, segments: list, temp_dir: Path) -> list:
+    """
+    Decoupe chaque segment en TS sans re-encodage (-ss avant -i : seek rapide), en parallele
+    Retourne les processus termines, dans l'ordre des segments
+    """
+    def cut_one(indexed: tuple) -> subprocess.CompletedProcess:
+        i, seg = indexed
+        seg_file = temp_dir / f'seg_{i:03d}.ts'
+        cmd = [
+            FFMPEG, '-y',
+            '-ss', f"{seg['start']:.3f}",
+            '-i', str(input_path),
+            '-t', f"{seg['end'] - seg['start']:.3f}",
+            '-c', 'copy',
+            '-f', 'mpegts',
+            str(seg_file)
+        ]
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    
+    # Chaque FFmpeg est un processus a part : des threads suffisent pour les attendre ;
+    # map conserve l'ordre des segments pour la concatenation
+    with ThreadPoolExecutor(max_workers=CUT_WORKERS) as executor:
+        return list(executor.map(cut_one, enumerate(segments)))
+
+
+def _concat_copy(seg_files: list, output_path: Path, temp_dir: Path) -> subprocess.CompletedProcess:
+    """Concatene les segments TS avec le demuxer concat, sans re-encodage"""
+    concat_list = temp_dir / 'concat.txt'
+    concat_list.write_text(
+        ''.join(f"file '{seg_file.resolve().as_posix()}'\n" for seg_file in seg_files),
+        encoding='utf-8'
+    )
+    cmd = [
+        FFMPEG, '-y',
+        '-f', 'concat', '-safe', '0',
+        '-i', str(concat_list),
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        str(output_path)
+    ]
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
+def cut_stream_copy(input_path: Path, output_path: Path, segments: list, temp_dir: Path) -> subprocess.CompletedProcess:
+    """
+    Decoupe sans re-encodage : segments (deja alignes sur les images cles, voir
+    snap_to_keyframes) coupes en TS puis concatenes en copie de flux
+    """
+    cuts = _cut_segments_copy(input_path, segments, temp_dir)
+    
+    # Un segment manquant donnerait une video tronquee sans erreur : echec de toute la decoupe
+    failed = next((cut for cut in cuts if cut.returncode != 0), None)
+    if failed:
+        print(f"[SilenceRemover] Echec decoupe de {failed.args[-1]}")
+        return failed
+    
+    return _concat_copy([Path(cut.args[-1]) for cut in cuts], output_path, temp_dir)
+
+
+def _encode_select(input_path: Path, output_path: Path, segments: list, temp_dir: Path) -> subprocess.CompletedProcess:
+    """
+    Un seul passage FFmpeg : select/aselect gardent les segments parles (decoupe a l'image
+    pres, audio et video sur la meme horloge), un seul encodage au lieu de N + concat
+    """
+    keep = '+'.join(f"between(t,{seg['start']:.3f},{seg['end']:.3f})" for seg in segments)
+    filter_graph = (
+        f"[0:v]select='{keep}',setpts=N/FRAME_RATE/TB[v];"
+        f"[0:a]aselect='{keep}',asetpts=N/SR/TB[a]"
+    )
+    # Graphe dans un fichier : avec beaucoup de segments la ligne de commande depasserait la limite Windows
+    filter_script = temp_dir / 'filter_graph.txt'
+    filter_script.write_text(filter_graph, encoding='utf-8')
+    
+    print(f"[SilenceRemover] Encodage en cours...")
+    cmd = [
+        FFMPEG, '-y',
+        '-i', str(input_path),
+        '-filter_complex_script', str(filter_script),
+        '-map', '[v]', '-map', '[a]',
+        *preferred_h264_args(FFMPEG),
+        '-c:a', 'aac', '-b:a', '192k',
+        '-movflags', '+faststart',
+        str(output_path)
+    ]
+    return subprocess.run(cmd, capture_output=True, text=True)
+
+
 def remove_silences(input_path: str, output_path: str,
                     threshold_db: int = DEFAULT_SILENCE_THRESHOLD,
                     min_silence: float = DEFAULT_SILENCE_DURATION,
-                    padding: float = DEFAULT_PADDING) -> dict:
+                    padding: float = DEFAULT_PADDING,
+                    stream_copy: bool = False) -> dict:
     """
     Supprime les silences d'une video
-    Decoupe en segments puis concatene avec stream copy pour sync parfaite
+    Garde les segments parles via un graphe select/aselect (un seul encodage)
+    
+    stream_copy=True : aucun encodage, segments elargis aux images cles puis
+    concatenes en copie de flux (beaucoup plus rapide, coupes moins precises)
     """
     input_path = Path(input_path)
     output_path = Path(output_path)
@@ -98,11 +262,8 @@ def remove_silences(input_path: str, output_path: str,
     
     result = {'success': False, 'error': None}
     
-    # Obtenir duree
-    duration = get_duration(str(input_path))
-    
-    # Detecter silences
-    silences = detect_silences(str(input_path), threshold_db, min_silence)
+    # Detecter silences (et duree, dans le meme passage FFmpeg)
+    silences, duration = detect_silences(str(input_path), threshold_db, min_silence)
     print(f"[SilenceRemover] {len(silences)} silences detectes")
     
     # Obtenir segments parles
@@ -110,45 +271,23 @@ def remove_silences(input_path: str, output_path: str,
     total_speech = sum(s['end'] - s['start'] for s in segments)
     print(f"[SilenceRemover] {len(segments)} segments, duree: {total_speech:.1f}s")
     
+    if not segments:
+        result['error'] = 'Aucun segment parle detecte'
+        return result
+    
     # Nettoyer
     if output_path.exists():
         output_path.unlink()
     shutil.rmtree(temp_dir, ignore_errors=True)
     temp_dir.mkdir(exist_ok=True)
     
-    # Decouper segments avec re-encodage pour precision
-    print(f"[SilenceRemover] Decoupe en cours...")
-    concat_list = []
-    for i, seg in enumerate(segments):
-        start = seg['start']
-        dur = seg['end'] - seg['start']
-        seg_file = temp_dir / f'seg_{i:03d}.ts'  # TS pour concat sans perte
-        
-        # -ss apres -i pour precision, output en TS
-        cmd = [
-            FFMPEG, '-y',
-            '-i', str(input_path),
-            '-ss', str(start),
-            '-t', str(dur),
-            '-c:v', 'libx264', '-preset', 'fast', '-crf', '18',
-            '-c:a', 'aac', '-b:a', '192k',
-            '-f', 'mpegts',
-            str(seg_file)
-        ]
-        subprocess.run(cmd, capture_output=True)
-        concat_list.append(str(seg_file))
-    
-    # Concatener avec concat protocol (pas demux)
-    concat_input = 'concat:' + '|'.join(concat_list)
-    
-    cmd = [
-        FFMPEG, '-y',
-        '-i', concat_input,
-        '-c:v', 'libx264', '-preset', 'fast', '-crf', '18',
-        '-c:a', 'aac', '-b:a', '192k',
-        str(output_path)
-    ]
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if stream_copy:
+        keyframes = get_keyframes(str(input_path))
+        segments = snap_to_keyframes(segments, keyframes, duration)
+        print(f"[SilenceRemover] Copie de flux: {len(segments)} segments alignes sur {len(keyframes)} images cles")
+        proc = cut_stream_copy(input_path, output_path, segments, temp_dir)
+    else:
+        proc = _encode_select(input_path, output_path, segments, temp_dir)
     
     # Nettoyer
     shutil.rmtree(temp_dir, ignore_errors=True)
@@ -3,7 +3,7 @@ Step 10: Programmation YouTube automatique
 Programme les uploads avec des dates optimales
 """
 import os
-import json
+import orjson
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
@@ -14,6 +14,9 @@ OPTIMAL_HOURS = ['18:00', '19:00', '20:00', '17:00', '12:00', '13:00']
 # Meilleurs jours (0 = Lundi, 6 = Dimanche)
 BEST_DAYS = [1, 2, 3, 5, 0, 4, 6]  # Mar, Mer, Jeu, Sam, Lun, Ven, Dim
 
+# Jours à ajouter pour tomber sur l'un des 4 meilleurs jours, indexé par weekday()
+_DAYS_TO_NEXT_GOOD = [min((good - day) % 7 for good in BEST_DAYS[:4]) for day in range(7)]
+
 
 def get_next_optimal_date(start_from: datetime = None, offset_days: int = 0) -> tuple:
     """Trouver la prochaine date optimale pour publier"""
@@ -23,11 +26,8 @@ def get_next_optimal_date(start_from: datetime = None, offset_days: int = 0) ->
     # Commencer à partir de demain + offset
     target = start_from + timedelta(days=1 + offset_days)
     
-    # Trouver le prochain meilleur jour
-    for _ in range(14):  # Chercher dans les 2 prochaines semaines
-        if target.weekday() in BEST_DAYS[:4]:  # Top 4 meilleurs jours
-            break
-        target += timedelta(days=1)
+    # Avancer jusqu'au prochain des 4 meilleurs jours (table précalculée)
+    target += timedelta(days=_DAYS_TO_NEXT_GOOD[target.weekday()])
     
     # Heure optimale
     hour = OPTIMAL_HOURS[offset_days % len(OPTIMAL_HOURS)]
@@ -59,8 +59,7 @@ def prepare_schedule(video_folder: str) -> Dict:
     # Charger le SEO
     seo_data = None
     if seo_path.exists():
-        with open(seo_path, 'r', encoding='utf-8') as f:
-            seo_data = json.load(f)
+        seo_data = orjson.loads(seo_path.read_bytes())
     
     schedule = {
         "created_at": datetime.now().isoformat(),
@@ -149,8 +148,9 @@ def prepare_schedule(video_folder: str) -> Dict:
     
     # Sauvegarder la programmation
     schedule_path = video_folder / "schedule.json"
-    with open(schedule_path, 'w', encoding='utf-8') as f:
-        json.dump(schedule, f, ensure_ascii=False, indent=2)
+    schedule_path.write_bytes(
+        orjson.dumps(schedule, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    )
     
     print(f"[Step 10] Programmation sauvegardée: {len(schedule['uploads'])} uploads")
     print(f"[Step 10] Fichier: {schedule_path}")
@@ -11,6 +11,7 @@ import shutil
 import re
 import json
 from pathlib import Path
+from services.silence_remover import get_keyframes, snap_to_keyframes, cut_stream_copy
 
 FFMPEG = os.environ.get('FFMPEG_PATH', 'C:/Dev/Yt/ffmpeg/ffmpeg.exe')
 FFPROBE = os.environ.get('FFPROBE_PATH', 'C:/Dev/Yt/ffmpeg/ffprobe.exe')
@@ -20,6 +21,10 @@ DEFAULT_SILENCE_THRESHOLD = -30  # dB
 DEFAULT_SILENCE_DURATION = 1.0   # secondes (silences > 1s seront supprimes)
 DEFAULT_PADDING = 0.1            # secondes de padding pour transitions douces
 
+# SILENCE_STREAM_COPY=1 : decoupe en copie de flux aux images cles (sans re-encodage,
+# beaucoup plus rapide ; coupes elargies jusqu'a l'image cle la plus proche)
+STREAM_COPY = os.environ.get('SILENCE_STREAM_COPY', '').strip().lower() in ('1', 'true', 'on', 'yes')
+
 
 def get_duration(file_path: str) -> float:
     """Retourne la duree d'une video en secondes"""
@@ -83,7 +88,8 @@ def get_speech_segments(silences: list, total_duration: float, padding: float) -
 def remove_silences(video_folder: str,
                     threshold_db: int = DEFAULT_SILENCE_THRESHOLD,
                     min_silence: float = DEFAULT_SILENCE_DURATION,
-                    padding: float = DEFAULT_PADDING) -> dict:
+                    padding: float = DEFAULT_PADDING,
+                    stream_copy: bool = STREAM_COPY) -> dict:
     """
     Supprime les silences de original.mp4 -> nosilence.mp4
     
@@ -92,6 +98,7 @@ def remove_silences(video_folder: str,
         threshold_db: Seuil de detection en dB (default -30)
         min_silence: Duree minimum d'un silence en secondes (default 1.0)
         padding: Padding avant/apres chaque segment (default 0.1)
+        stream_copy: Copie de flux aux images cles au lieu d'un re-encodage (default SILENCE_STREAM_COPY)
     
     Returns:
         dict avec success, original_duration, final_duration, segments, reduction, error
@@ -129,6 +136,13 @@ def remove_silences(video_folder: str,
     total_speech = sum(s['end'] - s['start'] for s in segments)
     print(f"[Step2] {len(segments)} segment(s), duree: {total_speech:.1f}s")
     
+    # Copie de flux : segments alignes sur les images cles AVANT sauvegarde, pour que
+    # Step 3 coupe les sources (et la transcription) sur les memes instants
+    if stream_copy and segments:
+        keyframes = get_keyframes(str(input_path))
+        segments = snap_to_keyframes(segments, keyframes, duration)
+        print(f"[Step2] Copie de flux: {len(segments)} segment(s) alignes sur {len(keyframes)} images cles")
+    
     # Sauvegarder les segments pour Step 3
     segments_file = video_folder / 'segments.json'
     with open(segments_file, 'w', encoding='utf-8') as f:
@@ -138,7 +152,8 @@ def remove_silences(video_folder: str,
             'original_duration': duration,
             'threshold_db': threshold_db,
             'min_silence': min_silence,
-            'padding': padding
+            'padding': padding,
+            'stream_copy': stream_copy
         }, f, indent=2)
     print(f"[Step2] Segments sauvegardes dans segments.json")
     
@@ -148,36 +163,41 @@ def remove_silences(video_folder: str,
     shutil.rmtree(temp_dir, ignore_errors=True)
     temp_dir.mkdir(exist_ok=True)
     
-    # Méthode 1: Utiliser le filtre select + concat pour éviter les ré-encodages multiples
-    # Construire le filtre pour sélectionner les segments à garder
-    print(f"[Step2] Construction du filtre de sélection...")
-    
-    # Construire l'expression select pour la vidéo et l'audio
-    select_parts = []
-    for seg in segments:
-        select_parts.append(f"between(t,{seg['start']},{seg['end']})")
-    
-    select_expr = '+'.join(select_parts)
-    
-    # Utiliser le filtre select + aselect pour couper précisément
-    filter_complex = (
-        f"[0:v]select='{select_expr}',setpts=N/FRAME_RATE/TB[outv];"
-        f"[0:a]aselect='{select_expr}',asetpts=N/SR/TB[outa]"
-    )
-    
-    cmd = [
-        FFMPEG, '-y',
-        '-i', str(input_path),
-        '-filter_complex', filter_complex,
-        '-map', '[outv]', '-map', '[outa]',
-        '-c:v', 'libx264', '-preset', 'fast', '-crf', '18',
-        '-c:a', 'aac', '-b:a', '192k',  # Un seul encodage audio
-        '-movflags', '+faststart',
-        str(output_path)
-    ]
-    
-    print(f"[Step2] Encodage en cours...")
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if stream_copy and segments:
+        # Méthode 2: segments coupés en TS puis concaténés, sans aucun encodage
+        print(f"[Step2] Decoupe en copie de flux...")
+        proc = cut_stream_copy(input_path, output_path, segments, temp_dir)
+    else:
+        # Méthode 1: Utiliser le filtre select + concat pour éviter les ré-encodages multiples
+        # Construire le filtre pour sélectionner les segments à garder
+        print(f"[Step2] Construction du filtre de sélection...")
+        
+        # Construire l'expression select pour la vidéo et l'audio
+        select_parts = []
+        for seg in segments:
+            select_parts.append(f"between(t,{seg['start']},{seg['end']})")
+        
+        select_expr = '+'.join(select_parts)
+        
+        # Utiliser le filtre select + aselect pour couper précisément
+        filter_complex = (
+            f"[0:v]select='{select_expr}',setpts=N/FRAME_RATE/TB[outv];"
+            f"[0:a]aselect='{select_expr}',asetpts=N/SR/TB[outa]"
+        )
+        
+        cmd = [
+            FFMPEG, '-y',
+            '-i', str(input_path),
+            '-filter_complex', filter_complex,
+            '-map', '[outv]', '-map', '[outa]',
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '18',
+            '-c:a', 'aac', '-b:a', '192k',  # Un seul encodage audio
+            '-movflags', '+faststart',
+            str(output_path)
+        ]
+        
+        print(f"[Step2] Encodage en cours...")
+        proc = subprocess.run(cmd, capture_output=True, text=True)
     
     # Nettoyer
     shutil.rmtree(temp_dir, ignore_errors=True)
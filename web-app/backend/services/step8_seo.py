@@ -9,6 +9,7 @@ import os
 import json
 import httpx
 from pathlib import Path
+from typing import List
 from dotenv import load_dotenv
 
 # Charger le .env
@@ -190,6 +191,38 @@ Reponds UNIQUEMENT avec le JSON, rien d'autre."""
         }
 
 
+# Caracteres retires des tags TikTok (espaces, tirets)
+_TAG_TRANSLATE = str.maketrans({" ": None, "-": None})
+
+
+def optimize_tags_for_tiktok(tags: List[str]) -> List[str]:
+    """
+    Optimise les tags pour TikTok :
+    - Supprime les espaces dans les hashtags
+    - Ajoute des hashtags populaires pertinents
+    - Limite à 5-8 hashtags (TikTok recommande moins que YouTube)
+    """
+    # Tags populaires TikTok à ajouter si pertinents
+    popular_tiktok_tags = ["fyp", "foryou", "viral", "pourtoi"]
+    
+    # Nettoyer les tags existants (une passe translate + casefold, dédoublonnage par set)
+    cleaned_tags = []
+    seen = set()
+    for tag in tags[:5]:  # Limiter à 5 tags du contenu
+        cleaned = tag.translate(_TAG_TRANSLATE).casefold()
+        if cleaned and cleaned not in seen:
+            seen.add(cleaned)
+            cleaned_tags.append(cleaned)
+    
+    # Ajouter quelques tags populaires TikTok
+    for pop_tag in popular_tiktok_tags[:2]:  # Ajouter 2 tags populaires
+        if pop_tag not in seen:
+            seen.add(pop_tag)
+            cleaned_tags.append(pop_tag)
+    
+    return cleaned_tags[:8]  # Max 8 hashtags
+
+
 def generate_seo(video_folder: str) -> dict:
     """
     Genere le SEO complet pour la video et les shorts
@@ -279,6 +312,8 @@ def generate_seo(video_folder: str) -> dict:
                     short_transcript = transcription[:500]
                 
                 short_seo = generate_short_seo(short_transcript.strip(), i, start, end)
+                # Tags TikTok calcules une fois ici plutot qu'a chaque lecture
+                short_seo['tiktok_tags'] = optimize_tags_for_tiktok(short_seo.get('tags', []))
                 short_seo['file'] = short_file.name
                 short_seo['start'] = start
                 short_seo['end'] = end
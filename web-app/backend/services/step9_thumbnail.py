@@ -31,6 +31,9 @@ FFMPEG = os.environ.get('FFMPEG_PATH', 'C:/Dev/Yt/ffmpeg/ffmpeg.exe')
 FFPROBE = os.environ.get('FFPROBE_PATH', 'C:/Dev/Yt/ffmpeg/ffprobe.exe')
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 
+# Caractères retirés du titre pour le fallback sans IA
+_TITLE_STRIP = str.maketrans("", "", "🚀!")
+
 # Chemin du logo
 LOGO_PATH = Path(__file__).parent.parent / "assets" / "vibeacademy_logo.png"
 
@@ -266,7 +269,7 @@ def generate_catchy_title(original_title: str) -> str:
     """
     if not OPENAI_AVAILABLE or not OPENROUTER_API_KEY:
         # Fallback: prendre les 3-4 premiers mots importants
-        words = original_title.replace('🚀', '').replace('!', '').strip().split()
+        words = original_title.translate(_TITLE_STRIP).strip().split()
         return ' '.join(words[:4]).upper()
     
     try:
@@ -316,7 +319,7 @@ Réponds UNIQUEMENT avec le nouveau titre (sans guillemets)."""
     except Exception as e:
         print(f"[Step9] Erreur génération titre: {e}")
         # Fallback
-        words = original_title.replace('🚀', '').replace('!', '').strip().split()
+        words = original_title.translate(_TITLE_STRIP).strip().split()
         return ' '.join(words[:4]).upper()
 
 
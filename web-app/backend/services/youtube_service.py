@@ -3,9 +3,10 @@ Service YouTube - Gestion de l'authentification OAuth2 et API YouTube
 """
 import os
 import json
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Literal
 
 try:
     from google.oauth2.credentials import Credentials
@@ -17,6 +18,7 @@ except ImportError:
     GOOGLE_API_AVAILABLE = False
     print("[YouTube] google-api-python-client non disponible. Installez: pip install google-api-python-client google-auth-oauthlib")
 
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,6 +34,12 @@ YOUTUBE_SCOPES = [
     'https://www.googleapis.com/auth/yt-analytics.readonly'
 ]
 
+# Taille des morceaux d'upload résumable (multiple de 256 Kio exigé par l'API)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Pages de 50 vidéos parcourues au plus pour trouver des vidéos d'un type donné
+RECENT_VIDEOS_MAX_PAGES = 4
+
 # Chemin pour stocker les credentials
 CREDENTIALS_PATH = Path(__file__).parent.parent / "data" / "youtube_credentials.json"
 
@@ -39,12 +47,20 @@ CREDENTIALS_PATH = Path(__file__).parent.parent / "data" / "youtube_credentials.
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', '')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET', '')
 
+# Clients API par thread : le transport httplib2 de googleapiclient n'est pas
+# thread-safe (worker d'uploads en pool de threads, appels via asyncio.to_thread)
+_thread_local = threading.local()
+
+# Cache des lectures API (dashboard) : quota et latence par appel
+# Clé = identité des credentials (change à chaque connexion) + paramètres
+_read_cache = TTLCache(maxsize=64, ttl=60)
+_analytics_cache = TTLCache(maxsize=64, ttl=300)  # Les analytics évoluent lentement
+_cache_lock = threading.Lock()
+
 
 class YouTubeService:
     _instance = None
     _credentials = None
-    _youtube = None
-    _analytics = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -104,14 +120,49 @@ class YouTubeService:
                 json.dump(creds_data, f)
 
     def _init_services(self):
-        """Initialiser les services YouTube"""
+        """Initialiser les services YouTube (pour le thread courant)"""
         if self._credentials:
             try:
-                self._youtube = build('youtube', 'v3', credentials=self._credentials)
-                self._analytics = build('youtubeAnalytics', 'v2', credentials=self._credentials)
+                _thread_local.youtube = build('youtube', 'v3', credentials=self._credentials)
+                _thread_local.analytics = build('youtubeAnalytics', 'v2', credentials=self._credentials)
+                _thread_local.credentials = self._credentials
             except Exception as e:
                 print(f"[YouTube] Erreur init services: {e}")
 
+    def _thread_service(self, name: str):
+        """Service API du thread courant, (re)construit si les credentials ont changé"""
+        if self._credentials is None:
+            return None
+        if getattr(_thread_local, 'credentials', None) is not self._credentials:
+            self._init_services()
+        return getattr(_thread_local, name, None)
+
+    @property
+    def _youtube(self):
+        return self._thread_service('youtube')
+
+    @property
+    def _analytics(self):
+        return self._thread_service('analytics')
+
+    def _cached(self, cache: TTLCache, key: tuple, fetch):
+        """Lire depuis le cache TTL, sinon appeler fetch() (les échecs ne sont pas mis en cache)"""
+        key = (id(self._credentials),) + key
+        with _cache_lock:
+            if key in cache:
+                return cache[key]
+        value = fetch()
+        if value:
+            with _cache_lock:
+                cache[key] = value
+        return value
+
+    def clear_cache(self):
+        """Vider le cache des lectures API (connexion / déconnexion)"""
+        with _cache_lock:
+            _read_cache.clear()
+            _analytics_cache.clear()
+
     def is_authenticated(self) -> bool:
         """Vérifier si l'utilisateur est authentifié"""
         # Recharger les credentials si pas chargées
@@ -194,6 +245,7 @@ class YouTubeService:
             self._credentials = flow.credentials
             self._save_credentials()
             self._init_services()
+            self.clear_cache()
             print("[YouTube] Authentification réussie")
             return True
         except Exception as e:
@@ -214,6 +266,7 @@ class YouTubeService:
                     self._credentials = flow.credentials
                     self._save_credentials()
                     self._init_services()
+                    self.clear_cache()
                     print("[YouTube] Authentification réussie (scopes étendus)")
                     return True
                 except Exception as e2:
@@ -224,17 +277,18 @@ class YouTubeService:
     def disconnect(self):
         """Déconnecter le compte YouTube"""
         self._credentials = None
-        self._youtube = None
-        self._analytics = None
+        self.clear_cache()
         if CREDENTIALS_PATH.exists():
             CREDENTIALS_PATH.unlink()
         print("[YouTube] Déconnecté")
 
     def get_channel_info(self) -> Optional[Dict[str, Any]]:
-        """Récupérer les informations de la chaîne"""
+        """Récupérer les informations de la chaîne (cache 60s)"""
         if not self.is_authenticated():
             return None
-        
+        return self._cached(_read_cache, ('channel',), self._fetch_channel_info)
+
+    def _fetch_channel_info(self) -> Optional[Dict[str, Any]]:
         try:
             response = self._youtube.channels().list(
                 part='snippet,statistics,contentDetails,brandingSettings',
@@ -263,11 +317,23 @@ class YouTubeService:
             print(f"[YouTube] Erreur get_channel_info: {e}")
             return None
 
-    def get_recent_videos(self, max_results: int = 10) -> List[Dict[str, Any]]:
-        """Récupérer les vidéos récentes"""
+    def get_recent_videos(
+        self,
+        max_results: int = 10,
+        video_type: Literal['any', 'short', 'regular'] = 'any'
+    ) -> List[Dict[str, Any]]:
+        """
+        Récupérer les vidéos récentes (cache 60s)
+        video_type: 'short' ou 'regular' pour ne garder qu'un type de vidéo
+        """
         if not self.is_authenticated():
             return []
-        
+        return self._cached(
+            _read_cache, ('videos', max_results, video_type),
+            lambda: self._fetch_recent_videos(max_results, video_type)
+        )
+
+    def _fetch_recent_videos(self, max_results: int, video_type: str = 'any') -> List[Dict[str, Any]]:
         try:
             # D'abord récupérer la playlist des uploads
             channel = self.get_channel_info()
@@ -278,52 +344,74 @@ class YouTubeService:
             if not uploads_playlist:
                 return []
             
-            # Récupérer les vidéos de la playlist
-            response = self._youtube.playlistItems().list(
-                part='snippet,contentDetails',
-                playlistId=uploads_playlist,
-                maxResults=max_results
-            ).execute()
-            
-            video_ids = [item['contentDetails']['videoId'] for item in response.get('items', [])]
-            
-            if not video_ids:
-                return []
-            
-            # Récupérer les statistiques des vidéos
-            videos_response = self._youtube.videos().list(
-                part='snippet,statistics,contentDetails',
-                id=','.join(video_ids)
-            ).execute()
-            
+            # L'API n'a pas de filtre "short" sur la playlist des uploads : pour un type
+            # donné, on parcourt la playlist par pages de 50 jusqu'à avoir max_results vidéos
+            page_size = max_results if video_type == 'any' else 50
             videos = []
-            for video in videos_response.get('items', []):
-                # Déterminer si c'est un short (durée < 60s et ratio vertical)
-                duration = video['contentDetails'].get('duration', 'PT0S')
-                is_short = self._is_short(duration)
+            page_token = None
+            
+            for _ in range(RECENT_VIDEOS_MAX_PAGES):
+                # Récupérer les vidéos de la playlist
+                response = self._youtube.playlistItems().list(
+                    part='snippet,contentDetails',
+                    playlistId=uploads_playlist,
+                    maxResults=min(page_size, 50),
+                    pageToken=page_token
+                ).execute()
                 
-                videos.append({
-                    'id': video['id'],
-                    'title': video['snippet']['title'],
-                    'description': video['snippet'].get('description', '')[:200],
-                    'thumbnail': video['snippet']['thumbnails'].get('high', {}).get('url') or 
-                                video['snippet']['thumbnails'].get('medium', {}).get('url'),
-                    'published_at': video['snippet']['publishedAt'],
-                    'duration': duration,
-                    'is_short': is_short,
-                    'statistics': {
-                        'views': int(video['statistics'].get('viewCount', 0)),
-                        'likes': int(video['statistics'].get('likeCount', 0)),
-                        'comments': int(video['statistics'].get('commentCount', 0))
-                    },
-                    'url': f"https://www.youtube.com/watch?v={video['id']}"
-                })
+                video_ids = [item['contentDetails']['videoId'] for item in response.get('items', [])]
+                
+                if not video_ids:
+                    break
+                
+                # Récupérer les statistiques des vidéos
+                videos_response = self._youtube.videos().list(
+                    part='snippet,statistics,contentDetails',
+                    id=','.join(video_ids)
+                ).execute()
+                
+                for video in videos_response.get('items', []):
+                    entry = self._video_entry(video)
+                    if video_type == 'short' and not entry['is_short']:
+                        continue
+                    if video_type == 'regular' and entry['is_short']:
+                        continue
+                    videos.append(entry)
+                    if len(videos) >= max_results:
+                        return videos
+                
+                page_token = response.get('nextPageToken')
+                if video_type == 'any' or not page_token:
+                    break
             
             return videos
         except Exception as e:
             print(f"[YouTube] Erreur get_recent_videos: {e}")
             return []
 
+    def _video_entry(self, video: Dict[str, Any]) -> Dict[str, Any]:
+        """Formater une vidéo de l'API pour le frontend"""
+        # Déterminer si c'est un short (durée < 60s et ratio vertical)
+        duration = video['contentDetails'].get('duration', 'PT0S')
+        is_short = self._is_short(duration)
+        
+        return {
+            'id': video['id'],
+            'title': video['snippet']['title'],
+            'description': video['snippet'].get('description', '')[:200],
+            'thumbnail': video['snippet']['thumbnails'].get('high', {}).get('url') or 
+                        video['snippet']['thumbnails'].get('medium', {}).get('url'),
+            'published_at': video['snippet']['publishedAt'],
+            'duration': duration,
+            'is_short': is_short,
+            'statistics': {
+                'views': int(video['statistics'].get('viewCount', 0)),
+                'likes': int(video['statistics'].get('likeCount', 0)),
+                'comments': int(video['statistics'].get('commentCount', 0))
+            },
+            'url': f"https://www.youtube.com/watch?v={video['id']}"
+        }
+
     def _is_short(self, duration: str) -> bool:
         """Vérifier si une vidéo est un Short basé sur la durée"""
         import re
@@ -337,10 +425,15 @@ class YouTubeService:
         return False
 
     def get_analytics(self, days: int = 28) -> Optional[Dict[str, Any]]:
-        """Récupérer les analytics de la chaîne"""
+        """Récupérer les analytics de la chaîne (cache 5 min)"""
         if not self.is_authenticated() or not self._analytics:
             return None
-        
+        return self._cached(
+            _analytics_cache, ('analytics', days),
+            lambda: self._fetch_analytics(days)
+        )
+
+    def _fetch_analytics(self, days: int) -> Optional[Dict[str, Any]]:
         try:
             channel = self.get_channel_info()
             if not channel:
@@ -413,9 +506,13 @@ class YouTubeService:
         category_id: str = "22",  # People & Blogs
         privacy: str = "private",
         is_short: bool = False,
-        publish_at: str = None  # Format: "2025-12-01T18:00:00"
+        publish_at: str = None,  # Format: "2025-12-01T18:00:00"
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> Optional[Dict[str, Any]]:
-        """Uploader une vidéo sur YouTube avec programmation optionnelle"""
+        """
+        Uploader une vidéo sur YouTube avec programmation optionnelle
+        progress_callback(octets_envoyés, octets_total) est appelé après chaque morceau
+        """
         if not self.is_authenticated():
             return None
         
@@ -454,9 +551,13 @@ class YouTubeService:
                 except Exception as e:
                     print(f"[YouTube] Erreur date programmation: {e}")
             
+            # Upload résumable par morceaux de 8 Mio : le protocole YouTube impose des
+            # morceaux séquentiels (offset suivant connu après la réponse du précédent),
+            # un morceau en échec est renvoyé seul (num_retries) au lieu de tout le fichier
             media = MediaFileUpload(
                 file_path,
                 mimetype='video/mp4',
+                chunksize=UPLOAD_CHUNK_SIZE,
                 resumable=True
             )
             
@@ -468,9 +569,15 @@ class YouTubeService:
             
             response = None
             while response is None:
-                status, response = request.next_chunk()
+                status, response = request.next_chunk(num_retries=3)
                 if status:
                     print(f"[YouTube] Upload: {int(status.progress() * 100)}%")
+                    if progress_callback:
+                        progress_callback(status.resumable_progress, status.total_size)
+            
+            if progress_callback:
+                total_size = media.size()
+                progress_callback(total_size, total_size)
             
             video_id = response['id']
             scheduled_info = ""
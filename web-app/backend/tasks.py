@@ -3,6 +3,7 @@ Tâches Celery pour le pipeline vidéo YouTube
 Chaque étape du pipeline est une tâche asynchrone
 """
 import os
+import sys
 import json
 import asyncio
 import subprocess
@@ -47,6 +48,20 @@ STEP_NAMES = {
     11: "Upload YouTube"
 }
 
+# Clé de l'étape dans project.steps (les étapes 10-11 n'y sont pas suivies)
+STEP_KEYS = {
+    0: "convert",
+    1: "merge",
+    2: "silence",
+    3: "cut_sources",
+    4: "transcribe",
+    5: "shorts",
+    6: "broll",
+    7: "integrate_broll",
+    8: "seo",
+    9: "thumbnail"
+}
+
 
 def update_project_status(video_folder: str, step: int, status: str, error: str = None):
     """Met à jour le statut du projet dans MongoDB"""
@@ -58,23 +73,46 @@ def update_project_status(video_folder: str, step: int, status: str, error: str
         project = db.get_project_by_folder(folder_name)
         
         if project:
-            update_data = {
-                "status": status,
-                "current_step": step,
-                "step_name": STEP_NAMES.get(step, f"Étape {step}"),
-                "progress": int((step / TOTAL_STEPS) * 100)
-            }
-            if error:
-                update_data["error"] = error
-            if status == "completed":
-                update_data["progress"] = 100
-            
-            db.update_project(project['_id'], update_data)
+            # Projet + project.steps en une seule écriture
+            step_status = "failed" if status in ("error", "failed") else status
+            db.update_step_and_project(
+                project['_id'],
+                STEP_KEYS.get(step),
+                step_status,
+                status,
+                progress=100 if status == "completed" else int((step / TOTAL_STEPS) * 100),
+                current_step=step,
+                step_name=STEP_NAMES.get(step, f"Étape {step}"),
+                error=error
+            )
             logger.info(f"[DB] Projet {folder_name} mis à jour: step={step}, status={status}")
     except Exception as e:
         logger.warning(f"[DB] Erreur mise à jour projet: {e}")
 
 
+def complete_step(video_folder: str, step: int):
+    """Marque l'étape terminée dans project.steps (le statut du projet reste inchangé)"""
+    step_key = STEP_KEYS.get(step)
+    if not step_key:
+        return
+    try:
+        project = db.get_project_by_folder(Path(video_folder).name)
+        if project:
+            db.update_step_status(project['_id'], step_key, "completed")
+    except Exception as e:
+        logger.warning(f"[DB] Erreur fin d'étape {step}: {e}")
+
+
+async def _close_loop_clients():
+    """Fermer les clients HTTP partagés liés à la boucle courante (services déjà chargés seulement)"""
+    openrouter = sys.modules.get("services.openrouter")
+    if openrouter is not None:
+        await openrouter.close_shared_clients()
+    pexels = sys.modules.get("services.pexels")
+    if pexels is not None:
+        await pexels.close_shared_session()
+
+
 def run_async(coro):
     """Helper pour exécuter des coroutines async dans Celery"""
     loop = asyncio.new_event_loop()
@@ -82,6 +120,11 @@ def run_async(coro):
     try:
         return loop.run_until_complete(coro)
     finally:
+        # Une boucle par tâche : ses clients (pool de connexions) ne lui survivent pas
+        try:
+            loop.run_until_complete(_close_loop_clients())
+        except Exception as e:
+            logger.warning(f"Fermeture des clients HTTP: {e}")
         loop.close()
 
 
@@ -163,6 +206,7 @@ def task_step0_convert(self, video_folder: str):
         logger.info(f"[Step0] Fichiers bruts supprimés")
         
         logger.info(f"[Step0] Conversion terminée avec succès")
+        complete_step(video_folder, 0)
         return {'success': True, 'step': 0, 'video_folder': video_folder}
         
     except Exception as e:
@@ -191,6 +235,7 @@ def task_step1_merge(self, result_or_folder):
         result = merge_videos(video_folder)
         if result.get('success'):
             logger.info(f"[Step1] OK: {result.get('output_path')}")
+            complete_step(video_folder, 1)
             return {'success': True, 'step': 1, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -215,6 +260,7 @@ def task_step2_silence(self, previous_result: dict):
         result = remove_silences(video_folder)
         if result.get('success'):
             logger.info(f"[Step2] OK: {result.get('output_path')}")
+            complete_step(video_folder, 2)
             return {'success': True, 'step': 2, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -239,6 +285,7 @@ def task_step3_cut_sources(self, previous_result: dict):
         result = cut_sources(video_folder)
         if result.get('success'):
             logger.info(f"[Step3] OK")
+            complete_step(video_folder, 3)
             return {'success': True, 'step': 3, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -263,6 +310,7 @@ def task_step4_transcribe(self, previous_result: dict):
         result = transcribe_video(video_folder)
         if result.get('success'):
             logger.info(f"[Step4] OK")
+            complete_step(video_folder, 4)
             return {'success': True, 'step': 4, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -286,7 +334,27 @@ def task_step5_shorts(self, previous_result: dict):
     try:
         result = generate_shorts(video_folder)
         if result.get('success'):
+            # Enregistrer les shorts en base (listes TikTok/Instagram sans parcours disque)
+            # Index = ordre des noms de fichiers, comme seo.json et le statut TikTok
+            project = db.get_project_by_folder(Path(video_folder).name)
+            if project:
+                created = sorted(result.get('shorts', []), key=lambda s: Path(s['path']).name)
+                shorts = [
+                    {
+                        'path': f"shorts/{Path(short['path']).name}",
+                        'index': idx,
+                        'title': short.get('title', f"Short {idx + 1}"),
+                        # description / tags / tiktok_tags : reportés par l'étape 8
+                    }
+                    for idx, short in enumerate(created)
+                ]
+                db.update_project(project['_id'], {
+                    'outputs.shorts': shorts,
+                    'has_shorts': bool(shorts)
+                })
+            
             logger.info(f"[Step5] OK: {len(result.get('shorts', []))} shorts générés")
+            complete_step(video_folder, 5)
             return {'success': True, 'step': 5, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -311,6 +379,7 @@ def task_step6_broll(self, previous_result: dict):
         result = add_broll(video_folder)
         if result.get('success'):
             logger.info(f"[Step6] OK: {len(result.get('clips', []))} clips téléchargés")
+            complete_step(video_folder, 6)
             return {'success': True, 'step': 6, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -335,6 +404,7 @@ def task_step7_integrate_broll(self, previous_result: dict):
         result = integrate_broll(video_folder)
         if result.get('success'):
             logger.info(f"[Step7] OK: {result.get('output_path')}")
+            complete_step(video_folder, 7)
             return {'success': True, 'step': 7, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -358,7 +428,22 @@ def task_step8_seo(self, previous_result: dict):
     try:
         result = generate_seo(video_folder)
         if result.get('success'):
+            # Reporter le SEO des shorts dans outputs.shorts (lu par les routes TikTok/Instagram)
+            project = db.get_project_by_folder(Path(video_folder).name)
+            stored_shorts = (project.get('outputs') or {}).get('shorts') if project else None
+            if stored_shorts:
+                seo_by_file = {short['file']: short for short in result.get('shorts', [])}
+                for entry in stored_shorts:
+                    short_seo = seo_by_file.get(Path(entry.get('path', '')).name)
+                    if short_seo:
+                        entry['title'] = short_seo.get('title', entry.get('title'))
+                        entry['description'] = short_seo.get('description', '')
+                        entry['tags'] = short_seo.get('tags', [])
+                        entry['tiktok_tags'] = short_seo.get('tiktok_tags', [])
+                db.update_project(project['_id'], {'outputs.shorts': stored_shorts})
+            
             logger.info(f"[Step8] OK")
+            complete_step(video_folder, 8)
             return {'success': True, 'step': 8, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -383,6 +468,7 @@ def task_step9_thumbnail(self, previous_result: dict):
         result = generate_thumbnail(video_folder)
         if result.get('success'):
             logger.info(f"[Step9] OK: {result.get('output_path')}")
+            complete_step(video_folder, 9)
             return {'success': True, 'step': 9, 'video_folder': video_folder}
         else:
             raise Exception(result.get('error', 'Erreur inconnue'))
@@ -496,6 +582,159 @@ def task_step11_upload(self, previous_result: dict):
         raise
 
 
+@celery_app.task(bind=True, name='tasks.youtube_upload')
+def task_youtube_upload(self, upload: dict, folder_name: str):
+    """
+    Upload programmé d'une vidéo (ou d'un short) vers YouTube
+    Exécuté sur la queue 'youtube_uploads' (I/O réseau, pool de threads)
+    """
+    from services.youtube_service import youtube_service
+    
+    upload_type = upload.get('type')
+    output_dir = Path("/app/output") / folder_name
+    file_path = output_dir / upload.get('file', '')
+    
+    if not file_path.exists():
+        return {'success': False, 'error': f"Fichier non trouvé: {upload.get('file')}"}
+    
+    # Créer la date de publication programmée
+    scheduled_datetime = f"{upload.get('scheduledDate')}T{upload.get('scheduledTime')}:00"
+    
+    # Déterminer si c'est un short
+    is_short = upload_type == 'short'
+    
+    # Pour les shorts, s'assurer que #Shorts est dans le titre
+    title = upload.get('title', '')
+    if is_short and '#Shorts' not in title and '#shorts' not in title.lower():
+        title = f"{title} #Shorts"
+    
+    # Pour les shorts, ajouter les hashtags shorts dans la description
+    description = upload.get('description', '')
+    if is_short:
+        description = f"{description}\n\n#Shorts #Short #YouTubeShorts"
+    
+    # Classroom est toujours en unlisted et sans programmation
+    if upload_type == 'classroom':
+        privacy = 'unlisted'
+        publish_at = None
+        title = f"{title} (Version classroom)" if "(Version classroom)" not in title else title
+    else:
+        privacy = upload.get('privacy', 'public')
+        publish_at = scheduled_datetime if privacy == 'public' else None
+    
+    tags = upload.get('tags') or []
+    logger.info(f"[Schedule] Upload {upload_type}: {title}")
+    
+    def report_progress(bytes_uploaded: int, total_bytes: int):
+        # Compteurs d'octets exposés par GET /api/youtube/schedule/{group_id}
+        self.update_state(state='PROGRESS', meta={
+            'title': title,
+            'bytes_uploaded': bytes_uploaded,
+            'total_bytes': total_bytes
+        })
+    
+    try:
+        # Upload avec programmation
+        result = youtube_service.upload_video(
+            file_path=str(file_path),
+            title=title,
+            description=description,
+            tags=tags + ['Shorts', 'Short', 'YouTubeShorts'] if is_short else tags,
+            privacy=privacy,
+            is_short=is_short,
+            publish_at=publish_at,
+            progress_callback=report_progress
+        )
+        
+        if not result:
+            return {'success': False, 'error': f"Échec upload: {title}"}
+        
+        video_id = result.get("id")
+        
+        # Upload de la miniature pour les vidéos principales (pas les shorts)
+        if upload_type in ['illustrated', 'classroom']:
+            thumbnail_path = output_dir / "thumbnail.png"
+            if thumbnail_path.exists():
+                if youtube_service.set_thumbnail(video_id, str(thumbnail_path)):
+                    logger.info(f"[Schedule] Miniature uploadée pour {video_id}")
+                else:
+                    logger.warning(f"[Schedule] Échec miniature pour {video_id}")
+        
+        return {
+            'success': True,
+            'type': upload_type,
+            'title': title,
+            'video_id': video_id,
+            'url': result.get("url"),
+            'scheduled_for': scheduled_datetime,
+            'status': "scheduled" if upload.get('privacy') == 'public' else "uploaded",
+            'thumbnail': upload_type in ['illustrated', 'classroom']
+        }
+    except Exception as e:
+        logger.error(f"[Schedule] Erreur {upload.get('title')}: {e}")
+        return {'success': False, 'error': f"Erreur {upload.get('title')}: {str(e)}"}
+
+
+@celery_app.task(bind=True, name='tasks.upload_with_thumbnail')
+def task_upload_with_thumbnail(self, file_path: str, meta: dict, thumb_path: str = None, project_id: str = None):
+    """
+    Mise en ligne immédiate (/upload-now) : vidéo puis miniature dans la même tâche
+    Le résultat est enregistré dans le projet (outputs.manual_uploads.<task_id>)
+    """
+    from services.youtube_service import youtube_service
+    
+    title = meta.get('title', '')
+    logger.info(f"[UploadNow] Upload {meta.get('type')}: {title}")
+    
+    def report_progress(bytes_uploaded: int, total_bytes: int):
+        self.update_state(state='PROGRESS', meta={
+            'title': title,
+            'bytes_uploaded': bytes_uploaded,
+            'total_bytes': total_bytes
+        })
+    
+    result = youtube_service.upload_video(
+        file_path=file_path,
+        title=title,
+        description=meta.get('description', ''),
+        tags=meta.get('tags') or [],
+        privacy=meta.get('privacy', 'public'),
+        is_short=meta.get('is_short', False),
+        progress_callback=report_progress
+    )
+    
+    if not result:
+        outcome = {'success': False, 'type': meta.get('type'), 'title': title, 'error': "Erreur lors de l'upload"}
+    else:
+        # Miniature pour les vidéos principales
+        thumbnail = False
+        if thumb_path and Path(thumb_path).exists():
+            thumbnail = youtube_service.set_thumbnail(result['id'], thumb_path)
+            if not thumbnail:
+                logger.warning(f"[UploadNow] Échec miniature pour {result['id']}")
+        
+        outcome = {
+            'success': True,
+            'type': meta.get('type'),
+            'video_id': result['id'],
+            'url': result['url'],
+            'title': result['title'],
+            'status': result['status'],
+            'thumbnail': thumbnail
+        }
+        logger.info(f"[UploadNow] OK: {result['url']}")
+    
+    if project_id:
+        db.update_project(project_id, {
+            f"outputs.manual_uploads.{self.request.id}": {
+                **outcome,
+                'uploaded_at': datetime.now().isoformat()
+            }
+        })
+    
+    return outcome
+
+
 @celery_app.task(bind=True, name='tasks.process_full_pipeline')
 def process_full_pipeline(self, video_folder: str):
     """
@@ -505,6 +744,7 @@ def process_full_pipeline(self, video_folder: str):
     logger.info(f"[Pipeline] Démarrage pipeline complet pour {video_folder}")
     
     # Créer la chaîne de tâches (10 étapes - upload manuel requis)
+    # acks_late: une étape peut être rejouée après un crash worker -> étapes idempotentes
     pipeline = chain(
         task_step1_merge.s(video_folder),
         task_step2_silence.s(),
@@ -230,6 +230,19 @@ export default function ProjectDetailPage() {
     return () => clearInterval(interval);
   }, [activeTab, projectId, API_URL]);
 
+  // Suivre une mise en ligne immédiate (tâche Celery) jusqu'à SUCCESS ou FAILURE
+  const pollUploadTask = async (taskId: string) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 3000));
+      const res = await fetch(`${API_URL}/api/youtube/upload-now/${taskId}`);
+      if (!res.ok) {
+        throw new Error(`Suivi de la mise en ligne impossible (${res.status})`);
+      }
+      const data = await res.json();
+      if (data.state === 'SUCCESS' || data.state === 'FAILURE') return data;
+    }
+  };
+
   const handleUploadNow = async (index: number) => {
     if (!files?.schedule?.uploads[index] || !project) return;
     
@@ -249,15 +262,21 @@ export default function ProjectDetailPage() {
       });
       
       if (response.ok) {
-        const result = await response.json();
-        // Mettre à jour le statut localement
-        setFiles(prev => {
-          if (!prev?.schedule) return prev;
-          const newUploads = [...prev.schedule.uploads];
-          newUploads[index] = { ...newUploads[index], status: 'uploaded' };
-          return { ...prev, schedule: { ...prev.schedule, uploads: newUploads } };
-        });
-        alert(`✅ "${upload.title}" est maintenant en ligne !\n\nURL: ${result.url}`);
+        const { task_id } = await response.json();
+        const result = await pollUploadTask(task_id);
+        
+        if (result.state === 'SUCCESS' && result.success) {
+          // Mettre à jour le statut localement une fois la vidéo en ligne
+          setFiles(prev => {
+            if (!prev?.schedule) return prev;
+            const newUploads = [...prev.schedule.uploads];
+            newUploads[index] = { ...newUploads[index], status: 'uploaded' };
+            return { ...prev, schedule: { ...prev.schedule, uploads: newUploads } };
+          });
+          alert(`✅ "${upload.title}" est maintenant en ligne !\n\nURL: ${result.url}`);
+        } else {
+          alert(`❌ Erreur: ${result.error || 'Échec de la mise en ligne'}`);
+        }
       } else {
         const error = await response.json();
         alert(`❌ Erreur: ${error.detail || 'Échec de la mise en ligne'}`);
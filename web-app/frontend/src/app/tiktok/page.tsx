@@ -37,6 +37,9 @@ export default function TikTokPage() {
   const [loading, setLoading] = useState(true);
   const [copiedField, setCopiedField] = useState<string | null>(null);
   const [hidePublished, setHidePublished] = useState(true);
+  // Pagination par projet : curseur = created_at du dernier projet reçu
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8010';
   
@@ -52,6 +55,7 @@ export default function TikTokPage() {
       if (res.ok) {
         const data = await res.json();
         setShorts(data.shorts || []);
+        setNextCursor(data.next_cursor || null);
       }
     } catch (err) {
       console.error('Erreur chargement shorts:', err);
@@ -60,6 +64,24 @@ export default function TikTokPage() {
     }
   };
 
+  // Charger la page suivante (projets plus anciens)
+  const fetchMoreShorts = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetch(`${API_URL}/api/tiktok/shorts?before=${encodeURIComponent(nextCursor)}`);
+      if (res.ok) {
+        const data = await res.json();
+        setShorts(prev => [...prev, ...(data.shorts || [])]);
+        setNextCursor(data.next_cursor || null);
+      }
+    } catch (err) {
+      console.error('Erreur chargement shorts:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchShorts();
   }, []);
@@ -332,6 +354,24 @@ export default function TikTokPage() {
         </div>
       )}
 
+      {/* Projets plus anciens */}
+      {!loading && nextCursor && (
+        <div className="mt-6 flex justify-center">
+          <button
+            onClick={fetchMoreShorts}
+            disabled={loadingMore}
+            className="px-4 py-2 bg-zinc-800 hover:bg-zinc-700 text-white rounded-lg transition flex items-center gap-2"
+          >
+            {loadingMore ? (
+              <Loader2 className="w-4 h-4 animate-spin" />
+            ) : (
+              <RefreshCw className="w-4 h-4" />
+            )}
+            Charger plus
+          </button>
+        </div>
+      )}
+
       {/* Stats */}
       {shorts.length > 0 && (
         <div className="mt-8 card p-4 flex items-center justify-between">
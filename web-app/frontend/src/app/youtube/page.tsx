@@ -116,7 +116,20 @@ interface ScheduledUpload {
   scheduledDate: string;
   scheduledTime: string;
   privacy: 'public' | 'unlisted' | 'private';
-  status: 'pending' | 'uploaded' | 'failed';
+  status: 'uploading' | 'scheduled' | 'uploaded' | 'failed';
+  groupId?: string;
+  groupIndex?: number;
+  error?: string;
+}
+
+interface ScheduleGroupStatus {
+  ready: boolean;
+  uploads: Array<{
+    state: string;
+    success?: boolean;
+    status?: string;
+    error?: string;
+  }>;
 }
 
 // Heures optimales pour YouTube (France)
@@ -290,6 +303,42 @@ export default function YouTubePage() {
   const [scheduling, setScheduling] = useState(false);
   const [uploadingIndex, setUploadingIndex] = useState<number | null>(null);
 
+  // Suivre un lot d'uploads programmés (tâches Celery) jusqu'à la fin de chaque upload
+  const pollScheduleGroup = async (groupId: string): Promise<ScheduleGroupStatus> => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 3000));
+      const res = await fetch(`${API_URL}/api/youtube/schedule/${groupId}`);
+      if (!res.ok) {
+        throw new Error(`Suivi du lot impossible (${res.status})`);
+      }
+      const data: ScheduleGroupStatus = await res.json();
+      
+      // État de chaque upload terminé (les autres restent en cours d'envoi)
+      setScheduledUploads(prev => prev.map((u): ScheduledUpload => {
+        const item = u.groupId === groupId ? data.uploads[u.groupIndex ?? -1] : undefined;
+        if (!item || item.success === undefined) return u;
+        return item.success
+          ? { ...u, status: item.status === 'scheduled' ? 'scheduled' : 'uploaded', error: undefined }
+          : { ...u, status: 'failed', error: item.error || 'Erreur inconnue' };
+      }));
+      
+      if (data.ready) return data;
+    }
+  };
+
+  // Suivre une mise en ligne immédiate (tâche Celery) jusqu'à SUCCESS ou FAILURE
+  const pollUploadTask = async (taskId: string) => {
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 3000));
+      const res = await fetch(`${API_URL}/api/youtube/upload-now/${taskId}`);
+      if (!res.ok) {
+        throw new Error(`Suivi de la mise en ligne impossible (${res.status})`);
+      }
+      const data = await res.json();
+      if (data.state === 'SUCCESS' || data.state === 'FAILURE') return data;
+    }
+  };
+
   // Mettre en ligne immédiatement
   const handleUploadNow = async (index: number) => {
     const upload = scheduledUploads[index];
@@ -310,14 +359,18 @@ export default function YouTubePage() {
       });
       
       if (response.ok) {
-        const result = await response.json();
-        
-        // Mettre à jour le statut
-        const newUploads = [...scheduledUploads];
-        newUploads[index] = { ...newUploads[index], status: 'uploaded' };
-        setScheduledUploads(newUploads);
+        const { task_id } = await response.json();
+        const result = await pollUploadTask(task_id);
         
-        alert(`✅ "${upload.title}" est maintenant en ligne !\n\nURL: ${result.url}`);
+        // Mettre à jour le statut une fois la tâche terminée
+        if (result.state === 'SUCCESS' && result.success) {
+          setScheduledUploads(prev => prev.map((u, i): ScheduledUpload => i === index ? { ...u, status: 'uploaded', error: undefined } : u));
+          alert(`✅ "${upload.title}" est maintenant en ligne !\n\nURL: ${result.url}`);
+        } else {
+          const error = result.error || 'Échec de la mise en ligne';
+          setScheduledUploads(prev => prev.map((u, i): ScheduledUpload => i === index ? { ...u, status: 'failed', error } : u));
+          alert(`❌ Erreur: ${error}`);
+        }
       } else {
         const error = await response.json();
         alert(`❌ Erreur: ${error.detail || 'Échec de la mise en ligne'}`);
@@ -411,8 +464,8 @@ export default function YouTubePage() {
       if (response.ok) {
         const result = await response.json();
         
-        // Ajouter à la liste locale
-        const newScheduled = uploads.map(u => ({
+        // Ajouter à la liste locale : en cours d'envoi jusqu'au résultat de chaque tâche
+        const newScheduled = uploads.map((u, groupIndex) => ({
           projectId: selectedProject._id,
           projectName: selectedProject.name,
           type: u.type,
@@ -420,12 +473,26 @@ export default function YouTubePage() {
           scheduledDate: u.scheduledDate,
           scheduledTime: u.scheduledTime,
           privacy: u.privacy,
-          status: 'pending' as const,
+          status: 'uploading' as const,
+          groupId: result.group_id,
+          groupIndex,
         }));
         
-        setScheduledUploads([...scheduledUploads, ...newScheduled]);
+        setScheduledUploads(prev => [...prev, ...newScheduled]);
         setSelectedProject(null);
-        alert(`✅ ${uploads.length} upload(s) programmé(s) avec succès !`);
+        
+        const status = await pollScheduleGroup(result.group_id);
+        const failures = status.uploads
+          .map((item, i) => ({ ...item, title: uploads[i]?.title }))
+          .filter(item => !item.success);
+        if (failures.length === 0) {
+          alert(`✅ ${uploads.length} upload(s) programmé(s) avec succès !`);
+        } else {
+          alert(
+            `⚠️ ${uploads.length - failures.length}/${uploads.length} upload(s) programmé(s)\n\n` +
+            failures.map(f => `❌ ${f.title}: ${f.error || 'Erreur inconnue'}`).join('\n')
+          );
+        }
       } else {
         const error = await response.json();
         alert(`❌ Erreur: ${error.detail || 'Échec de la programmation'}`);
@@ -1402,9 +1469,14 @@ export default function YouTubePage() {
                               {upload.privacy === 'public' ? 'Publique' : 
                                upload.privacy === 'unlisted' ? 'Non répertoriée' : 'Privée'}
                             </span>
-                            {upload.status === 'pending' && (
-                              <span className="text-[10px] px-1.5 py-0.5 rounded bg-orange-500/20 text-orange-400">
-                                En attente
+                            {upload.status === 'uploading' && (
+                              <span className="text-[10px] px-1.5 py-0.5 rounded bg-blue-500/20 text-blue-400">
+                                Envoi en cours...
+                              </span>
+                            )}
+                            {upload.status === 'scheduled' && (
+                              <span className="text-[10px] px-1.5 py-0.5 rounded bg-green-500/20 text-green-400">
+                                ✓ Programmée
                               </span>
                             )}
                             {upload.status === 'uploaded' && (
@@ -1412,7 +1484,18 @@ export default function YouTubePage() {
                                 ✓ En ligne
                               </span>
                             )}
+                            {upload.status === 'failed' && (
+                              <span
+                                className="text-[10px] px-1.5 py-0.5 rounded bg-red-500/20 text-red-400"
+                                title={upload.error}
+                              >
+                                Échec
+                              </span>
+                            )}
                           </div>
+                          {upload.status === 'failed' && upload.error && (
+                            <p className="text-xs text-red-400 truncate max-w-xs">{upload.error}</p>
+                          )}
                         </div>
                       </div>
                       <div className="flex items-center gap-3">
@@ -1420,7 +1503,7 @@ export default function YouTubePage() {
                           <p className="text-sm text-white">{upload.scheduledDate}</p>
                           <p className="text-xs text-zinc-500">{upload.scheduledTime}</p>
                         </div>
-                        {upload.status === 'pending' && (
+                        {(upload.status === 'scheduled' || upload.status === 'failed') && (
                           <button
                             onClick={() => handleUploadNow(index)}
                             disabled={uploadingIndex === index}